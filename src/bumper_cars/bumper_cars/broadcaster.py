@@ -1,22 +1,19 @@
 import rclpy
 from rclpy.node import Node
 from geometry_msgs.msg import TransformStamped
-from custom_message.msg import MultiState
+from custom_message.msg import MultiState, PackedState
 from tf2_ros import TransformBroadcaster
 # For the parameter file
-import pathlib
-import json
+from planner.config import get_config
+from planner.messages import accept_packed
 import numpy as np
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
+params = get_config()
 
-plot_traj = json_object["plot_traj"]
-robot_num = json_object["robot_num"]
-timer_freq = json_object["timer_freq"]
+plot_traj = params.plot_traj
+robot_num = params.robot_num
+timer_freq = params.timer_freq
+packed_messages = params.packed_messages
 
 class FramePublisher(Node):
 
@@ -40,9 +37,9 @@ class FramePublisher(Node):
         # Subscribe to a turtle{1}{2}/pose topic and call handle_turtle_pose
         # callback function on each message
         self.subscription = self.create_subscription(
-            MultiState,
+            PackedState if packed_messages else MultiState,
             f'/multi_fullstate',
-            self.handle_turtle_pose,
+            accept_packed(self.handle_turtle_pose),
             1)
         self.subscription  # prevent unused variable warning
     
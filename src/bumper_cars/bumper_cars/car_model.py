@@ -2,51 +2,59 @@
 
 import rclpy
 from rclpy.node import Node
-from custom_message.msg import ControlInputs, State, FullState, MultiControl, MultiState
+from rclpy.clock import Clock as WallClock, ClockType
+from custom_message.msg import MultiControl, MultiState, PackedControl, PackedState
+from rosgraph_msgs.msg import Clock
+from std_msgs.msg import Header
+from builtin_interfaces.msg import Time
 import numpy as np
 import time
-import message_filters
-import math
 
 # For the parameter file
-import pathlib
-import json
+from planner.config import get_config
+import planner.utils as utils
+from planner.simulation import Simulation
+from planner.messages import pack_state, unpack_control, multi_state
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
+params = get_config()
 
-controller_type = json_object["Controller"]["controller_type"]
+controller_type = params.Controller.controller_type
 if controller_type == "DWA":
-    max_steer = json_object["DWA"]["max_steer"] # [rad] max steering angle
-    max_speed = json_object["DWA"]["max_speed"] # [m/s]
-    min_speed = json_object["DWA"]["min_speed"] # [m/s]
+    max_steer = params.DWA.max_steer # [rad] max steering angle
+    max_speed = params.DWA.max_speed # [m/s]
+    min_speed = params.DWA.min_speed # [m/s]
 else:
-    max_steer = json_object["Car_model"]["max_steer"] # [rad] max steering angle
-    max_speed = json_object["Car_model"]["max_speed"] # [m/s]
-    min_speed = json_object["Car_model"]["min_speed"] # [m/s]
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
-Lr = L / 2.0  # [m]
-Lf = L - Lr
-Cf = json_object["Car_model"]["Cf"]  # N/rad
-Cr = json_object["Car_model"]["Cr"] # N/rad
-Iz = json_object["Car_model"]["Iz"]  # kg/m2
-m = json_object["Car_model"]["m"]  # kg
-# Aerodynamic and friction coefficients
-c_a = json_object["Car_model"]["c_a"]
-c_r1 = json_object["Car_model"]["c_r1"]
-
-robot_num = json_object["robot_num"]
-timer_freq = json_object["timer_freq"]
+    max_steer = params.Car_model.max_steer # [rad] max steering angle
+    max_speed = params.Car_model.max_speed # [m/s]
+    min_speed = params.Car_model.min_speed # [m/s]
+robot_num = params.robot_num
+timer_freq = params.timer_freq
+
+# integrator of the nonlinear model, see planner.utils.dynamic_motion_batch
+integrator = 'semi-implicit'
+substeps = 1
+
+# with use_sim_time the model steps on its own simulated clock and publishes /clock, the other nodes
+# run on that clock; real_time_factor 0 steps as fast as the CPU allows. The steps are taken in
+# lockstep with the controller: a step waits for the inputs computed from the last published state,
+# for at most step_timeout seconds of wall-clock time
+use_sim_time = params.use_sim_time
+dt = utils.dt
+real_time_factor = 0.0
+step_timeout = 1.0 # [s]
+
+# PackedState/PackedControl instead of MultiState/MultiControl, see planner.messages
+packed_messages = params.packed_messages
 
 class CarModel(Node):
     """
-    Represents the car model and its behavior.
+    ROS adapter of the simulation engine (planner.simulation) for the fleet.
 
-    This class initializes the car model with the given parameters and provides methods for updating the car state based on control inputs.
-    It also publishes the car's full state and handles the timer callback for publishing the state periodically.
+    The received control inputs are fed to the engine and its states are published. In real time
+    the fleet is advanced at every control message by the wall-clock time elapsed since the previous
+    one (a fixed 0.1 s for the DWA, LBP and MPC controllers). With use_sim_time the fleet is advanced
+    by dt on the simulated clock instead, published on /clock, as soon as the controller answered the
+    last published state (the control message carries its stamp) or after step_timeout.
     """
 
     def __init__(self):
@@ -71,126 +79,123 @@ class CarModel(Node):
         self.omega = self.get_parameter('omega').get_parameter_value().double_array_value
         self.model_type = self.get_parameter('model_type').get_parameter_value().string_array_value
 
-        self.multi_state = MultiState()
-        self.old_time = []
-
-        # Initializing the robots TODO add in the launch file parameters the initial control--> here it's hardcoded
-        for i in range(robot_num):
-            self.multi_state.multiple_state.append(FullState(x=self.x0[i], y=self.y0[i], yaw=self.yaw[i], v=self.v[i], omega=self.omega[i],
-                                                                                                delta=0.0, throttle=0.0))
-            self.old_time.append(time.time())
-            
-        # self.get_logger().info("MultiState: " + str(self.multi_state))
+        x0 = np.array([self.x0, self.y0, self.yaw, self.v, self.omega])[:, :robot_num]
+        self.sim = Simulation(x0, dt=dt, model=self.model_type[0], integrator=integrator, substeps=substeps,
+                              steer_limit=max_steer, max_speed_limit=max_speed)
+        self.state_changed()
+        self.old_time = time.time()
+        # the kinematic model of the sampling controllers is advanced by their fixed dt
+        self.fixed_step = 0.1 if self.model_type[0] == 'linear' and controller_type in ("DWA", "LBP", "MPC") else None
 
         # Initializing the state publishers/subscribers
-        self.control_sub = self.create_subscription(MultiControl, '/robot_control', self.general_model_callback, 10)
-        self.fullstate_publisher_ = self.create_publisher(MultiState, "robot_fullstate", 60)
+        self.control_sub = self.create_subscription(PackedControl if packed_messages else MultiControl, '/robot_control',
+                                                    self.general_model_callback, 10)
+        self.fullstate_publisher_ = self.create_publisher(PackedState if packed_messages else MultiState, "robot_fullstate", 60)
         self.get_logger().info("Robots model initialized correctly")
 
-        self.timer = self.create_timer(timer_freq, self.timer_callback)
+        if use_sim_time:
+            self.clock_publisher_ = self.create_publisher(Clock, "/clock", 10)
+            # stamp of the published state whose inputs are awaited, None before the first publish
+            self.awaited_stamp = None
+            self.inputs_received = False
+            self.published_at = 0.0
+            # the steps are paced by the steady clock, the node clock may be the simulated one
+            self.timer = self.create_timer(dt / real_time_factor if real_time_factor > 0 else 1e-4, self.step_callback,
+                                           clock=WallClock(clock_type=ClockType.STEADY_TIME))
+        else:
+            self.timer = self.create_timer(timer_freq, self.timer_callback)
 
-    def general_model_callback(self, control: MultiControl):
+    def general_model_callback(self, control):
         """
         Callback function for handling general model control inputs.
 
-        This function is called when new control inputs are received.
-        It updates the car state based on the model type and the control inputs for each robot.
-        """
+        The inputs are applied from the next step on. In real time the fleet is advanced right away.
 
-        for i in range(robot_num):
-            if self.model_type[0] == 'linear':
-                self.multi_state.multiple_state[i], self.old_time[i] = self.linear_model_callback(self.multi_state.multiple_state[i], control.multi_control[i], self.old_time[i])
-                # self.get_logger().info("Speed of robot " + str(i) + ": " + str(self.multi_state.multiple_state[i].v))
-            elif self.model_type[0] == 'nonlinear':
-                self.multi_state.multiple_state[i], self.old_time[i] = self.nonlinear_model_callback(self.multi_state.multiple_state[i], control.multi_control[i], self.old_time[i])
-
-    def linear_model_callback(self, initial_state: FullState, cmd: ControlInputs, old_time: float):
+        Args:
+            control (MultiControl or PackedControl): The control inputs of all the cars.
         """
-        Update the car state using a non-linear kinematic model.
 
-        This function calculates the new state of the car based on the initial state, control inputs, and the time elapsed since the last update.
-        It returns the updated state and the current time.
-
-        Args:
-            initial_state (FullState): The initial state of the car.
-            cmd (ControlInputs): The control inputs for the car.
-            old_time (float): The time of the last update.
+        if packed_messages:
+            self.sim.set_inputs(unpack_control(control)[:, :robot_num])
+        else:
+            self.sim.set_inputs([[cmd.throttle for cmd in control.multi_control[:robot_num]],
+                                 [cmd.delta for cmd in control.multi_control[:robot_num]]])
+        if use_sim_time:
+            if control.header.stamp == self.awaited_stamp:
+                self.inputs_received = True
+            return
+
+        now = time.time()
+        step = self.fixed_step if self.fixed_step is not None else now - self.old_time
+        self.sim.advance(step)
+        self.old_time = now
+        self.state_changed(step)
+
+    def step_callback(self):
+        """
+        Advance the fleet by dt on the simulated clock once the inputs of the last published state
+        arrived (or step_timeout elapsed), publish /clock and the states. The initial states are
+        published at the first call.
+        """
 
+        now = time.monotonic()
+        step = 0.0
+        if self.awaited_stamp is not None:
+            if not self.inputs_received and now - self.published_at < step_timeout:
+                return
+            self.sim.advance()
+            step = dt
+        clock = Clock(clock=self.sim_stamp())
+        self.clock_publisher_.publish(clock)
+        self.state_changed(step)
+        self.fullstate_publisher_.publish(self.outbound_state())
+        self.awaited_stamp = self.state_header.stamp
+        self.inputs_received = False
+        self.published_at = now
+
+    def sim_stamp(self):
+        """
         Returns:
-            FullState: The updated state of the car.
-            float: The current time.
+            Time: The simulated time of the engine.
         """
 
-        if controller_type == "DWA" or controller_type == "LBP" or controller_type == "MPC":
-            dt = 0.1
-            # dt = time.time() - old_time
-        else:
-            dt = time.time() - old_time
-        
-        self.get_logger().info("a: " + str(cmd.throttle) + " delta: " + str(cmd.delta))
-            
-        state = FullState()
-        cmd.delta = np.clip(cmd.delta, -max_steer, max_steer)
+        sec, nanosec = self.sim.clock.stamp()
+        return Time(sec=sec, nanosec=nanosec)
 
-        state.x = initial_state.x + initial_state.v * np.cos(initial_state.yaw) * dt
-        state.y = initial_state.y + initial_state.v * np.sin(initial_state.yaw) * dt
-        
-        state.v = initial_state.v + cmd.throttle * dt
-        state.v = np.clip(state.v, min_speed, max_speed)
-        state.yaw = initial_state.yaw + initial_state.v / L * np.tan(cmd.delta) * dt
-        state.yaw = self.normalize_angle(state.yaw)
-        state.delta = cmd.delta
-        state.throttle = cmd.throttle
-
-        return state, time.time()
-    
-    def nonlinear_model_callback(self, state: FullState, cmd: ControlInputs, old_time: float):
+    def state_changed(self, step=0.0):
         """
-        Update the car state using a nonlinear dynamic model.
+        Record that the states of the engine changed, the message is built at the next publish.
 
-        This function calculates the new state of the car based on the current state, control inputs, and the time elapsed since the last update.
-        It returns the updated state and the current time.
+        The states are stamped with the time they were computed at (the simulated time with
+        use_sim_time), the stamp is propagated by the sensor and the controller, see the latency node.
+        The message also carries the time step the engine applied, which differs from the time between
+        the stamps with the fixed step of the sampling controllers.
 
         Args:
-            state (FullState): The current state of the car.
-            cmd (ControlInputs): The control inputs for the car.
-            old_time (float): The time of the last update.
-
-        Returns:
-            FullState: The updated state of the car.
-            float: The current time.
+            step (float, optional): Time step [s] applied to reach the states. Defaults to 0.0.
         """
 
-        dt = time.time() - old_time
-        cmd.delta = np.clip(cmd.delta, -max_steer, max_steer)
+        self.state_step = step
+        self.state_header = Header(stamp=self.sim_stamp() if use_sim_time else self.get_clock().now().to_msg())
+        self.multi_state = None
 
-        beta = math.atan2((Lr * math.tan(cmd.delta) / L), 1.0)
-        vx = state.v * math.cos(beta)
-        vy = state.v * math.sin(beta)
-
-        Ffy = -Cf * ((vy + Lf * state.omega) / (vx + 0.0001) - cmd.delta)
-        Fry = -Cr * (vy - Lr * state.omega) / (vx + 0.0001)
-        R_x = c_r1 * abs(vx)
-        F_aero = c_a * vx ** 2 # 
-        F_load = F_aero + R_x #
-        state.omega = state.omega + (Ffy * Lf * math.cos(cmd.delta) - Fry * Lr) / Iz * dt
-        vx = vx + (cmd.throttle - Ffy * math.sin(cmd.delta) / m - F_load / m + vy * state.omega) * dt
-        vy = vy + (Fry / m + Ffy * math.cos(cmd.delta) / m - vx * state.omega) * dt
-
-        state.yaw = state.yaw + state.omega * dt
-        state.yaw = self.normalize_angle(state.yaw)
-
-        state.x = state.x + vx * math.cos(state.yaw) * dt - vy * math.sin(state.yaw) * dt
-        state.y = state.y + vx * math.sin(state.yaw) * dt + vy * math.cos(state.yaw) * dt
+    def outbound_state(self):
+        """
+        The message of the current states and applied inputs, built once per change of the states.
 
-        state.v = math.sqrt(vx ** 2 + vy ** 2)
-        state.v = np.clip(state.v, min_speed, max_speed)
+        Returns:
+            MultiState or PackedState: The message.
+        """
 
-        state.delta = cmd.delta
-        state.throttle = cmd.throttle
+        if self.multi_state is None:
+            throttle, delta = self.sim.inputs
+            state = np.vstack((self.sim.state, np.clip(delta, -max_steer, max_steer), throttle))
+            if packed_messages:
+                self.multi_state = pack_state(state, header=self.state_header, dt=self.state_step)
+            else:
+                self.multi_state = multi_state(state, self.state_header, self.state_step)
+        return self.multi_state
 
-        return state, time.time()
-    
     def timer_callback(self):
         """
         Timer callback function for publishing the car's full state.
@@ -199,25 +204,7 @@ class CarModel(Node):
         It publishes the car's full state.
         """
 
-        self.fullstate_publisher_.publish(self.multi_state)
-
-    def normalize_angle(self, angle):
-        """
-        Normalize an angle to [-pi, pi].
-
-        Args:
-            angle (float): The angle to normalize.
-
-        Returns:
-            float: The normalized angle in the range [-pi, pi].
-        """
-        while angle > np.pi:
-            angle -= 2.0 * np.pi
-
-        while angle < -np.pi:
-            angle += 2.0 * np.pi
-
-        return angle
+        self.fullstate_publisher_.publish(self.outbound_state())
         
         
 def main(args=None):
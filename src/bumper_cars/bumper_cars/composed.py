@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+The bumper cars graph in a single process.
+
+The car model, sensor, controller, converter and broadcaster nodes are created in one process
+and spun by one MultiThreadedExecutor, instead of one process each, so the MultiState round trip
+of every tick does not cross process boundaries. Each node keeps its default mutually exclusive
+callback group: the callbacks of a node share its state and never run concurrently, while the
+callbacks of different nodes run in parallel on the threads of the executor. The controller has
+two groups, one receiving the states and one planning, so it gets one more thread.
+
+The parameters and remappings given to the process (see the composed option of demo.launch.py)
+apply to all its nodes.
+"""
+import rclpy
+from rclpy.executors import MultiThreadedExecutor
+
+from bumper_cars.car_model import CarModel
+from bumper_cars.sensor import SensorMeasurement
+from bumper_cars.controller import Controller
+from bumper_cars.converter import Converter
+from bumper_cars.broadcaster import FramePublisher
+
+# the nodes of the graph, in creation order
+node_types = [CarModel, SensorMeasurement, Controller, Converter, FramePublisher]
+
+def main(args=None):
+    rclpy.init(args=args)
+
+    nodes = [node_type() for node_type in node_types]
+    executor = MultiThreadedExecutor(num_threads=len(nodes) + 1)
+    for node in nodes:
+        executor.add_node(node)
+
+    try:
+        executor.spin()
+    except KeyboardInterrupt:
+        pass
+
+    executor.shutdown()
+    for node in nodes:
+        node.destroy_node()
+    rclpy.shutdown()
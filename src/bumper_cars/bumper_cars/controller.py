@@ -2,11 +2,16 @@
 
 import rclpy
 from rclpy.node import Node
+from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.qos import QoSProfile, HistoryPolicy, ReliabilityPolicy
 from custom_message.msg import ControlInputs, State, Path, Coordinate, FullState, MultiState, MultiControl
+from custom_message.msg import PackedState, PackedControl, MultiplePaths
 from visualization_msgs.msg import Marker, MarkerArray
 from geometry_msgs.msg import Pose
-import message_filters
+from std_msgs.msg import Header
 import random
+import threading
 import math
 import numpy as np
 import os
@@ -25,34 +30,35 @@ from lbp_dev import LBP as LBP
 from mpc_dev import MPC as MPC
 
 # For the parameter file
-import pathlib
-import json
-import time
-
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
-WB = json_object["Controller"]["WB"] # Wheel base
-L_d = json_object["Controller"]["L_d"]  # [m] look-ahead distance
-max_steer = json_object["Controller"]["max_steer"]  # [rad] max steering angle
-max_acc = json_object["Controller"]["max_acc"]  # [rad] max acceleration
-min_acc = json_object["Controller"]["min_acc"]  # [rad] min acceleration
-max_speed = json_object["Car_model"]["max_speed"]  # [rad] max speed
-min_speed = json_object["Car_model"]["min_speed"]  # [rad] min speed
-controller_type = json_object["Controller"]["controller_type"]
-cbf_type = json_object["Controller"]["cbf_type"]
-dt = json_object["Controller"]["dt"]
+from planner.config import get_config
+from planner.messages import accept_packed, from_multi_control
+
+params = get_config()
+
+L = params.Car_model.L  # [m] Wheel base of vehicle
+WB = params.Controller.WB # Wheel base
+L_d = params.Controller.L_d  # [m] look-ahead distance
+max_steer = params.Controller.max_steer  # [rad] max steering angle
+max_acc = params.Controller.max_acc  # [rad] max acceleration
+min_acc = params.Controller.min_acc  # [rad] min acceleration
+max_speed = params.Car_model.max_speed  # [rad] max speed
+min_speed = params.Car_model.min_speed  # [rad] min speed
+controller_type = params.Controller.controller_type
+cbf_type = params.Controller.cbf_type
+dt = params.Controller.dt
 debug = False
-robot_num = json_object["robot_num"]
-min_dist = json_object["min_dist"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-plot_traj = json_object["plot_traj"]    
+robot_num = params.robot_num
+min_dist = params.min_dist
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+plot_traj = params.plot_traj    
+timer_freq = params.timer_freq
+# PackedState/PackedControl on the topics, converted at the boundary of the node, see planner.messages
+packed_messages = params.packed_messages
+# the controller keeps only the newest state: KEEP_LAST 1, best effort if set (the sensor republishes
+# the state every tick, a lost message is replaced by the next one)
+state_best_effort = False
 
 
 class Controller(Node):
@@ -95,16 +101,17 @@ class Controller(Node):
         self.width = width_init
         self.heigth = height_init
             
-        self.multi_control_pub = self.create_publisher(MultiControl, '/multi_control', 20)
+        self.multi_control_pub = self.create_publisher(PackedControl if packed_messages else MultiControl, '/multi_control', 20)
         self.marker_array_pub = self.create_publisher(MarkerArray, "/marker_array", 2)
+        self.multi_path_pub = self.create_publisher(MultiplePaths, "/robot_multi_traj", 2)
         self.marker_array = MarkerArray()
-        multi_state_sub = message_filters.Subscriber(self, MultiState, "/robot_multi_state")
 
         self.controller_type = controller_type
+        # time budget of the planner, counts the deadline misses (see planner.deadline)
+        self.deadline = None
 
         if self.controller_type == "random_walk":
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 4, 0.3, allow_headerless=True)
-            ts.registerCallback(self.random_walk_controller)
+            self.planning_callback = accept_packed(self.random_walk_controller)
             multi_control = MultiControl()
 
             for i in range(robot_num):
@@ -113,6 +120,7 @@ class Controller(Node):
         elif self.controller_type == "random_harem":
             # Initializing the robots
             self.targets = []
+            self.time_bkp = self.get_clock().now().nanoseconds * 1e-9
             multi_control = MultiControl()
 
             for i in range(robot_num):
@@ -120,8 +128,7 @@ class Controller(Node):
                 initial_state = State(x=x0[i], y=y0[i], yaw=yaw[i], v=v[i], omega=omega[i])
                 multi_control.multi_control.append(ControlInputs(delta=0.0, throttle=0.0))
 
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 4, 0.3, allow_headerless=True)
-            ts.registerCallback(self.DWA_callback) 
+            self.planning_callback = accept_packed(self.DWA_callback)
 
         elif self.controller_type == "DWA":
             # Initializing the robots
@@ -146,8 +153,8 @@ class Controller(Node):
             self.dwa = DWA.DWA_algorithm(self.paths, safety_init, width_init, height_init,
                         min_dist, self.paths, self.targets, self.dilated_traj, predicted_trajectory, None, u_hist)
     
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 4, 0.3, allow_headerless=True)
-            ts.registerCallback(self.DWA_callback) 
+            self.planning_callback = accept_packed(self.DWA_callback)
+            self.deadline = self.dwa.deadline
 
         elif self.controller_type == "LBP":
             # Initializing the robots
@@ -172,8 +179,8 @@ class Controller(Node):
             self.lbp = LBP.LBP_algorithm(predicted_trajectory, self.paths, self.targets, self.dilated_traj, predicted_trajectory,
                                          None, u_hist)
     
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 4, 0.3, allow_headerless=True)
-            ts.registerCallback(self.LBP_callback)  
+            self.planning_callback = accept_packed(self.LBP_callback)
+            self.deadline = self.lbp.deadline
 
         elif self.controller_type == "MPC":
             # Initializing the robots
@@ -188,8 +195,8 @@ class Controller(Node):
             for i in range(robot_num):
                 multi_control.multi_control.append(ControlInputs(delta=0.0, throttle=0.0))
                 
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 4, 0.3, allow_headerless=True)
-            ts.registerCallback(self.MPC_callback)  
+            self.planning_callback = accept_packed(self.MPC_callback)
+            self.deadline = self.mpc.deadline
      
         else:
             # Initializing the robots
@@ -204,12 +211,27 @@ class Controller(Node):
                 # TODO initialize control
                 multi_control.multi_control.append(ControlInputs(delta=0.0, throttle=0.0))
             
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 4, 0.3, allow_headerless=True)
-            ts.registerCallback(self.general_pose_callback)
+            self.planning_callback = accept_packed(self.general_pose_callback)
      
 
+        # The states are received in their own callback group and only the newest is kept, each arrival
+        # triggers the planning, which runs in another group on the newest state: a slow solve skips the
+        # states received meanwhile instead of queueing them, and the triggers received meanwhile
+        # coalesce into one planning on the newest state
+        self.input_group = MutuallyExclusiveCallbackGroup()
+        self.planning_group = MutuallyExclusiveCallbackGroup()
+        self.latest_state = None
+        self.state_lock = threading.Lock()
+        self.received_states = 0
+        self.skipped_states = 0
+        state_qos = QoSProfile(history=HistoryPolicy.KEEP_LAST, depth=1,
+                               reliability=ReliabilityPolicy.BEST_EFFORT if state_best_effort else ReliabilityPolicy.RELIABLE)
+        self.multi_state_sub = self.create_subscription(PackedState if packed_messages else MultiState, "/robot_multi_state",
+                                                        self.state_callback, state_qos, callback_group=self.input_group)
+        self.planning_trigger = self.create_guard_condition(self.planning_trigger_callback, callback_group=self.planning_group)
+
         # TODO initialize the initial control in the launch file
-        self.multi_control_pub.publish(multi_control)
+        self.publish_control(multi_control)
         self.get_logger().info("Controller has been started")
 
     def random_walk_controller(self, multi_state):
@@ -237,7 +259,8 @@ class Controller(Node):
         multi_control = self.apply_CBF(multi_control=multi_control, multi_state=multi_state)
 
         # Publishing everything in the general callback to avoid deadlocks
-        self.multi_control_pub.publish(multi_control)
+        self.publish_control(multi_control, multi_state.header)
+        self.publish_paths(self.paths, multi_state.header)
     
     def random_harem_callback(self, multi_state):
         """
@@ -246,9 +269,11 @@ class Controller(Node):
         Selects random targets for each robot and applies pure pursuit steering control
         to navigate towards the target. Applies control barrier function (CBF) to ensure safety.
         """
-        if time.time() - self.time_bkp > 4:
+        # node clock, the simulated time of the car model with use_sim_time
+        now = self.get_clock().now().nanoseconds * 1e-9
+        if now - self.time_bkp > 4:
             self.get_logger().info("Changing the targets")
-            self.time_bkp = time.time()
+            self.time_bkp = now
             self.update_targets(multi_state=multi_state)
 
         multi_control = MultiControl()
@@ -262,7 +287,7 @@ class Controller(Node):
         multi_control = self.apply_CBF(multi_control=multi_control, multi_state=multi_state)
 
         # Publishing everything in the general callback to avoid deadlocks
-        self.multi_control_pub.publish(multi_control)
+        self.publish_control(multi_control, multi_state.header)
 
     def general_pose_callback(self, multi_state: MultiState):
         """
@@ -301,7 +326,7 @@ class Controller(Node):
             self.marker_array.markers.append(marker)
 
         # Publishing everything in the general callback to avoid deadlocks
-        self.multi_control_pub.publish(multi_control)
+        self.publish_control(multi_control, multi_state.header)
         self.marker_array_pub.publish(self.marker_array)
 
     def DWA_callback(self, multi_state: MultiState):
@@ -323,7 +348,8 @@ class Controller(Node):
         for i in range(robot_num):
             multi_control.multi_control.append(ControlInputs(throttle=float(self.u[0,i]), delta=float(self.u[1,i])))
         
-        self.multi_control_pub.publish(multi_control)
+        self.publish_control(multi_control, multi_state.header)
+        self.publish_paths(self.paths, multi_state.header)
     
     def LBP_callback(self, multi_state: MultiState):
         """
@@ -344,7 +370,8 @@ class Controller(Node):
         for i in range(robot_num):
             multi_control.multi_control.append(ControlInputs(throttle=float(self.u[0,i]), delta=float(self.u[1,i])))
         
-        self.multi_control_pub.publish(multi_control)
+        self.publish_control(multi_control, multi_state.header)
+        self.publish_paths(self.paths, multi_state.header)
     
     def MPC_callback(self, multi_state: MultiState):
         """
@@ -358,7 +385,9 @@ class Controller(Node):
 
             multi_control.multi_control.append(ControlInputs(throttle=float(self.u[0,i]), delta=float(self.u[1,i])))
         
-        self.multi_control_pub.publish(multi_control)
+        self.publish_control(multi_control, multi_state.header)
+        self.publish_paths([[Coordinate(x=float(point[0]), y=float(point[1])) for point in self.mpc.predicted_trajectory[i]]
+                            for i in range(robot_num)], multi_state.header)
         
 
     def control_callback(self, pose: FullState, target, path, trajectory):
@@ -441,6 +470,63 @@ class Controller(Node):
 
         return throttle, delta
 
+    def state_callback(self, multi_state):
+        """
+        Keep the newest state and trigger the planning, a state not planned on yet is counted as skipped.
+
+        Args:
+            multi_state (MultiState or PackedState): The measured states.
+        """
+        with self.state_lock:
+            if self.latest_state is not None:
+                self.skipped_states += 1
+            self.latest_state = multi_state
+            self.received_states += 1
+        self.planning_trigger.trigger()
+
+    def planning_trigger_callback(self):
+        """
+        Plan on the newest state, if a new one was received since the last planning.
+        """
+        with self.state_lock:
+            multi_state, self.latest_state = self.latest_state, None
+        if multi_state is None:
+            return
+        if self.skipped_states:
+            self.get_logger().warn(f"Skipped {self.skipped_states} of {self.received_states} states",
+                                   throttle_duration_sec=5.0)
+        self.planning_callback(multi_state)
+        if self.deadline is not None and sum(self.deadline.misses):
+            self.get_logger().warn(f"Deadline missed in {self.deadline.miss_rate():.1%} of the robot steps",
+                                   throttle_duration_sec=5.0)
+
+    def publish_control(self, multi_control: MultiControl, header: Header = None):
+        """
+        Publish the control inputs, packed with packed_messages.
+
+        Args:
+            multi_control (MultiControl): The control inputs of all the robots.
+            header (Header, optional): Header of the state the inputs were computed from, so that the stamp of the
+                state is propagated to the car model. Defaults to the current time.
+        """
+        multi_control.header = header if header is not None else Header(stamp=self.get_clock().now().to_msg())
+        self.multi_control_pub.publish(from_multi_control(multi_control) if packed_messages else multi_control)
+
+    def publish_paths(self, paths, header: Header):
+        """
+        Publish the paths of the robots, stamped like the state they were computed from.
+
+        The converter and the plotter synchronize the paths with the states on the stamp of their headers.
+
+        Args:
+            paths (list): The paths of all the robots, each a list of Coordinate.
+            header (Header): Header of the state the paths were computed from.
+        """
+        multi_path = MultiplePaths(header=header)
+        for path in paths:
+            multi_path.multiple_path.append(Path(path=list(path)))
+        self.multi_path_pub.publish(multi_path)
+
     @staticmethod
     def dist(point1, point2):
         """
@@ -552,7 +638,10 @@ def main(args=None):
     rclpy.init(args=args)
 
     node = Controller()
-    rclpy.spin(node)
+    # the state and planning callback groups run on different threads
+    executor = MultiThreadedExecutor(num_threads=2)
+    executor.add_node(node)
+    executor.spin()
     
     node.destroy_node()
     rclpy.shutdown()
\ No newline at end of file
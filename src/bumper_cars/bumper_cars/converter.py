@@ -2,7 +2,7 @@
 
 import rclpy
 from rclpy.node import Node
-from custom_message.msg import MultiState, FullState, State, MultiplePaths
+from custom_message.msg import MultiState, FullState, State, MultiplePaths, PackedState
 import message_filters
 import time
 from geometry_msgs.msg import Pose, PoseArray, Point32
@@ -13,21 +13,18 @@ import math
 import numpy as np
 
 # For the parameter file
-import pathlib
-import json
+from planner.config import get_config
+from planner.messages import accept_packed
 from geometry_msgs.msg import Pose
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
+params = get_config()
 
-plot_traj = json_object["plot_traj"]
-robot_num = json_object["robot_num"]
-timer_freq = json_object["timer_freq"]
-controller_type = json_object["Controller"]["controller_type"]
-L = json_object["Car_model"]["L"]
+plot_traj = params.plot_traj
+robot_num = params.robot_num
+timer_freq = params.timer_freq
+controller_type = params.Controller.controller_type
+L = params.Car_model.L
+packed_messages = params.packed_messages
 
 class Converter(Node):
     """
@@ -85,13 +82,13 @@ class Converter(Node):
         self.point_cloud_pub = self.create_publisher(PointCloud, "/point_cloud", 2)
         self.timer = self.create_timer(timer_freq, self.timer_callback)
 
-        multi_state_subscriber = message_filters.Subscriber(self, MultiState, "/multi_fullstate")
+        multi_state_subscriber = message_filters.Subscriber(self, PackedState if packed_messages else MultiState, "/multi_fullstate")
         multi_trajectory_subscriber = message_filters.Subscriber(self, MultiplePaths, "/robot_multi_traj")
         if plot_traj:
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_subscriber, multi_trajectory_subscriber], 6, 1, allow_headerless=True)
+            ts = message_filters.ApproximateTimeSynchronizer([multi_state_subscriber, multi_trajectory_subscriber], 6, 1)
         else:
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_subscriber], 6, 1, allow_headerless=True)
-        ts.registerCallback(self.state_converter_callback)
+            ts = message_filters.ApproximateTimeSynchronizer([multi_state_subscriber], 6, 1)
+        ts.registerCallback(accept_packed(self.state_converter_callback))
 
         self.get_logger().info("Converter has been started")
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import rclpy
+from rclpy.node import Node
+from custom_message.msg import MultiState, MultiControl, PackedState, PackedControl
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+from collections import OrderedDict, deque
+import numpy as np
+
+# For the parameter file
+from planner.config import get_config
+
+params = get_config()
+
+packed_messages = params.packed_messages
+
+# the hops of the control loop, in order: the stamp of a state is set by the car model and
+# propagated by the sensor and the controller
+hops = [("state", "/multi_fullstate"), ("sensor", "/robot_multi_state"), ("control", "/multi_control")]
+window = 1000  # number of samples of the statistics
+report_period = 1.0  # [s]
+percentiles = (50, 90, 99)
+max_pending = 1000  # stamps kept to match the hops
+
+class LatencyMonitor(Node):
+    """
+    Per-hop and end-to-end latency of the control loop.
+
+    Every message of the loop carries the stamp of the state it was computed from. At each hop the
+    node records the age of that stamp (the end-to-end latency so far) and the time elapsed since
+    the same stamp reached the previous hop (the latency of the hop, the age for the first one).
+    The percentiles of the last window samples are published on /latency and logged every
+    report_period seconds. The ages are measured with the node clock, i.e. in simulated time with
+    use_sim_time.
+
+    Attributes:
+        arrivals (list): For each hop, the arrival times [ns] of the last stamps, keyed by stamp.
+        ages (dict): The last ages [s] of the stamps at each hop.
+        delays (dict): The last latencies [s] of each hop.
+    """
+
+    def __init__(self):
+        super().__init__("latency_monitor")
+
+        self.arrivals = [OrderedDict() for _ in hops]
+        self.ages = {name: deque(maxlen=window) for name, _ in hops}
+        self.delays = {name: deque(maxlen=window) for name, _ in hops}
+
+        state_type = PackedState if packed_messages else MultiState
+        control_type = PackedControl if packed_messages else MultiControl
+        self.subscriptions_ = [self.create_subscription(control_type if name == "control" else state_type, topic,
+                                                        lambda message, hop=hop: self.stamp_callback(hop, message), 10)
+                               for hop, (name, topic) in enumerate(hops)]
+        self.latency_pub = self.create_publisher(DiagnosticArray, "/latency", 10)
+        self.timer = self.create_timer(report_period, self.report_callback)
+
+        self.get_logger().info("Latency monitor has been started")
+
+    def stamp_callback(self, hop, message):
+        """
+        Record the arrival of a message at a hop.
+
+        Args:
+            hop (int): Index of the hop.
+            message: The message, with the header of the state it was computed from.
+        """
+        now = self.get_clock().now().nanoseconds
+        stamp = message.header.stamp.sec * 10**9 + message.header.stamp.nanosec
+        if stamp == 0:
+            return
+
+        name = hops[hop][0]
+        arrivals = self.arrivals[hop]
+        if stamp in arrivals:
+            # the same state published again (e.g. by a timer), only the first arrival counts
+            return
+        arrivals[stamp] = now
+        if len(arrivals) > max_pending:
+            arrivals.popitem(last=False)
+
+        self.ages[name].append((now - stamp) * 1e-9)
+        if hop == 0:
+            self.delays[name].append((now - stamp) * 1e-9)
+        elif stamp in self.arrivals[hop - 1]:
+            self.delays[name].append((now - self.arrivals[hop - 1][stamp]) * 1e-9)
+
+    def report_callback(self):
+        """
+        Publish and log the latency percentiles.
+        """
+        array = DiagnosticArray()
+        array.header.stamp = self.get_clock().now().to_msg()
+        report = []
+        series = [(f"{name} hop", self.delays[name]) for name, _ in hops]
+        series += [("end-to-end", self.ages[hops[-1][0]])]
+        for label, samples in series:
+            if not samples:
+                continue
+            values = np.percentile(np.fromiter(samples, dtype=float), percentiles)
+            status = DiagnosticStatus(name=f"latency/{label}", level=DiagnosticStatus.OK,
+                                      message=f"{len(samples)} samples")
+            status.values = [KeyValue(key=f"p{p}", value=f"{value * 1e3:.3f}") for p, value in zip(percentiles, values)]
+            status.values.append(KeyValue(key="max", value=f"{max(samples) * 1e3:.3f}"))
+            array.status.append(status)
+            report.append(f"{label}: " + ", ".join(f"p{p} {value * 1e3:.1f} ms" for p, value in zip(percentiles, values)))
+
+        if array.status:
+            self.latency_pub.publish(array)
+            self.get_logger().info(" | ".join(report))
+
+def main(args=None):
+    rclpy.init(args=args)
+
+    node = LatencyMonitor()
+    rclpy.spin(node)
+
+    node.destroy_node()
+    rclpy.shutdown()
@@ -4,7 +4,7 @@ import rclpy
 from rclpy.node import Node
 import math
 from matplotlib import pyplot as plt
-from custom_message.msg import FullState, Path, MultiplePaths, MultiState, Coordinate
+from custom_message.msg import FullState, Path, MultiplePaths, MultiState, Coordinate, PackedState
 # import the string type for ROS2 python to publish
 from std_msgs.msg import String
 import message_filters
@@ -12,24 +12,21 @@ import numpy as np
 import time
 
 # For the parameter file
-import pathlib
-import json
-
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-
-robot_num = json_object["robot_num"]
-controller_type = json_object["Controller"]["controller_type"]
-safety = json_object["safety"]
-width = json_object["width"]
-height = json_object["height"]
-timer_freq = json_object["timer_freq"]
+from planner.config import get_config
+from planner.messages import accept_packed
+
+params = get_config()
+
+
+robot_num = params.robot_num
+controller_type = params.Controller.controller_type
+safety = params.safety
+width = params.width
+height = params.height
+timer_freq = params.timer_freq
 debug = False
 plot_traj = False
+packed_messages = params.packed_messages
 
 class Config:
     """
@@ -78,7 +75,7 @@ class Plotter(Node):
                                                              omega=omega[i], delta=0.0, throttle=0.0))
             self.multi_traj.multiple_path.append(Path(path=[Coordinate(x=0.0, y=0.0)]))
 
-        multi_state_sub = message_filters.Subscriber(self, MultiState, "/multi_fullstate")
+        multi_state_sub = message_filters.Subscriber(self, PackedState if packed_messages else MultiState, "/multi_fullstate")
         self.multi_path_sub = message_filters.Subscriber(self, MultiplePaths, "/robot_multi_traj")
 
         # Creating a publisher to publish a string message on the topic "/plotter" only if the debug flag is on
@@ -96,22 +93,22 @@ class Plotter(Node):
         self.heigth = height
 
         if self.controller_type == "random_walk":
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 10, 1, allow_headerless=True)
-            ts.registerCallback(self.general_callback)
+            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 10, 1)
+            ts.registerCallback(accept_packed(self.general_callback))
 
             # timer
             self.timer = self.create_timer(timer_freq, self.plotter_callback)
 
         elif self.controller_type == "random_harem":
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 10, 1, allow_headerless=True)
-            ts.registerCallback(self.general_callback)
+            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub], 10, 1)
+            ts.registerCallback(accept_packed(self.general_callback))
 
             # timer
             self.timer = self.create_timer(timer_freq, self.plotter_callback)
             
         else:
-            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub, self.multi_path_sub], 10, 1, allow_headerless=True)
-            ts.registerCallback(self.complete_callback)
+            ts = message_filters.ApproximateTimeSynchronizer([multi_state_sub, self.multi_path_sub], 10, 1)
+            ts.registerCallback(accept_packed(self.complete_callback))
 
             # timer
             self.timer = self.create_timer(timer_freq, self.complete_plotter_callback)
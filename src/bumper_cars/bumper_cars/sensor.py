@@ -2,37 +2,47 @@
 
 import rclpy
 from rclpy.node import Node
-from custom_message.msg import MultiState, FullState, State
+from custom_message.msg import MultiState, FullState, State, PackedState
 import message_filters
-import time
+import numpy as np
 
 # For the parameter file
-import pathlib
-import json
+from planner.config import get_config
+from planner.simulation import Sensor
+from planner.messages import pack_state, unpack_state, multi_state
+from planner.ekf import FleetEKF, measurement_covariance
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
+params = get_config()
 
 debug = False
-robot_num = json_object["robot_num"]
-timer_freq = json_object["timer_freq"]
+robot_num = params.robot_num
+timer_freq = params.timer_freq
+# noise of the measurements, the seed controllers add their own when add_noise is set, and filtering
+# of the measurements with the fleet EKF (planner.ekf); also the node parameters noise_scale and ekf
+noise_scale = 0.0
+noise_seed = params.noise_seed
+ekf = False
+# PackedState instead of MultiState, see planner.messages
+packed_messages = params.packed_messages
+# with use_sim_time the measurements are also published as soon as a state arrives, the car model
+# waits for the inputs computed from them before the next step
+use_sim_time = params.use_sim_time
 
 class SensorMeasurement(Node):
     """
     Class representing a sensor measurement node.
 
     This class is responsible for initializing the sensor node, receiving sensor measurements,
-    applying noise to the measurements, and publishing the multi-state information.
+    applying noise to the measurements of all the robots at once, optionally filtering them with the
+    fleet EKF, and publishing the multi-state information.
 
     Args:
         Node: The base class for creating a ROS node.
 
     Attributes:
         multi_state (MultiState): The multi-state information.
+        sensor (Sensor): The noise of the measurements.
+        ekf (FleetEKF): The filter of the measurements, None to publish them as they are.
         multi_state_pub (Publisher): The publisher for multi-state information.
         timer (Timer): The timer for publishing multi-state information.
     """
@@ -61,7 +71,9 @@ class SensorMeasurement(Node):
                 ('y0', rclpy.Parameter.Type.DOUBLE_ARRAY),
                 ('yaw', rclpy.Parameter.Type.DOUBLE_ARRAY),
                 ('v', rclpy.Parameter.Type.DOUBLE_ARRAY),
-                ('omega', rclpy.Parameter.Type.DOUBLE_ARRAY)
+                ('omega', rclpy.Parameter.Type.DOUBLE_ARRAY),
+                ('noise_scale', noise_scale),
+                ('ekf', ekf)
             ]
         )
 
@@ -71,57 +83,72 @@ class SensorMeasurement(Node):
         v = self.get_parameter('v').get_parameter_value().double_array_value
         omega = self.get_parameter('omega').get_parameter_value().double_array_value
         model_type = self.get_parameter('model_type').get_parameter_value().string_array_value
-
-        self.multi_state = MultiState()
-
-        # Initializing the robots TODO add in the launch file parameters the initial control--> here it's hardcoded
-        for i in range(robot_num):
-            self.multi_state.multiple_state.append(FullState(x=x0[i], y=y0[i], yaw=yaw[i], v=v[i],
-                                                             omega=omega[i], delta=0.0, throttle=0.0))
-
-        self.multi_state_pub = self.create_publisher(MultiState, "/robot_multi_state", 2)
+        scale = self.get_parameter('noise_scale').get_parameter_value().double_value
+
+        if packed_messages:
+            self.multi_state = pack_state(np.array([x0, y0, yaw, v, omega])[:, :robot_num])
+        else:
+            self.multi_state = MultiState()
+
+            # Initializing the robots TODO add in the launch file parameters the initial control--> here it's hardcoded
+            for i in range(robot_num):
+                self.multi_state.multiple_state.append(FullState(x=x0[i], y=y0[i], yaw=yaw[i], v=v[i],
+                                                                 omega=omega[i], delta=0.0, throttle=0.0))
+
+        self.sensor = Sensor(robot_num, scale, noise_seed)
+        self.ekf = None
+        if self.get_parameter('ekf').get_parameter_value().bool_value:
+            self.ekf = FleetEKF(np.array([x0, y0, yaw, v])[:, :robot_num], R=measurement_covariance(scale))
+        self.last_stamp = None
+        message_type = PackedState if packed_messages else MultiState
+        self.multi_state_pub = self.create_publisher(message_type, "/robot_multi_state", 2)
         self.timer = self.create_timer(timer_freq, self.timer_callback)
 
-        multi_state_subscriber = message_filters.Subscriber(self, MultiState, "/multi_fullstate")
+        multi_state_subscriber = message_filters.Subscriber(self, message_type, "/multi_fullstate")
 
-        ts = message_filters.ApproximateTimeSynchronizer([multi_state_subscriber], 6, 1, allow_headerless=True)
+        ts = message_filters.ApproximateTimeSynchronizer([multi_state_subscriber], 6, 1)
         ts.registerCallback(self.sensor_callback)
 
         self.get_logger().info("Sensor has been started")
         
-    def sensor_callback(self, multi_state_in: MultiState):
+    def sensor_callback(self, multi_state_in):
         """
         Callback function for receiving sensor measurements.
 
         Args:
-            multi_state_in (MultiState): The received multi-state information.
+            multi_state_in (MultiState or PackedState): The received multi-state information.
         """
 
-        for i in range(robot_num):
-            self.multi_state.multiple_state[i] = self.apply_noise(multi_state_in.multiple_state[i])
-            if debug:
-                self.get_logger().info("Publishing robot" + str(i) + " new state, x: " + str(multi_state_in.multiple_state[i].x) + ", " +
-                                    "y: " + str(multi_state_in.multiple_state[i].y) + ", " +
-                                    "theta: " + str(multi_state_in.multiple_state[i].yaw) + ", " +
-                                    "linear velocity: " + str(multi_state_in.multiple_state[i].v))
+        # the measurement keeps the stamp of the state it was taken from
+        header = multi_state_in.header
+        stamp = header.stamp.sec * 10**9 + header.stamp.nanosec
+        if self.ekf is not None and stamp == self.last_stamp:
+            # the same state published again, already filtered
+            return
+
+        state = unpack_state(multi_state_in)[:, :robot_num]
+        measured = self.sensor.measure(state)
+        if self.ekf is not None:
+            # the inputs of the message are the ones applied over the time step the plant advanced by
+            measured = self.ekf.step(measured, state[[6, 5]], multi_state_in.dt)
+        self.last_stamp = stamp
+        state[:4] = measured
+
+        if packed_messages:
+            self.multi_state = pack_state(state, header=header, dt=multi_state_in.dt)
+        else:
+            self.multi_state = multi_state(state, header, multi_state_in.dt)
+        if use_sim_time:
+            self.multi_state_pub.publish(self.multi_state)
+        if debug:
+            self.get_logger().info("Publishing the new states, x: " + str(state[0]) + ", y: " + str(state[1]) + ", " +
+                                   "theta: " + str(state[2]) + ", linear velocity: " + str(state[3]))
 
     def timer_callback(self):
         """
         Callback function for the timer to publish multi-state information.
         """
         self.multi_state_pub.publish(self.multi_state)
-    
-    def apply_noise(self, fullstate: FullState):
-        """
-        Apply noise to the given full state.
-
-        Args:
-            fullstate (FullState): The full state to apply noise to.
-
-        Returns:
-            FullState: The full state with applied noise.
-        """
-        return fullstate
         
 def main(args=None):
     rclpy.init(args=args)
@@ -26,6 +26,8 @@ setup(
             "plotter = bumper_cars.plotter:main",
             "converter = bumper_cars.converter:main",
             "broadcaster = bumper_cars.broadcaster:main",
+            "composed = bumper_cars.composed:main",
+            "latency = bumper_cars.latency:main",
         ],
     },
 )
@@ -1,58 +1,56 @@
 import numpy as np
 
-from cvxopt import matrix, solvers
-from cvxopt import matrix
 from planner import utils as utils
+from planner.deadline import Deadline, braking_input
+from planner.noise import StateNoise
+from planner.profiler import span
 # import planner.utils as utils
 
-from custom_message.msg import ControlInputs, State, MultiControl, Coordinate
 
 # For the parameter file
-import pathlib
-import json
+from planner.config import get_config, load_data
+from planner.lazy import lazy_import
 import math
-import matplotlib.pyplot as plt 
 import time
 
-
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-L = json_object["Car_model"]["L"]
-max_steer = json_object["C3BF"]["max_steer"]  # [rad] max steering angle
-max_speed = json_object["Car_model"]["max_speed"] # [m/s]
-min_speed = json_object["Car_model"]["min_speed"] # [m/s]
-max_acc = json_object["C3BF"]["max_acc"] 
-min_acc = json_object["C3BF"]["min_acc"] 
-car_max_acc = json_object["Controller"]["max_acc"]
-car_min_acc = json_object["Controller"]["min_acc"]
-dt = json_object["Controller"]["dt"]
-safety_radius = json_object["C3BF"]["safety_radius"]
-barrier_gain = json_object["C3BF"]["barrier_gain"]
-arena_gain = json_object["C3BF"]["arena_gain"]
-Kv = json_object["C3BF"]["Kv"] # interval [0.5-1]
+plt = lazy_import('matplotlib.pyplot')
+cvxopt = lazy_import('cvxopt')
+msg = lazy_import('custom_message.msg')
+
+params = get_config()
+
+L = params.Car_model.L
+max_steer = params.C3BF.max_steer  # [rad] max steering angle
+max_speed = params.Car_model.max_speed # [m/s]
+min_speed = params.Car_model.min_speed # [m/s]
+max_acc = params.C3BF.max_acc 
+min_acc = params.C3BF.min_acc 
+car_max_acc = params.Controller.max_acc
+car_min_acc = params.Controller.min_acc
+dt = params.Controller.dt
+deadline = params.Controller.deadline # [s] time budget of each robot, 0 to disable
+qp_max_iter = params.Controller.qp_max_iter
+safety_radius = params.C3BF.safety_radius
+barrier_gain = params.C3BF.barrier_gain
+arena_gain = params.C3BF.arena_gain
+Kv = params.C3BF.Kv # interval [0.5-1]
 Lr = L / 2.0  # [m]
 Lf = L - Lr
-WB = json_object["Controller"]["WB"]
-robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-min_dist = json_object["min_dist"]
-to_goal_stop_distance = json_object["to_goal_stop_distance"]
+WB = params.Controller.WB
+robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
+to_goal_stop_distance = params.to_goal_stop_distance
 boundary_points = np.array([-width_init/2, width_init/2, -height_init/2, height_init/2])
 check_collision_bool = False
-add_noise = json_object["add_noise"]
-noise_scale_param = json_object["noise_scale_param"]
-np.random.seed(1)
+show_animation = params.show_animation
+add_noise = params.add_noise
+noise_scale_param = params.noise_scale_param
+noise_seed = params.noise_seed # seed of the measurement noise, the same for every run
 
 color_dict = {0: 'r', 1: 'b', 2: 'g', 3: 'y', 4: 'm', 5: 'c', 6: 'k', 7: 'tab:orange', 8: 'tab:brown', 9: 'tab:gray', 10: 'tab:olive', 11: 'tab:pink', 12: 'tab:purple', 13: 'tab:red', 14: 'tab:blue', 15: 'tab:green'}
-with open('/home/giacomo/thesis_ws/src/seeds/circular_seed_10.json', 'r') as file:
-    data = json.load(file)
-
 def delta_to_beta(delta):
     """
     Converts the steering angle delta to the slip angle beta.
@@ -171,7 +169,7 @@ def update_robot_state(i, x, dxu, multi_control, targets):
         tuple: Updated state of all robots and updated multi_control object.
 
     """
-    cmd = ControlInputs()
+    cmd = msg.ControlInputs()
 
     x1 = utils.array_to_state(x[:, i])
     cmd.throttle, cmd.delta = dxu[0, i], dxu[1, i]
@@ -212,20 +210,23 @@ class C3BF_algorithm():
         self.reached_goal = [False]*robot_num
         self.computational_time = []
         self.solver_failure = 0
+        self.deadline = Deadline(deadline, robot_num)
+        self.noise = StateNoise(robot_num, noise_scale_param, noise_seed)
 
     def run_3cbf(self, x, break_flag):
         for i in range(self.robot_num):
-            t_prev = time.time()
+            t_prev = time.perf_counter_ns()
 
             if add_noise: 
-                noise = np.concatenate([np.random.normal(0, 0.21*noise_scale_param, 2).reshape(2, 1), np.random.normal(0, np.radians(5)*noise_scale_param, 1).reshape(1,1), np.random.normal(0, 0.2*noise_scale_param, 1).reshape(1,1)], axis=0)
+                noise = self.noise.sample(i).reshape(4, 1)
                 noisy_pos = x + noise
                 self.control_robot(i, noisy_pos)
-                plt.plot(noisy_pos[0,i], noisy_pos[1,i], "x"+color_dict[i], markersize=10)
+                if show_animation:
+                    plt.plot(noisy_pos[0,i], noisy_pos[1,i], "x"+color_dict[i], markersize=10)
             else:
                 self.control_robot(i, x)
 
-            self.computational_time.append((time.time() - t_prev))
+            self.computational_time.append((time.perf_counter_ns() - t_prev)*1e-9)
             # Step 9: Check if the distance between the current position and the target is less than 5
             if utils.dist(point1=(x[0,i], x[1,i]), point2=self.targets[i]) < 4:
                 # Perform some action when the condition is met
@@ -237,10 +238,11 @@ class C3BF_algorithm():
                 self.targets[i] = (self.paths[i][0].x, self.paths[i][0].y)
 
             x[:, i] = utils.motion(x[:, i], self.dxu[:, i], dt)
-            plot_robot(x[0, i], x[1, i], x[2, i], i)
-            utils.plot_arrow(x[0, i], x[1, i], x[2, i] + self.dxu[1, i], length=3, width=0.5)
-            utils.plot_arrow(x[0, i], x[1, i], x[2, i], length=1, width=0.5)
-            plt.plot(self.targets[i][0], self.targets[i][1], "x", color = color_dict[i])
+            if show_animation:
+                plot_robot(x[0, i], x[1, i], x[2, i], i)
+                utils.plot_arrow(x[0, i], x[1, i], x[2, i] + self.dxu[1, i], length=3, width=0.5)
+                utils.plot_arrow(x[0, i], x[1, i], x[2, i], length=1, width=0.5)
+                plt.plot(self.targets[i][0], self.targets[i][1], "x", color = color_dict[i])
         
         return x, break_flag
     
@@ -249,16 +251,17 @@ class C3BF_algorithm():
             # Step 9: Check if the distance between the current position and the target is less than 5
             if not self.reached_goal[i]:
                 if add_noise: 
-                    noise = np.concatenate([np.random.normal(0, 0.21*noise_scale_param, 2).reshape(2, 1), np.random.normal(0, np.radians(5)*noise_scale_param, 1).reshape(1,1), np.random.normal(0, 0.2*noise_scale_param, 1).reshape(1,1)], axis=0)
+                    noise = self.noise.sample(i).reshape(4, 1)
                     noisy_pos = x + noise
-                    t_prev = time.time()
+                    t_prev = time.perf_counter_ns()
                     self.control_robot(i, noisy_pos)
-                    self.computational_time.append((time.time() - t_prev))
-                    plt.plot(noisy_pos[0,i], noisy_pos[1,i], "x"+color_dict[i], markersize=10)
+                    self.computational_time.append((time.perf_counter_ns() - t_prev)*1e-9)
+                    if show_animation:
+                        plt.plot(noisy_pos[0,i], noisy_pos[1,i], "x"+color_dict[i], markersize=10)
                 else:
-                    t_prev = time.time()
+                    t_prev = time.perf_counter_ns()
                     self.control_robot(i, x)
-                    self.computational_time.append((time.time() - t_prev)) 
+                    self.computational_time.append((time.perf_counter_ns() - t_prev)*1e-9) 
                                               
                 # If goal is reached, stop the robot
                 if check_goal_reached(x, self.targets, i, distance=to_goal_stop_distance):
@@ -272,10 +275,11 @@ class C3BF_algorithm():
             if all(self.reached_goal):
                 break_flag = True
 
-            plot_robot(x[0, i], x[1, i], x[2, i], i)
-            utils.plot_arrow(x[0, i], x[1, i], x[2, i] + self.dxu[1, i], length=3, width=0.5)
-            utils.plot_arrow(x[0, i], x[1, i], x[2, i], length=1, width=0.5)
-            plt.scatter(self.targets[i][0], self.targets[i][1], marker="x", color=color_dict[i], s=200)
+            if show_animation:
+                plot_robot(x[0, i], x[1, i], x[2, i], i)
+                utils.plot_arrow(x[0, i], x[1, i], x[2, i] + self.dxu[1, i], length=3, width=0.5)
+                utils.plot_arrow(x[0, i], x[1, i], x[2, i], length=1, width=0.5)
+                plt.scatter(self.targets[i][0], self.targets[i][1], marker="x", color=color_dict[i], s=200)
             # print(f"Speed of robot {i}: {x[3, i]}")
 
         return x, break_flag
@@ -297,14 +301,15 @@ class C3BF_algorithm():
         """
         # dxu = np.zeros((2, self.robot_num))
 
-        cmd = ControlInputs()
-        
         x = self.check_collision(x, i)
-        x1 = utils.array_to_state(x[:, i])
-        cmd.throttle, cmd.delta = utils.pure_pursuit_steer_control(self.targets[i], x1)
-        self.dxu[0, i], self.dxu[1, i] = cmd.throttle, cmd.delta
-
-        self.C3BF(i, x)
+        x1 = utils.array_to_pose(x[:, i])
+        with span("C3BF.reference"):
+            self.dxu[0, i], self.dxu[1, i] = utils.pure_pursuit_steer_control(self.targets[i], x1)
+
+        self.deadline.start(i)
+        with span("C3BF.C3BF"):
+            self.C3BF(i, x)
+        self.deadline.stop(i)
     
     def C3BF(self, i, x):
         """
@@ -485,13 +490,18 @@ class C3BF_algorithm():
         G = np.vstack([G, [[1, 0], [-1, 0]]])
         H = np.vstack([H, max_acc, -min_acc])
 
-        solvers.options['show_progress'] = False
-        try:
-            sol = solvers.qp(matrix(P), matrix(q), matrix(G), matrix(H))
-            self.dxu[:,i] = np.reshape(np.array(sol['x']), (M,))
-        except:
-            print("QP solver failed")   
-            self.solver_failure += 1         
+        cvxopt.solvers.options['show_progress'] = False
+        if self.deadline.expired():
+            # no time left for the QP, brake with straight wheels
+            self.dxu[:,i] = braking_input(x[3,i], car_min_acc, car_max_acc, dt)
+        else:
+            try:
+                with span("C3BF.qp"):
+                    sol = cvxopt.solvers.qp(cvxopt.matrix(P), cvxopt.matrix(q), cvxopt.matrix(G), cvxopt.matrix(H), options={'maxiters': qp_max_iter, 'show_progress': False})
+                self.dxu[:,i] = np.reshape(np.array(sol['x']), (M,))
+            except:
+                print("QP solver failed")   
+                self.solver_failure += 1         
         
         if self.dxu[0,i] > max_acc or self.dxu[0,i] < min_acc:
             print("Throttle out of bounds: ")
@@ -574,10 +584,10 @@ def main(args=None):
     c3bf = C3BF_algorithm(targets, paths, robot_num) 
     
     # Step 6: Create a MultiControl object
-    multi_control = MultiControl()
+    multi_control = msg.MultiControl()
     
     # Step 7: Initialize the multi_control list with ControlInputs objects
-    multi_control.multi_control = [ControlInputs(delta=0.0, throttle=0.0) for _ in range(robot_num)]
+    multi_control.multi_control = [msg.ControlInputs(delta=0.0, throttle=0.0) for _ in range(robot_num)]
     
     # Step 8: Perform the simulation for the specified number of iterations
     for z in range(iterations):
@@ -620,6 +630,7 @@ def main1(args=None):
         - Update the predicted trajectory.
         - Plot the map and pause for visualization.
     """
+    data = load_data('seeds', 'circular_seed_10.json')
     # Step 1: Set the number of iterations
     iterations = 3000
     fig = plt.figure(1, dpi=90, figsize=(20,10))
@@ -644,7 +655,7 @@ def main1(args=None):
     
     # Step 4: Create paths for each robot
     traj = data['trajectories']
-    paths = [[Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
+    paths = [[msg.Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
 
     # Step 5: Extract the target coordinates from the paths
     # targets = [[path[0].x, path[0].y] for path in paths]
@@ -694,6 +705,7 @@ def main2(args=None):
         - Update the predicted trajectory.
         - Plot the map and pause for visualization.
     """
+    data = load_data('seeds', 'circular_seed_10.json')
     # Step 1: Set the number of iterations
     iterations = 3000
     fig = plt.figure(1, dpi=90, figsize=(10,10))
@@ -711,7 +723,7 @@ def main2(args=None):
     
     # Step 4: Create paths for each robot
     traj = data['trajectories']
-    paths = [[Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
+    paths = [[msg.Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
 
     # Step 5: Extract the target coordinates from the paths
     targets = [[path[0].x, path[0].y] for path in paths]
@@ -719,10 +731,10 @@ def main2(args=None):
     c3bf = C3BF_algorithm(targets, paths, robot_num)
     
     # Step 6: Create a MultiControl object
-    multi_control = MultiControl()
+    multi_control = msg.MultiControl()
     
     # Step 7: Initialize the multi_control list with ControlInputs objects
-    multi_control.multi_control = [ControlInputs(delta=0.0, throttle=0.0) for _ in range(robot_num)]
+    multi_control.multi_control = [msg.ControlInputs(delta=0.0, throttle=0.0) for _ in range(robot_num)]
     
     # Step 8: Perform the simulation for the specified number of iterations
     for z in range(iterations):
@@ -768,6 +780,7 @@ def main_seed(args=None):
         - Update the predicted trajectory.
         - Plot the map and pause for visualization.
     """
+    data = load_data('seeds', 'circular_seed_10.json')
     # Step 1: Set the number of iterations
     iterations = 3000
     fig = plt.figure(1, dpi=90, figsize=(10,10))
@@ -786,7 +799,7 @@ def main_seed(args=None):
     
     # Step 4: Create paths for each robot
     traj = data['trajectories']
-    paths = [[Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
+    paths = [[msg.Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
 
     # Step 5: Extract the target coordinates from the paths
     targets = [[path[0].x, path[0].y] for path in paths]
@@ -7,28 +7,24 @@ from cvxopt.blas import dot
 from cvxopt.solvers import qp, options
 from cvxopt import matrix, sparse
 from planner.utils import *
+from custom_message.msg import ControlInputs
+import matplotlib.pyplot as plt
 from planner.predict_traj import predict_trajectory
 
 # For the parameter file
-import pathlib
-import json
-
-# TODO: import all this parameters from a config file so that we can easily change them in one place
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-L = 2.9 #json_object["Car_model"]["L"]
-max_steer = 0.523599 #json_object["CBF_simple"]["max_steer"]  # [rad] max steering angle
-max_speed = 6 #json_object["Car_model"]["max_speed"] # [m/s]
-min_speed = 0.5 #json_object["Car_model"]["min_speed"] # [m/s]
-max_acc = 400 #json_object["CBF_simple"]["max_acc"] 
-min_acc = -400 #json_object["CBF_simple"]["min_acc"] 
-safety_radius = 6 #json_object["CBF_simple"]["safety_radius"]
-barrier_gain = 1 #json_object["CBF_simple"]["barrier_gain"]
-Kv = 0.1 #json_object["CBF_simple"]["Kv"] # interval [0.5-1]
+from planner.config import get_config
+
+params = get_config()
+
+L = 2.9 #params.Car_model.L
+max_steer = 0.523599 #params.CBF_simple.max_steer  # [rad] max steering angle
+max_speed = 6 #params.Car_model.max_speed # [m/s]
+min_speed = 0.5 #params.Car_model.min_speed # [m/s]
+max_acc = 400 #params.CBF_simple.max_acc 
+min_acc = -400 #params.CBF_simple.min_acc 
+safety_radius = 6 #params.CBF_simple.safety_radius
+barrier_gain = 1 #params.CBF_simple.barrier_gain
+Kv = 0.1 #params.CBF_simple.Kv # interval [0.5-1]
 Lr = L / 2.0  # [m]
 Lf = L - Lr
 
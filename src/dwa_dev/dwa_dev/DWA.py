@@ -1,75 +1,80 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import math
 import planner.utils as utils
+from planner.recorder import TrajectoryRecorder
+from planner.deadline import Deadline, braking_input
+from planner.noise import StateNoise
+from planner.profiler import span
 # For the parameter file
-import pathlib
-import json
-from custom_message.msg import Coordinate
+from planner.config import get_config, load_data
+from planner.lazy import lazy_import
 from shapely.geometry import Point, LineString
 from shapely import distance
-from shapely.plotting import plot_polygon
 import time
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-max_steer = json_object["DWA"]["max_steer"] # [rad] max steering angle
-max_speed = json_object["DWA"]["max_speed"] # [m/s]
-min_speed = json_object["DWA"]["min_speed"] # [m/s]
-v_resolution = json_object["DWA"]["v_resolution"] # [m/s]
-delta_resolution = math.radians(json_object["DWA"]["delta_resolution"])# [rad/s]
-max_acc = json_object["DWA"]["max_acc"] # [m/ss]
-min_acc = json_object["DWA"]["min_acc"] # [m/ss]
-dt = json_object["Controller"]["dt"] # [s] Time tick for motion prediction
-predict_time = json_object["DWA"]["predict_time"] # [s]
-to_goal_cost_gain = json_object["DWA"]["to_goal_cost_gain"]
-speed_cost_gain = json_object["DWA"]["speed_cost_gain"]
-obstacle_cost_gain = json_object["DWA"]["obstacle_cost_gain"]
-heading_cost_gain = json_object["DWA"]["heading_cost_gain"]
-robot_stuck_flag_cons = json_object["DWA"]["robot_stuck_flag_cons"]
-dilation_factor = json_object["DWA"]["dilation_factor"]
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
+plt = lazy_import('matplotlib.pyplot')
+shapely_plotting = lazy_import('shapely.plotting')
+msg = lazy_import('custom_message.msg')
+
+params = get_config()
+
+max_steer = params.DWA.max_steer # [rad] max steering angle
+max_speed = params.DWA.max_speed # [m/s]
+min_speed = params.DWA.min_speed # [m/s]
+v_resolution = params.DWA.v_resolution # [m/s]
+delta_resolution = math.radians(params.DWA.delta_resolution)# [rad/s]
+max_acc = params.DWA.max_acc # [m/ss]
+min_acc = params.DWA.min_acc # [m/ss]
+dt = params.Controller.dt # [s] Time tick for motion prediction
+deadline = params.Controller.deadline # [s] time budget of each robot, 0 to disable
+predict_time = params.DWA.predict_time # [s]
+to_goal_cost_gain = params.DWA.to_goal_cost_gain
+speed_cost_gain = params.DWA.speed_cost_gain
+obstacle_cost_gain = params.DWA.obstacle_cost_gain
+heading_cost_gain = params.DWA.heading_cost_gain
+robot_stuck_flag_cons = params.DWA.robot_stuck_flag_cons
+dilation_factor = params.DWA.dilation_factor
+L = params.Car_model.L  # [m] Wheel base of vehicle
 Lr = L / 2.0  # [m]
 Lf = L - Lr
-Cf = json_object["Car_model"]["Cf"]  # N/rad
-Cr = json_object["Car_model"]["Cr"] # N/rad
-Iz = json_object["Car_model"]["Iz"]  # kg/m2
-m = json_object["Car_model"]["m"]  # kg
+Cf = params.Car_model.Cf  # N/rad
+Cr = params.Car_model.Cr # N/rad
+Iz = params.Car_model.Iz  # kg/m2
+m = params.Car_model.m  # kg
 # Aerodynamic and friction coefficients
-c_a = json_object["Car_model"]["c_a"]
-c_r1 = json_object["Car_model"]["c_r1"]
-WB = json_object["Controller"]["WB"] # Wheel base
-L_d = json_object["Controller"]["L_d"]  # [m] look-ahead distance
-robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-min_dist = json_object["min_dist"]
-to_goal_stop_distance = json_object["to_goal_stop_distance"]
+c_a = params.Car_model.c_a
+c_r1 = params.Car_model.c_r1
+WB = params.Controller.WB # Wheel base
+L_d = params.Controller.L_d  # [m] look-ahead distance
+robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
+to_goal_stop_distance = params.to_goal_stop_distance
 update_dist = 2
 # N=3
 
-robot_num = json_object["robot_num"]
-timer_freq = json_object["timer_freq"]
+robot_num = params.robot_num
+timer_freq = params.timer_freq
 
-show_animation = json_object["show_animation"]
+show_animation = params.show_animation
 boundary_points = np.array([-width_init/2, width_init/2, -height_init/2, height_init/2])
 check_collision_bool = False
-add_noise = json_object["add_noise"]
-noise_scale_param = json_object["noise_scale_param"]
-np.random.seed(1)
+add_noise = params.add_noise
+noise_scale_param = params.noise_scale_param
+noise_seed = params.noise_seed # seed of the measurement noise, the same for every run
 
 color_dict = {0: 'r', 1: 'b', 2: 'g', 3: 'y', 4: 'm', 5: 'c', 6: 'k'}
 
-with open('/home/giacomo/thesis_ws/src/trajectories.json', 'r') as file:
-    data = json.load(file)
+def trajectory_library():
+    """
+    The precomputed trajectories of the dynamic window (trajectories.json), loaded at the first call.
 
-with open('/home/giacomo/thesis_ws/src/seeds/seed_1.json', 'r') as file:
-    seed = json.load(file)
+    Returns:
+        dict: The trajectories indexed by initial speed, acceleration and steering.
+    """
+    return load_data('trajectories.json')
 
 def normalize_angle(angle):
     """
@@ -170,8 +175,9 @@ def calc_obstacle_cost(trajectory, ob):
     minyn = min(abs(-height_init/2-trajectory[:, 1]))
     min_distance = min(minxp, minxn, minyp, minyn)
 
-    line = LineString(zip(trajectory[:, 0], trajectory[:, 1]))
-    dilated = line.buffer(dilation_factor, cap_style=3)
+    with span("DWA.obstacle_geometry"):
+        line = LineString(zip(trajectory[:, 0], trajectory[:, 1]))
+        dilated = line.buffer(dilation_factor, cap_style=3)
 
     x = trajectory[:, 0]
     y = trajectory[:, 1]
@@ -336,7 +342,7 @@ def plot_robot_trajectory(x, u, predicted_trajectory, dilated_traj, targets, ax,
 
     """
     plt.plot(predicted_trajectory[i][:, 0], predicted_trajectory[i][:, 1], "-"+color_dict[i])
-    plot_polygon(dilated_traj[i], ax=ax, add_points=False, alpha=0.5, color=color_dict[i])
+    shapely_plotting.plot_polygon(dilated_traj[i], ax=ax, add_points=False, alpha=0.5, color=color_dict[i])
     # plt.plot(x[0, i], x[1, i], "xr")
     plt.plot(targets[i][0], targets[i][1], "x"+color_dict[i], markersize=15)
     plot_robot(x[0, i], x[1, i], x[2, i], i)
@@ -386,6 +392,8 @@ class DWA_algorithm():
         u_hist (list): List of control inputs history for each robot.
         reached_goal (list): List of flags indicating if each robot has reached its goal.
         computational_time (list): List of computational times for each iteration.
+        deadline (Deadline): Time budget of each robot, counts the deadline misses.
+        noise (StateNoise): Measurement noise of each robot, reproducible for a given noise_seed.
 
     Methods:
         run_dwa: Runs the DWA algorithm.
@@ -406,6 +414,8 @@ class DWA_algorithm():
         self.u_hist = u_hist
         self.reached_goal = [False]*robot_num
         self.computational_time = []
+        self.deadline = Deadline(deadline, robot_num)
+        self.noise = StateNoise(robot_num, noise_scale_param, noise_seed)
 
     def run_dwa(self, x, u, break_flag):
         """
@@ -431,9 +441,9 @@ class DWA_algorithm():
                 
                 self.targets[i] = (self.paths[i][0].x, self.paths[i][0].y)
 
-            t_prev = time.time()
+            t_prev = time.perf_counter_ns()
             x, u = self.update_robot_state(x, u, dt, i)
-            self.computational_time.append(time.time()-t_prev)
+            self.computational_time.append((time.perf_counter_ns() - t_prev)*1e-9)
 
             if check_goal_reached(x, self.targets, i):
                 break_flag = True
@@ -465,9 +475,9 @@ class DWA_algorithm():
                     self.reached_goal[i] = True
                 else:
                     # If goal is not reached, update the robot's state
-                    time_prev = time.time()
+                    time_prev = time.perf_counter_ns()
                     x, u = self.update_robot_state(x, u, dt, i)
-                    self.computational_time.append(time.time()-time_prev)
+                    self.computational_time.append((time.perf_counter_ns() - time_prev)*1e-9)
                     
             # print(f"Speed of robot {i}: {x[3, i]}")
             
@@ -498,15 +508,17 @@ class DWA_algorithm():
             Exception: If a collision is detected.
 
         """
+        self.deadline.start(i)
         x1 = x[:, i]
         ob = [self.dilated_traj[idx] for idx in range(len(self.dilated_traj)) if idx != i]
         if add_noise:
-            noise = np.concatenate([np.random.normal(0, 0.21*noise_scale_param, 2).reshape(1, 2), np.random.normal(0, np.radians(5)*noise_scale_param, 1).reshape(1,1), np.random.normal(0, 0.2*noise_scale_param, 1).reshape(1,1)], axis=1)
-            noisy_pos = x1 + noise[0]
+            noisy_pos = x1 + self.noise.sample(i)
             u1, predicted_trajectory1, u_history = self.dwa_control(noisy_pos, ob, i)
-            plt.plot(noisy_pos[0], noisy_pos[1], "x"+color_dict[i], markersize=10)
+            if show_animation:
+                plt.plot(noisy_pos[0], noisy_pos[1], "x"+color_dict[i], markersize=10)
         else:
             u1, predicted_trajectory1, u_history = self.dwa_control(x1, ob, i)
+        self.deadline.stop(i)
         self.dilated_traj[i] = LineString(zip(predicted_trajectory1[:, 0], predicted_trajectory1[:, 1])).buffer(dilation_factor, cap_style=3)
 
         # Collision check
@@ -556,54 +568,76 @@ class DWA_algorithm():
                 tuple: Tuple containing the control inputs (throttle, delta) and the trajectory.
             """
             min_cost = float("inf")
-            best_u = [0.0, 0.0]
-            best_trajectory = np.array([x])
+            # braking is used if no candidate has a finite cost
+            best_u = braking_input(x[3], min_acc, max_acc, dt)
+            best_trajectory = np.array([x, x])
+            u_history = [best_u]
             u_buf = self.u_hist[i]
             goal = self.targets[i] 
             trajectory_buf = self.predicted_trajectory[i]
 
             # evaluate all trajectory with sampled input in dynamic window
             nearest = find_nearest(np.arange(min_speed, max_speed, v_resolution), x[3])
-
-            for a in np.arange(dw[0], dw[1]+v_resolution, v_resolution):
-                for delta in np.arange(dw[2], dw[3]+delta_resolution, delta_resolution):
-
-                    # old_time = time.time()
-                    geom = data[str(nearest)][str(a)][str(delta)]
-                    geom = np.array(geom)
-                    geom[:,0:2] = (geom[:,0:2]) @ rotateMatrix(np.radians(90)-x[2]) + [x[0],x[1]]
-                    # print(time.time()-old_time)
-                    geom[:,2] = geom[:,2] + x[2] - np.pi/2 #bringing also the yaw angle in the new frame
-
-                    # trajectory = predict_trajectory(x_init, a, delta)
-                    trajectory = geom
-                    # calc cost
-
-                    to_goal_cost = to_goal_cost_gain * calc_to_goal_cost(trajectory, goal)
-                    speed_cost = speed_cost_gain * (max_speed - trajectory[-1, 3])
-                    if trajectory[-1, 3] <= 0.0:
-                        speed_cost = 10
-                    else:
-                        speed_cost = 0.0
+            data = trajectory_library()
+
+            with span("DWA.rollout"):
+                candidates = []
+                for a in np.arange(dw[0], dw[1]+v_resolution, v_resolution):
+                    for delta in np.arange(dw[2], dw[3]+delta_resolution, delta_resolution):
+
+                        # old_time = time.time()
+                        geom = data[str(nearest)][str(a)][str(delta)]
+                        geom = np.array(geom)
+                        geom[:,0:2] = (geom[:,0:2]) @ rotateMatrix(np.radians(90)-x[2]) + [x[0],x[1]]
+                        # print(time.time()-old_time)
+                        geom[:,2] = geom[:,2] + x[2] - np.pi/2 #bringing also the yaw angle in the new frame
+
+                        # trajectory = predict_trajectory(x_init, a, delta)
+                        trajectory = geom
+                        # calc cost
+
+                        to_goal_cost = to_goal_cost_gain * calc_to_goal_cost(trajectory, goal)
+                        speed_cost = speed_cost_gain * (max_speed - trajectory[-1, 3])
+                        if trajectory[-1, 3] <= 0.0:
+                            speed_cost = 10
+                        else:
+                            speed_cost = 0.0
+                        candidates.append((to_goal_cost + speed_cost, len(candidates), a, delta, trajectory, to_goal_cost, speed_cost))
+
+            # Best-first search: the cost without the obstacle cost is a lower bound of the final cost,
+            # so the candidates are evaluated from the most promising one and the search stops when
+            # no remaining candidate can do better or when the deadline expires.
+            candidates.sort(key=lambda c: (c[0], -c[1]))
+            best_index = -1
+            for n, (lower_bound, index, a, delta, trajectory, to_goal_cost, speed_cost) in enumerate(candidates):
+                # the first candidate is always evaluated, so the best-so-far input is never empty
+                if lower_bound > min_cost or (n > 0 and self.deadline.expired()):
+                    break
+                with span("DWA.obstacle_cost"):
                     ob_cost = obstacle_cost_gain * calc_obstacle_cost(trajectory, ob)
-                    # heading_cost = heading_cost_gain * calc_to_goal_heading_cost(trajectory, goal)
-                    final_cost = to_goal_cost + ob_cost + speed_cost # + heading_cost #+ speed_cost 
-                    
-                    # search minimum trajectory
-                    if min_cost >= final_cost:
-                        min_cost = final_cost
-                        best_u = [a, delta]
+                # heading_cost = heading_cost_gain * calc_to_goal_heading_cost(trajectory, goal)
+                final_cost = to_goal_cost + ob_cost + speed_cost # + heading_cost #+ speed_cost 
+                
+                # search minimum trajectory, ties go to the last sampled input
+                if final_cost < min_cost or (final_cost == min_cost and index > best_index):
+                    min_cost = final_cost
+                    best_index = index
+                    best_u = [a, delta]
+                    best_trajectory = trajectory
+                    u_history = [[a, delta] for _ in range(len(trajectory-1))]
+                    if abs(best_u[0]) < robot_stuck_flag_cons \
+                            and abs(x[2]) < robot_stuck_flag_cons:
+                        # to ensure the robot do not get stuck in
+                        # best v=0 m/s (in front of an obstacle) and
+                        # best omega=0 rad/s (heading to the goal with
+                        # angle difference of 0)
+                        best_u[1] = -max_steer
                         best_trajectory = trajectory
-                        u_history = [[a, delta] for _ in range(len(trajectory-1))]
-                        if abs(best_u[0]) < robot_stuck_flag_cons \
-                                and abs(x[2]) < robot_stuck_flag_cons:
-                            # to ensure the robot do not get stuck in
-                            # best v=0 m/s (in front of an obstacle) and
-                            # best omega=0 rad/s (heading to the goal with
-                            # angle difference of 0)
-                            best_u[1] = -max_steer
-                            best_trajectory = trajectory
-                            u_history = [delta]*len(trajectory)
+                        u_history = [delta]*len(trajectory)
+            if best_index == -1 and self.deadline.expired():
+                # the deadline expired before a feasible candidate was found: brake
+                best_u = braking_input(x[3], min_acc, max_acc, dt)
+                return best_u, np.array([x[0:3], x[0:3]]), [best_u]
             # print(time.time()-old_time)
             if len(u_buf) > 4:              
                 u_buf.pop(0)
@@ -624,12 +658,9 @@ class DWA_algorithm():
             elif min_cost == np.inf:
                 # emergency stop
                 print("Emergency stop")
-                if x[3]>0:
-                    best_u = [min_acc, 0]
-                else:
-                    best_u = [max_acc, 0]
+                best_u = braking_input(x[3], min_acc, max_acc, dt)
                 best_trajectory = np.array([x[0:3], x[0:3]])
-                u_history = [min_acc, 0]
+                u_history = [best_u]
 
             return best_u, best_trajectory, u_history
     
@@ -695,8 +726,8 @@ def main():
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -721,7 +752,7 @@ def main():
 
             x, u = dwa.update_robot_state(x, u, dt, i)
 
-            trajectory = np.dstack([trajectory, x])
+            recorder.append(x)
 
             if check_goal_reached(x, targets, i):
                 break_flag = True
@@ -737,6 +768,7 @@ def main():
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -762,6 +794,7 @@ def main1():
     12. Print "Done" when the loop is finished.
     13. Plot the final trajectories if animation is enabled.
     """
+    seed = load_data('seeds', 'seed_1.json')
     
     print(__file__ + " start!!")
     iterations = 3000
@@ -778,8 +811,8 @@ def main1():
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -787,7 +820,7 @@ def main1():
 
     # Step 4: Create paths for each robot
     traj = seed['trajectories']
-    paths = [[Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
+    paths = [[msg.Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
 
     # Step 5: Extract the target coordinates from the paths
     targets = [[path[0].x, path[0].y] for path in paths]
@@ -820,7 +853,7 @@ def main1():
 
             x, u = dwa.update_robot_state(x, u, dt, i)
 
-            trajectory = np.dstack([trajectory, x])
+            recorder.append(x)
 
             if check_goal_reached(x, targets, i):
                 break_flag = True
@@ -836,6 +869,7 @@ def main1():
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -861,6 +895,7 @@ def main_seed():
     12. Print "Done" when the loop is finished.
     13. Plot the final trajectories if animation is enabled.
     """
+    seed = load_data('seeds', 'seed_1.json')
     
     print(__file__ + " start!!")
     iterations = 3000
@@ -877,8 +912,8 @@ def main_seed():
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -886,7 +921,7 @@ def main_seed():
 
     # Step 4: Create paths for each robot
     traj = seed['trajectories']
-    paths = [[Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
+    paths = [[msg.Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
 
     # Step 5: Extract the target coordinates from the paths
     targets = [[path[0].x, path[0].y] for path in paths]
@@ -908,7 +943,7 @@ def main_seed():
         plt.gcf().canvas.mpl_connect('key_release_event', lambda event: [exit(0) if event.key == 'escape' else None])
         
         x, u, break_flag = dwa.run_dwa(x, u, break_flag)
-        trajectory = np.dstack([trajectory, x])
+        recorder.append(x)
             
         utils.plot_map(width=width_init, height=height_init)
         plt.axis("equal")
@@ -918,6 +953,7 @@ def main_seed():
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -3,7 +3,7 @@ import numpy as np
 import math
 from enum import Enum
 # For the parameter file
-import pathlib
+from planner.config import get_config, data_file
 import json
 from shapely.geometry import Point, LineString
 from shapely.plotting import plot_polygon, plot_line
@@ -12,47 +12,43 @@ import planner.utils as utils
 
 color_dict = {0: 'r', 1: 'b', 2: 'g', 3: 'y', 4: 'm', 5: 'c', 6: 'k'}
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-max_steer = json_object["DWA"]["max_steer"] # [rad] max steering angle
-max_speed = json_object["DWA"]["max_speed"] # [m/s]
-min_speed = json_object["DWA"]["min_speed"] # [m/s]
-a_resolution = json_object["DWA"]["a_resolution"] # [m/s²]
-v_resolution = json_object["DWA"]["v_resolution"] # [m/s]
-delta_resolution = math.radians(json_object["DWA"]["delta_resolution"])# [rad/s]
-max_acc = json_object["DWA"]["max_acc"] # [m/ss]
-min_acc = json_object["DWA"]["min_acc"] # [m/ss]
-dt = json_object["Controller"]["dt"] # [s] Time tick for motion prediction
-predict_time = json_object["DWA"]["predict_time"] # [s]
-to_goal_cost_gain = json_object["DWA"]["to_goal_cost_gain"]
-speed_cost_gain = json_object["DWA"]["speed_cost_gain"]
-obstacle_cost_gain = json_object["DWA"]["obstacle_cost_gain"]
-robot_stuck_flag_cons = json_object["DWA"]["robot_stuck_flag_cons"]
-dilation_factor = json_object["DWA"]["dilation_factor"]
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
+params = get_config()
+
+max_steer = params.DWA.max_steer # [rad] max steering angle
+max_speed = params.DWA.max_speed # [m/s]
+min_speed = params.DWA.min_speed # [m/s]
+a_resolution = params.DWA.a_resolution # [m/s²]
+v_resolution = params.DWA.v_resolution # [m/s]
+delta_resolution = math.radians(params.DWA.delta_resolution)# [rad/s]
+max_acc = params.DWA.max_acc # [m/ss]
+min_acc = params.DWA.min_acc # [m/ss]
+dt = params.Controller.dt # [s] Time tick for motion prediction
+predict_time = params.DWA.predict_time # [s]
+to_goal_cost_gain = params.DWA.to_goal_cost_gain
+speed_cost_gain = params.DWA.speed_cost_gain
+obstacle_cost_gain = params.DWA.obstacle_cost_gain
+robot_stuck_flag_cons = params.DWA.robot_stuck_flag_cons
+dilation_factor = params.DWA.dilation_factor
+L = params.Car_model.L  # [m] Wheel base of vehicle
 Lr = L / 2.0  # [m]
 Lf = L - Lr
-Cf = json_object["Car_model"]["Cf"]  # N/rad
-Cr = json_object["Car_model"]["Cr"] # N/rad
-Iz = json_object["Car_model"]["Iz"]  # kg/m2
-m = json_object["Car_model"]["m"]  # kg
+Cf = params.Car_model.Cf  # N/rad
+Cr = params.Car_model.Cr # N/rad
+Iz = params.Car_model.Iz  # kg/m2
+m = params.Car_model.m  # kg
 # Aerodynamic and friction coefficients
-c_a = json_object["Car_model"]["c_a"]
-c_r1 = json_object["Car_model"]["c_r1"]
-WB = json_object["Controller"]["WB"] # Wheel base
-robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
+c_a = params.Car_model.c_a
+c_r1 = params.Car_model.c_r1
+WB = params.Controller.WB # Wheel base
+robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
 N=3
 save_flag = False
 show_animation = True
 plot_flag = True
-timer_freq = json_object["timer_freq"]
+timer_freq = params.timer_freq
 
 class RobotType(Enum):
     circle = 0
@@ -206,14 +202,14 @@ def main():
         # print(complete_trajectories)
         
         # saving the complete trajectories to a csv file
-        with open('trajectories.json', 'w') as file:
+        with open(data_file('trajectories.json'), 'w') as file:
             json.dump(complete_trajectories, file, indent=4)
 
         print("\nThe JSON data has been written to 'data.json'")
 
 
     # reading the first element of data.jason, rotating and traslating the geometry to and arbitrary position and plotting it
-    with open('trajectories.json', 'r') as file:
+    with open(data_file('trajectories.json'), 'r') as file:
         data = json.load(file)
 
     fig = plt.figure(1, dpi=90)
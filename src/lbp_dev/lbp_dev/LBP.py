@@ -1,68 +1,73 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import math
 from enum import Enum
 # For the parameter file
-import pathlib
-import json
-from custom_message.msg import Coordinate
+from planner.config import get_config, load_data
+from planner.lazy import lazy_import
 from shapely.geometry import Point, Polygon, LineString
 from shapely import intersection, distance
-from shapely.plotting import plot_polygon, plot_line
 import planner.utils as utils
+from planner.recorder import TrajectoryRecorder
+from planner.deadline import Deadline, braking_input
+from planner.noise import StateNoise
+from planner.profiler import span
 # for debugging
 import time
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-max_steer = json_object["LBP"]["max_steer"] # [rad] max steering angle
-max_speed = json_object["LBP"]["max_speed"] # [m/s]
-min_speed = json_object["LBP"]["min_speed"] # [m/s]
-v_resolution = json_object["LBP"]["v_resolution"] # [m/s]
-delta_resolution = math.radians(json_object["LBP"]["delta_resolution"])# [rad/s]
-max_acc = json_object["LBP"]["max_acc"] # [m/ss]
-min_acc = json_object["LBP"]["min_acc"] # [m/ss]
-dt = json_object["Controller"]["dt"] # [s] Time tick for motion prediction
-predict_time = json_object["LBP"]["predict_time"] # [s]
-to_goal_cost_gain = json_object["LBP"]["to_goal_cost_gain"]
-speed_cost_gain = json_object["LBP"]["speed_cost_gain"]
-obstacle_cost_gain = json_object["LBP"]["obstacle_cost_gain"]
-heading_cost_gain = json_object["LBP"]["heading_cost_gain"]
-robot_stuck_flag_cons = json_object["LBP"]["robot_stuck_flag_cons"]
-dilation_factor = json_object["LBP"]["dilation_factor"]
-
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
+plt = lazy_import('matplotlib.pyplot')
+shapely_plotting = lazy_import('shapely.plotting')
+msg = lazy_import('custom_message.msg')
+
+params = get_config()
+
+max_steer = params.LBP.max_steer # [rad] max steering angle
+max_speed = params.LBP.max_speed # [m/s]
+min_speed = params.LBP.min_speed # [m/s]
+v_resolution = params.LBP.v_resolution # [m/s]
+delta_resolution = math.radians(params.LBP.delta_resolution)# [rad/s]
+max_acc = params.LBP.max_acc # [m/ss]
+min_acc = params.LBP.min_acc # [m/ss]
+dt = params.Controller.dt # [s] Time tick for motion prediction
+deadline = params.Controller.deadline # [s] time budget of each robot, 0 to disable
+predict_time = params.LBP.predict_time # [s]
+to_goal_cost_gain = params.LBP.to_goal_cost_gain
+speed_cost_gain = params.LBP.speed_cost_gain
+obstacle_cost_gain = params.LBP.obstacle_cost_gain
+heading_cost_gain = params.LBP.heading_cost_gain
+robot_stuck_flag_cons = params.LBP.robot_stuck_flag_cons
+dilation_factor = params.LBP.dilation_factor
+
+L = params.Car_model.L  # [m] Wheel base of vehicle
 Lr = L / 2.0  # [m]
 Lf = L - Lr
 
-WB = json_object["Controller"]["WB"] # Wheel base
-robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-min_dist = json_object["min_dist"]
-to_goal_stop_distance = json_object["to_goal_stop_distance"]
+WB = params.Controller.WB # Wheel base
+robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
+to_goal_stop_distance = params.to_goal_stop_distance
 update_dist = 2
 N=3
 
 show_animation = True
 boundary_points = np.array([-width_init/2, width_init/2, -height_init/2, height_init/2])
 check_collision_bool = False
-add_noise = json_object["add_noise"]
-noise_scale_param = json_object["noise_scale_param"]
-np.random.seed(1)
+add_noise = params.add_noise
+noise_scale_param = params.noise_scale_param
+noise_seed = params.noise_seed # seed of the measurement noise, the same for every run
 
 color_dict = {0: 'r', 1: 'b', 2: 'g', 3: 'y', 4: 'm', 5: 'c', 6: 'k'}
 
-with open('/home/giacomo/thesis_ws/src/lbp_dev/lbp_dev/LBP.json', 'r') as file:
-    data = json.load(file)
+def trajectory_library():
+    """
+    The lattice of precomputed trajectories (LBP.json), loaded at the first call.
 
-with open('/home/giacomo/thesis_ws/src/seeds/circular_seed_11.json', 'r') as file:
-    seed = json.load(file)
+    Returns:
+        dict: The trajectories indexed by speed.
+    """
+    return load_data('lbp_dev', 'lbp_dev', 'LBP.json')
 
 def normalize_angle(angle):
     """
@@ -88,7 +93,7 @@ def rotateMatrix(a):
     """
     return np.array([[np.cos(a), -np.sin(a)], [np.sin(a), np.cos(a)]])
 
-def lbp_control(x, goal, ob, u_buf, trajectory_buf):
+def lbp_control(x, goal, ob, u_buf, trajectory_buf, deadline=None):
     """
     Calculates the control input, trajectory, and control history for the LBP algorithm.
 
@@ -98,12 +103,13 @@ def lbp_control(x, goal, ob, u_buf, trajectory_buf):
         ob (list): List of obstacles.
         u_buf (list): Buffer for storing control inputs.
         trajectory_buf (list): Buffer for storing trajectories.
+        deadline (Deadline, optional): Time budget of the robot. Defaults to None (no budget).
 
     Returns:
         tuple: Control input, trajectory, and control history.
     """
     v_search = calc_dynamic_window(x)
-    u, trajectory, u_history = calc_control_and_trajectory(x, v_search, goal, ob, u_buf, trajectory_buf)
+    u, trajectory, u_history = calc_control_and_trajectory(x, v_search, goal, ob, u_buf, trajectory_buf, deadline)
     return u, trajectory, u_history
 
 def predict_trajectory(x_init, a, delta):
@@ -149,10 +155,14 @@ def calc_dynamic_window(x):
     
     return v_search
 
-def calc_control_and_trajectory(x, v_search, goal, ob, u_buf, trajectory_buf):
+def calc_control_and_trajectory(x, v_search, goal, ob, u_buf, trajectory_buf, deadline=None):
     """
     Calculates the final input with LBP method.
 
+    The candidates are evaluated best-first, ordered by their cost without the obstacle cost,
+    which is a lower bound of their final cost. The search stops when no remaining candidate
+    can do better or when the deadline expires, keeping the best candidate found so far.
+
     Args:
         x (list): The current state of the system.
         dw (float): The dynamic window.
@@ -160,57 +170,79 @@ def calc_control_and_trajectory(x, v_search, goal, ob, u_buf, trajectory_buf):
         ob (list): The obstacle positions.
         u_buf (list): The buffer of control inputs.
         trajectory_buf (list): The buffer of trajectories.
+        deadline (Deadline, optional): Time budget of the robot. Defaults to None (no budget).
 
     Returns:
         tuple: A tuple containing the best control input, the best trajectory, and the control input history.
     """
 
     min_cost = float("inf")
-    best_u = [0.0, 0.0]
-    best_trajectory = np.array([x])
+    # braking is used if no candidate has a finite cost
+    best_u = braking_input(x[3], min_acc, max_acc, dt)
+    best_trajectory = np.array([x[0:3], x[0:3]])
+    # the history holds the steering angles of the trajectory
+    u_history = [best_u[1]]
 
     # Calculate the cost of each possible trajectory and return the minimum
-    for v in v_search:
-        dict = data[str(v)]
-        for id, info in dict.items():
-
-            # old_time = time.time()
-            geom = np.zeros((len(info['x']),3))
-            geom[:,0] = info['x']
-            geom[:,1] = info['y']
-            geom[:,2] = info['yaw']
-            geom[:,0:2] = (geom[:,0:2]) @ rotateMatrix(-x[2]) + [x[0],x[1]]
+    data = trajectory_library()
+    with span("LBP.rollout"):
+        candidates = []
+        for v in v_search:
+            dict = data[str(v)]
+            for id, info in dict.items():
+
+                # old_time = time.time()
+                geom = np.zeros((len(info['x']),3))
+                geom[:,0] = info['x']
+                geom[:,1] = info['y']
+                geom[:,2] = info['yaw']
+                geom[:,0:2] = (geom[:,0:2]) @ rotateMatrix(-x[2]) + [x[0],x[1]]
             
-            geom[:,2] = geom[:,2] + x[2] #bringing also the yaw angle in the new frame
+                geom[:,2] = geom[:,2] + x[2] #bringing also the yaw angle in the new frame
             
-            # trajectory = predict_trajectory(x_init, a, delta)
-            trajectory = geom
-            # calc cost
+                # trajectory = predict_trajectory(x_init, a, delta)
+                trajectory = geom
+                # calc cost
 
-            # TODO: small bug when increasing the factor too much for the to_goal_cost_gain
-            to_goal_cost = to_goal_cost_gain * calc_to_goal_cost(trajectory, goal)
+                # TODO: small bug when increasing the factor too much for the to_goal_cost_gain
+                to_goal_cost = to_goal_cost_gain * calc_to_goal_cost(trajectory, goal)
             
-            if v <= 0.0:
-                speed_cost = 30
-            else:
-                speed_cost = 0.0
+                if v <= 0.0:
+                    speed_cost = 30
+                else:
+                    speed_cost = 0.0
                 
+                heading_cost = heading_cost_gain * calc_to_goal_heading_cost(trajectory, goal)
+                candidates.append((to_goal_cost + heading_cost + speed_cost, len(candidates), v, info, trajectory, to_goal_cost, heading_cost, speed_cost))
+
+    candidates.sort(key=lambda c: (c[0], -c[1]))
+    best_index = -1
+    for n, (lower_bound, index, v, info, trajectory, to_goal_cost, heading_cost, speed_cost) in enumerate(candidates):
+        # the first candidate is always evaluated, so the best-so-far input is never empty
+        if lower_bound > min_cost or (n > 0 and deadline is not None and deadline.expired()):
+            break
+        with span("LBP.obstacle_cost"):
             ob_cost = obstacle_cost_gain * calc_obstacle_cost(trajectory, ob)
-            heading_cost = heading_cost_gain * calc_to_goal_heading_cost(trajectory, goal)
-            final_cost = to_goal_cost + ob_cost + heading_cost + speed_cost 
-            
-            # search minimum trajectory
-            if min_cost >= final_cost:
-                min_cost = final_cost
+        final_cost = to_goal_cost + ob_cost + heading_cost + speed_cost 
+        
+        # search minimum trajectory, ties go to the last sampled trajectory
+        if final_cost < min_cost or (final_cost == min_cost and index > best_index):
+            min_cost = final_cost
+            best_index = index
+
+            # interpolate the control inputs
+            a = (v-x[3])/dt
 
-                # interpolate the control inputs
-                a = (v-x[3])/dt
+            # print(f'v: {v}, id: {id}')
+            # print(f"Control seq. {len(info['ctrl'])}")
+            best_u = [a, info['ctrl'][1]]
+            best_trajectory = trajectory
+            u_history = info['ctrl'].copy()
 
-                # print(f'v: {v}, id: {id}')
-                # print(f"Control seq. {len(info['ctrl'])}")
-                best_u = [a, info['ctrl'][1]]
-                best_trajectory = trajectory
-                u_history = info['ctrl'].copy()
+    if best_index == -1 and deadline is not None and deadline.expired():
+        # the deadline expired before a feasible candidate was found: brake
+        best_u = braking_input(x[3], min_acc, max_acc, dt)
+        return best_u, np.array([x[0:3], x[0:3]]), [best_u[1]]
 
     # Calculate cost of the previous best trajectory and compare it with that of the new trajectories
     # If the cost of the previous best trajectory is lower, use the previous best trajectory
@@ -237,12 +269,9 @@ def calc_control_and_trajectory(x, v_search, goal, ob, u_buf, trajectory_buf):
     elif min_cost == np.inf:
         # emergency stop
         print("Emergency stop")
-        if x[3]>0:
-            best_u = [min_acc, 0]
-        else:
-            best_u = [max_acc, 0]
+        best_u = braking_input(x[3], min_acc, max_acc, dt)
         best_trajectory = np.array([x[0:3], x[0:3]])
-        u_history = [min_acc, 0]
+        u_history = [best_u[1]]
 
 
     return best_u, best_trajectory, u_history
@@ -267,7 +296,8 @@ def calc_obstacle_cost(trajectory, ob):
     minyp = min(abs(height_init/2-trajectory[:, 1]))
     minyn = min(abs(-height_init/2-trajectory[:, 1]))
     min_distance = min(minxp, minxn, minyp, minyn)
-    dilated = line.buffer(dilation_factor, cap_style=3)
+    with span("LBP.obstacle_geometry"):
+        dilated = line.buffer(dilation_factor, cap_style=3)
 
     x = trajectory[:, 0]
     y = trajectory[:, 1]
@@ -411,7 +441,7 @@ def initialize_paths_targets_dilated_traj(x):
 
     return paths, targets, dilated_traj
 
-def update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajectory, i):
+def update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajectory, i, deadline=None, noise=None):
     """
     Update the state of a robot in a multi-robot system.
 
@@ -424,19 +454,25 @@ def update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajec
         u_hist (list): List of control input histories for each robot.
         predicted_trajectory (list): List of predicted trajectories for each robot.
         i (int): Index of the robot to update.
+        deadline (Deadline, optional): Time budget of the robots. Defaults to None (no budget).
+        noise (StateNoise, optional): Measurement noise of the robots. Defaults to None (exact measurements).
 
     Returns:
         tuple: Updated state, control inputs, predicted trajectories, and control input histories of all robots.
     """
+    if deadline is not None:
+        deadline.start(i)
     x1 = x[:, i]
     ob = [dilated_traj[idx] for idx in range(len(dilated_traj)) if idx != i]
-    if add_noise:
-        noise = np.concatenate([np.random.normal(0, 0.21*noise_scale_param, 2).reshape(1, 2), np.random.normal(0, np.radians(5)*noise_scale_param, 1).reshape(1,1), np.random.normal(0, 0.2*noise_scale_param, 1).reshape(1,1)], axis=1)
-        noisy_pos = x1 + noise[0]
-        u1, predicted_trajectory1, u_history = lbp_control(noisy_pos, targets[i], ob, u_hist[i], predicted_trajectory[i])
-        plt.plot(noisy_pos[0], noisy_pos[1], "x"+color_dict[i], markersize=10)
+    if add_noise and noise is not None:
+        noisy_pos = x1 + noise.sample(i)
+        u1, predicted_trajectory1, u_history = lbp_control(noisy_pos, targets[i], ob, u_hist[i], predicted_trajectory[i], deadline)
+        if show_animation:
+            plt.plot(noisy_pos[0], noisy_pos[1], "x"+color_dict[i], markersize=10)
     else:
-        u1, predicted_trajectory1, u_history = lbp_control(x1, targets[i], ob, u_hist[i], predicted_trajectory[i])
+        u1, predicted_trajectory1, u_history = lbp_control(x1, targets[i], ob, u_hist[i], predicted_trajectory[i], deadline)
+    if deadline is not None:
+        deadline.stop(i)
     dilated_traj[i] = LineString(zip(predicted_trajectory1[:, 0], predicted_trajectory1[:, 1])).buffer(dilation_factor, cap_style=3)
    
     # Collision check
@@ -466,7 +502,7 @@ def plot_robot_trajectory(x, u, predicted_trajectory, dilated_traj, targets, ax,
 
     """
     plt.plot(predicted_trajectory[i][:, 0], predicted_trajectory[i][:, 1], "-"+color_dict[i])
-    plot_polygon(dilated_traj[i], ax=ax, add_points=False, alpha=0.5, color=color_dict[i])
+    shapely_plotting.plot_polygon(dilated_traj[i], ax=ax, add_points=False, alpha=0.5, color=color_dict[i])
     # plt.plot(x[0, i], x[1, i], "xr")
     plt.plot(targets[i][0], targets[i][1], "x"+color_dict[i])
     plot_robot(x[0, i], x[1, i], x[2, i], i)
@@ -503,6 +539,8 @@ class LBP_algorithm():
         self.robot_num = robot_num
         self.reached_goal = [False]*robot_num
         self.computational_time = []
+        self.deadline = Deadline(deadline, robot_num)
+        self.noise = StateNoise(robot_num, noise_scale_param, noise_seed)
 
     def run_lbp(self, x, u, break_flag):
         for i in range(self.robot_num):
@@ -517,9 +555,9 @@ class LBP_algorithm():
                 
                 self.targets[i] = (self.paths[i][0].x, self.paths[i][0].y)
 
-            t_prev = time.time()
-            x, u, self.predicted_trajectory, self.u_hist = update_robot_state(x, u, dt, self.targets, self.dilated_traj, self.u_hist, self.predicted_trajectory, i)
-            self.computational_time.append(time.time()-t_prev)
+            t_prev = time.perf_counter_ns()
+            x, u, self.predicted_trajectory, self.u_hist = update_robot_state(x, u, dt, self.targets, self.dilated_traj, self.u_hist, self.predicted_trajectory, i, self.deadline, self.noise)
+            self.computational_time.append((time.perf_counter_ns() - t_prev)*1e-9)
 
             if check_goal_reached(x, self.targets, i):
                 break_flag = True
@@ -538,9 +576,9 @@ class LBP_algorithm():
                     x[3, i] = 0
                     self.reached_goal[i] = True
                 else:
-                    t_prev = time.time()
-                    x, u, self.predicted_trajectory, self.u_hist = update_robot_state(x, u, dt, self.targets, self.dilated_traj, self.u_hist, self.predicted_trajectory, i)
-                    self.computational_time.append(time.time()-t_prev)
+                    t_prev = time.perf_counter_ns()
+                    x, u, self.predicted_trajectory, self.u_hist = update_robot_state(x, u, dt, self.targets, self.dilated_traj, self.u_hist, self.predicted_trajectory, i, self.deadline, self.noise)
+                    self.computational_time.append((time.perf_counter_ns() - t_prev)*1e-9)
 
                 u, x = self.check_collision(x, u, i) 
             
@@ -609,11 +647,12 @@ def main():
     x = np.array([[-7, 7, 0.0], [0, 0, 7], [0, np.pi, -np.pi/2], [0, 0, 0]])
     u = np.array([[0, 0, 0], [0, 0, 0]])
     targets = [[7,7],[-7,7],[0.0,0.0]]
+    noise = StateNoise(N, noise_scale_param, noise_seed)
 
     # create a trajcetory array to store the trajectory of the N robots
-    trajectory = np.zeros((x.shape[0], N, 1))
+    recorder = TrajectoryRecorder(x.shape[0], N)
     # append the firt state to the trajectory
-    trajectory[:, :, 0] = x
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(N),np.zeros([int(predict_time/dt), 3]))
     for i in range(N):
@@ -632,9 +671,9 @@ def main():
         
         for i in range(N):
 
-            x, u, predicted_trajectory, u_hist = update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajectory, i)
+            x, u, predicted_trajectory, u_hist = update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajectory, i, noise=noise)
 
-            trajectory = np.dstack([trajectory, x])
+            recorder.append(x)
 
             if check_goal_reached(x, targets, i):
                 break_flag = True
@@ -650,6 +689,7 @@ def main():
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(N):
@@ -673,9 +713,10 @@ def main1():
     x, y, yaw, v, omega, model_type = utils.samplegrid(width_init, height_init, min_dist, robot_num, safety_init)
     x = np.array([x, y, yaw, v])
     u = np.zeros((2, robot_num))
+    noise = StateNoise(robot_num, noise_scale_param, noise_seed)
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -696,9 +737,9 @@ def main1():
             
             paths, targets = update_targets(paths, targets, x, i)
 
-            x, u, predicted_trajectory, u_hist = update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajectory, i)
+            x, u, predicted_trajectory, u_hist = update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajectory, i, noise=noise)
 
-            trajectory = np.dstack([trajectory, x])
+            recorder.append(x)
 
             if check_goal_reached(x, targets, i):
                 break_flag = True
@@ -714,6 +755,7 @@ def main1():
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -730,6 +772,7 @@ def main2():
     THis is the core a reference implementation of the LBP algorithm with random generation of goals that are updated when 
     the robot reaches the current goal.
     """
+    seed = load_data('seeds', 'circular_seed_11.json')
     print(__file__ + " start!!")
     iterations = 3000
     break_flag = False
@@ -744,9 +787,10 @@ def main2():
     # Step 3: Create an array x with the initial values
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
+    noise = StateNoise(robot_num, noise_scale_param, noise_seed)
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -754,7 +798,7 @@ def main2():
 
     # Step 4: Create paths for each robot
     traj = seed['trajectories']
-    paths = [[Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
+    paths = [[msg.Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
 
     # Step 5: Extract the target coordinates from the paths
     targets = [[path[0].x, path[0].y] for path in paths]
@@ -783,9 +827,9 @@ def main2():
                     return
                 targets[i] = (paths[i][0].x, paths[i][0].y)
 
-            x, u, predicted_trajectory, u_hist = update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajectory, i)
+            x, u, predicted_trajectory, u_hist = update_robot_state(x, u, dt, targets, dilated_traj, u_hist, predicted_trajectory, i, noise=noise)
 
-            trajectory = np.dstack([trajectory, x])
+            recorder.append(x)
 
             if check_goal_reached(x, targets, i):
                 break_flag = True
@@ -801,6 +845,7 @@ def main2():
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -817,6 +862,7 @@ def main_seed():
     THis is the core a reference implementation of the LBP algorithm with random generation of goals that are updated when 
     the robot reaches the current goal.
     """
+    seed = load_data('seeds', 'circular_seed_11.json')
     print(__file__ + " start!!")
     iterations = 3000
     break_flag = False
@@ -833,8 +879,8 @@ def main_seed():
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -842,7 +888,7 @@ def main_seed():
 
     # Step 4: Create paths for each robot
     traj = seed['trajectories']
-    paths = [[Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
+    paths = [[msg.Coordinate(x=traj[str(idx)][i][0], y=traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(robot_num)]
 
     # Step 5: Extract the target coordinates from the paths
     targets = [[path[0].x, path[0].y] for path in paths]
@@ -866,7 +912,7 @@ def main_seed():
         # x, u, break_flag = lbp.run_lbp(x, u, break_flag)
         x, u, break_flag = lbp.go_to_goal(x, u, break_flag)
 
-        trajectory = np.dstack([trajectory, x])
+        recorder.append(x)
 
         utils.plot_map(width=width_init, height=height_init)
         plt.axis("equal")
@@ -876,6 +922,7 @@ def main_seed():
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -19,52 +19,48 @@ import lattice_motion_model as motion_model
 
 from lattice import calc_uniform_polar_states, generate_path
 import json
-
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-max_steer = json_object["DWA"]["max_steer"] # [rad] max steering angle
-max_speed = json_object["DWA"]["max_speed"] # [m/s]
-min_speed = json_object["DWA"]["min_speed"] # [m/s]
-a_resolution = json_object["DWA"]["a_resolution"] # [m/s²]
-v_resolution = json_object["DWA"]["v_resolution"] # [m/s]
-delta_resolution = math.radians(json_object["DWA"]["delta_resolution"])# [rad/s]
-max_acc = json_object["DWA"]["max_acc"] # [m/ss]
-min_acc = json_object["DWA"]["min_acc"] # [m/ss]
-dt = json_object["Controller"]["dt"] # [s] Time tick for motion prediction
-predict_time = 3 # json_object["DWA"]["predict_time"] # [s]
-to_goal_cost_gain = json_object["DWA"]["to_goal_cost_gain"]
-speed_cost_gain = json_object["DWA"]["speed_cost_gain"]
-obstacle_cost_gain = json_object["DWA"]["obstacle_cost_gain"]
-robot_stuck_flag_cons = json_object["DWA"]["robot_stuck_flag_cons"]
-dilation_factor = json_object["DWA"]["dilation_factor"]
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
+from planner.config import get_config, data_file, load_data
+
+params = get_config()
+
+max_steer = params.DWA.max_steer # [rad] max steering angle
+max_speed = params.DWA.max_speed # [m/s]
+min_speed = params.DWA.min_speed # [m/s]
+a_resolution = params.DWA.a_resolution # [m/s²]
+v_resolution = params.DWA.v_resolution # [m/s]
+delta_resolution = math.radians(params.DWA.delta_resolution)# [rad/s]
+max_acc = params.DWA.max_acc # [m/ss]
+min_acc = params.DWA.min_acc # [m/ss]
+dt = params.Controller.dt # [s] Time tick for motion prediction
+predict_time = 3 # params.DWA.predict_time # [s]
+to_goal_cost_gain = params.DWA.to_goal_cost_gain
+speed_cost_gain = params.DWA.speed_cost_gain
+obstacle_cost_gain = params.DWA.obstacle_cost_gain
+robot_stuck_flag_cons = params.DWA.robot_stuck_flag_cons
+dilation_factor = params.DWA.dilation_factor
+L = params.Car_model.L  # [m] Wheel base of vehicle
 Lr = L / 2.0  # [m]
 Lf = L - Lr
-Cf = json_object["Car_model"]["Cf"]  # N/rad
-Cr = json_object["Car_model"]["Cr"] # N/rad
-Iz = json_object["Car_model"]["Iz"]  # kg/m2
-m = json_object["Car_model"]["m"]  # kg
+Cf = params.Car_model.Cf  # N/rad
+Cr = params.Car_model.Cr # N/rad
+Iz = params.Car_model.Iz  # kg/m2
+m = params.Car_model.m  # kg
 # Aerodynamic and friction coefficients
-c_a = json_object["Car_model"]["c_a"]
-c_r1 = json_object["Car_model"]["c_r1"]
-WB = json_object["Controller"]["WB"] # Wheel base
-robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
+c_a = params.Car_model.c_a
+c_r1 = params.Car_model.c_r1
+WB = params.Controller.WB # Wheel base
+robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
 N=3
 save_flag = True
 show_animation = True
 plot_flag = False
-robot_num = json_object["robot_num"]
-timer_freq = json_object["timer_freq"]
+robot_num = params.robot_num
+timer_freq = params.timer_freq
 
-with open('/home/giacomo/thesis_ws/src/trajectories.json', 'r') as file:
-    data1 = json.load(file)
+data1 = load_data('trajectories.json')
 
 def calc_states_list(max_yaw=np.deg2rad(-30.0)):
 
@@ -239,10 +235,10 @@ def generate_lookup_table():
     plt.show()
 
     # saving the complete trajectories to a csv file
-    with open('src/lbp_dev/lbp_dev/LBP.json', 'w') as file:
+    with open(data_file('lbp_dev', 'lbp_dev', 'LBP.json'), 'w') as file:
         json.dump(temp, file, indent=4)
 
-    print("\nThe JSON data has been written to 'src/lbp_dev/lbp_dev/LBP.json'")
+    print(f"\nThe JSON data has been written to {data_file('lbp_dev', 'lbp_dev', 'LBP.json')}")
 
     # states = calc_states_list(max_yaw=np.deg2rad(-35.0))
     # k0 = 0.0
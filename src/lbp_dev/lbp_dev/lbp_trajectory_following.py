@@ -1,57 +1,53 @@
 import json
 import numpy as np
-import pathlib
 import math
 from LBP import normalize_angle
 from shapely.geometry import Point, Polygon, LineString
 import matplotlib.pyplot as plt
 from planner import utils as utils
-
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-max_steer = json_object["LBP"]["max_steer"] # [rad] max steering angle
-max_speed = json_object["LBP"]["max_speed"] # [m/s]
-min_speed = json_object["LBP"]["min_speed"] # [m/s]
-v_resolution = json_object["LBP"]["v_resolution"] # [m/s]
-delta_resolution = math.radians(json_object["LBP"]["delta_resolution"])# [rad/s]
-max_acc = json_object["LBP"]["max_acc"] # [m/ss]
-min_acc = json_object["LBP"]["min_acc"] # [m/ss]
-dt = json_object["Controller"]["dt"] # [s] Time tick for motion prediction
-predict_time = json_object["LBP"]["predict_time"] # [s]
-to_goal_cost_gain = json_object["LBP"]["to_goal_cost_gain"]
-speed_cost_gain = json_object["LBP"]["speed_cost_gain"]
-obstacle_cost_gain = json_object["LBP"]["obstacle_cost_gain"]
-robot_stuck_flag_cons = json_object["LBP"]["robot_stuck_flag_cons"]
-dilation_factor = json_object["LBP"]["dilation_factor"]
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
+from planner.config import get_config, data_file
+
+params = get_config()
+
+max_steer = params.LBP.max_steer # [rad] max steering angle
+max_speed = params.LBP.max_speed # [m/s]
+min_speed = params.LBP.min_speed # [m/s]
+v_resolution = params.LBP.v_resolution # [m/s]
+delta_resolution = math.radians(params.LBP.delta_resolution)# [rad/s]
+max_acc = params.LBP.max_acc # [m/ss]
+min_acc = params.LBP.min_acc # [m/ss]
+dt = params.Controller.dt # [s] Time tick for motion prediction
+predict_time = params.LBP.predict_time # [s]
+to_goal_cost_gain = params.LBP.to_goal_cost_gain
+speed_cost_gain = params.LBP.speed_cost_gain
+obstacle_cost_gain = params.LBP.obstacle_cost_gain
+robot_stuck_flag_cons = params.LBP.robot_stuck_flag_cons
+dilation_factor = params.LBP.dilation_factor
+L = params.Car_model.L  # [m] Wheel base of vehicle
 Lr = L / 2.0  # [m]
 Lf = L - Lr
-Cf = json_object["Car_model"]["Cf"]  # N/rad
-Cr = json_object["Car_model"]["Cr"] # N/rad
-Iz = json_object["Car_model"]["Iz"]  # kg/m2
-m = json_object["Car_model"]["m"]  # kg
+Cf = params.Car_model.Cf  # N/rad
+Cr = params.Car_model.Cr # N/rad
+Iz = params.Car_model.Iz  # kg/m2
+m = params.Car_model.m  # kg
 # Aerodynamic and friction coefficients
-c_a = json_object["Car_model"]["c_a"]
-c_r1 = json_object["Car_model"]["c_r1"]
-WB = json_object["Controller"]["WB"] # Wheel base
-robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
+c_a = params.Car_model.c_a
+c_r1 = params.Car_model.c_r1
+WB = params.Controller.WB # Wheel base
+robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
 N=3
 
-robot_num = json_object["robot_num"]
-timer_freq = json_object["timer_freq"]
+robot_num = params.robot_num
+timer_freq = params.timer_freq
 
 show_animation = True
 v_ref = 2.0 # [m/s] reference speed
 
 # Load trajectory and control inputs from LBP.json file
-with open('src/lbp_dev/lbp_dev/LBP.json', 'r') as file:
+with open(data_file('lbp_dev', 'lbp_dev', 'LBP.json'), 'r') as file:
     data = json.load(file)
 
 def interp0(x, xp, yp):
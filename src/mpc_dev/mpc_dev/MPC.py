@@ -4,51 +4,67 @@ import math
 import random
 import sys
 sys.path.append("..")
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-import matplotlib.patches as mpatches
-from scipy.optimize import minimize, NonlinearConstraint
 import time
+from concurrent.futures import ProcessPoolExecutor
 import planner.utils as utils
-
-import pathlib
-import json
-
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-max_steer = json_object["MPC"]["max_steer"] # [rad] max steering angle
-max_speed = json_object["MPC"]["max_speed"] # [m/s]
-min_speed = json_object["MPC"]["min_speed"] # [m/s]
-max_acc = json_object["MPC"]["max_acc"] # [m/ss]
-min_acc = json_object["MPC"]["min_acc"] # [m/ss]
-dt = json_object["Controller"]["dt"] # [s] Time tick for motion prediction
-horizon = json_object["MPC"]["horizon"] # [s] Time horizon for motion prediction
-dt_pred = json_object["MPC"]["dt_pred"] # [s] Time tick for motion prediction
-safety_radius = json_object["MPC"]["safety_radius"] # [m] Safety radius for obstacle avoidance
-
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
+from planner.recorder import TrajectoryRecorder
+from mpc_dev.ilqr import iLQR
+from planner.deadline import Deadline, DeadlineExpired, braking_input
+from planner.noise import StateNoise
+from planner.profiler import span
+
+from planner.config import get_config, load_data
+from planner.lazy import lazy_import
+
+plt = lazy_import('matplotlib.pyplot')
+gridspec = lazy_import('matplotlib.gridspec')
+mpatches = lazy_import('matplotlib.patches')
+optimize = lazy_import('scipy.optimize')
+
+params = get_config()
+
+max_steer = params.MPC.max_steer # [rad] max steering angle
+max_speed = params.MPC.max_speed # [m/s]
+min_speed = params.MPC.min_speed # [m/s]
+max_acc = params.MPC.max_acc # [m/ss]
+min_acc = params.MPC.min_acc # [m/ss]
+dt = params.Controller.dt # [s] Time tick for motion prediction
+horizon = params.MPC.horizon # [s] Time horizon for motion prediction
+dt_pred = params.MPC.dt_pred # [s] Time tick for motion prediction
+safety_radius = params.MPC.safety_radius # [m] Safety radius for obstacle avoidance
+max_iter = params.MPC.max_iter # maximum number of SLSQP iterations
+deadline = params.Controller.deadline # [s] time budget of each robot, 0 to disable
+solver = params.MPC.solver # "SLSQP" or "iLQR"
+ilqr_max_iter = params.MPC.ilqr_max_iter # iLQR iterations for each multiplier update
+ilqr_al_iter = params.MPC.ilqr_al_iter # augmented Lagrangian multiplier updates
+block_size = params.MPC.block_size # [steps] inputs held constant over blocks of block_size steps
+adaptive_horizon = params.MPC.adaptive_horizon # shorten the horizon near the goal or far from the other robots
+min_horizon = params.MPC.min_horizon # shortest horizon used by the adaptive horizon
+max_neighbours = params.MPC.max_neighbours # maximum number of reachable robots considered as obstacles, 0 for all the reachable ones
+parallel = params.MPC.parallel # solve the problems of the robots in parallel
+workers = params.MPC.workers # number of worker processes, 0 to use all the cores
+
+L = params.Car_model.L  # [m] Wheel base of vehicle
 Lr = L / 2.0  # [m]
 Lf = L - Lr  # [m]
-WB = json_object["Controller"]["WB"] # Wheel base
-robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-min_dist = json_object["min_dist"]
-to_goal_stop_distance = json_object["to_goal_stop_distance"]
+WB = params.Controller.WB # Wheel base
+robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
+to_goal_stop_distance = params.to_goal_stop_distance
 
 show_animation = True
 debug = False
 boundary_points = np.array([-width_init/2, width_init/2, -height_init/2, height_init/2])
 check_collision_bool = False
-add_noise = json_object["add_noise"]
-noise_scale_param = json_object["noise_scale_param"]
+add_noise = params.add_noise
+noise_scale_param = params.noise_scale_param
+noise_seed = params.noise_seed # seed of the measurement noise, the same for every run
+
+far_obstacle = 10 * max(width_init, height_init) # [m] coordinates of the padding obstacles, never reachable
 
-np.random.seed(1)
 
 color_dict = {0: 'r', 1: 'b', 2: 'g', 3: 'y', 4: 'm', 5: 'c', 6: 'k'}
 
@@ -57,9 +73,6 @@ options = {}
 options['FIG_SIZE'] = [8,8]
 options['OBSTACLES'] = True
 
-with open('/home/giacomo/thesis_ws/src/seeds/circular_seed_10.json', 'r') as file:
-    seed = json.load(file)
-
 def normalize_angle(angle):
     """
     Normalize an angle to [-pi, pi].
@@ -72,6 +85,236 @@ def normalize_angle(angle):
         angle += 2.0 * np.pi
     return angle
 
+# MPC instance of a worker process, used when the robots are solved in parallel
+worker_mpc = None
+
+def init_worker(robot_num, solver):
+    """
+    Initialize the MPC instance of a worker process.
+
+    Args:
+        robot_num (int): The number of robots.
+        solver (str): The optimizer used, either "SLSQP" or "iLQR".
+    """
+    global worker_mpc
+    worker_mpc = ModelPredictiveControl(obs_x=[], obs_y=[], x=np.zeros((4, robot_num)), robot_num=robot_num)
+    worker_mpc.solver = solver
+
+def solve_worker(i, cost_name, u1, state, ref, x_obs, y_obs, horizon):
+    """
+    Solve the problem of robot i in a worker process.
+
+    Args:
+        i (int): The index of the robot.
+        cost_name (str): The name of the cost function method.
+        u1 (numpy.ndarray): The warm start of the control sequence.
+        state (numpy.ndarray): The initial state of the robot.
+        ref (list): The goal of the robot.
+        x_obs (numpy.ndarray): The x-coordinates of the obstacles.
+        y_obs (numpy.ndarray): The y-coordinates of the obstacles.
+        horizon (int): The active horizon of the problem.
+
+    Returns:
+        tuple: The optimal control sequence, whether the deadline was missed and the solve time [ns]
+            measured in the worker.
+    """
+    t_prev = time.perf_counter_ns()
+    problem = worker_mpc.problems[i]
+    problem.set_horizon(horizon)
+    if problem.x_obs.shape[0] != x_obs.shape[0]:
+        problem.resize_obstacles(x_obs.shape[0])
+    problem.x_obs[:] = x_obs
+    problem.y_obs[:] = y_obs
+    u1 = worker_mpc.solve(i, getattr(worker_mpc, cost_name), u1, state, ref)
+    return u1, worker_mpc.deadline.hit, time.perf_counter_ns() - t_prev
+
+class MPCProblem:
+    """
+    Persistent optimization problem of a single robot.
+
+    Bounds and constraints are allocated once, the constraint functions read the initial state
+    and the obstacle arrays of the problem by reference. Each tick only the data is updated,
+    so problems of different robots can be solved independently.
+
+    With move blocking the inputs are held constant over blocks of block_size steps, the decision
+    variables are one (pedal, steering) pair per block. The layout of each horizon is computed
+    once and reused when the horizon is changed with set_horizon.
+
+    Attributes:
+        plant_model (function): The model used to propagate the states.
+        horizon (int): The active prediction horizon.
+        dt (float): The time step.
+        safety_radius (float): The safety radius for obstacle avoidance.
+        block_size (int): The number of steps over which the inputs are held constant.
+        blocks (numpy.ndarray): The length of each block of the active horizon.
+        starts (numpy.ndarray): The first step of each block of the active horizon.
+        deadline (Deadline): The time budget checked at every cost evaluation, None to disable it.
+        best (numpy.ndarray): The last iterate of the solver, None before the first iteration.
+        initial_state (numpy.ndarray): The initial state of the robot.
+        x_obs (numpy.ndarray): The x-coordinates of the obstacles.
+        y_obs (numpy.ndarray): The y-coordinates of the obstacles.
+        bounds (list): The bounds for the optimization problem.
+        constraints (list): The constraints for the optimization problem.
+    """
+
+    def __init__(self, plant_model, horizon, dt, safety_radius, n_obs, block_size=1):
+        self.plant_model = plant_model
+        self.dt = dt
+        self.safety_radius = safety_radius
+        self.block_size = block_size
+
+        self.initial_state = np.zeros(4)
+        self.x_obs = np.zeros(n_obs)
+        self.y_obs = np.zeros(n_obs)
+
+        self.layouts = {}
+        self.set_horizon(horizon)
+
+        self.deadline = None
+        self.best = None
+
+        self.constraints = [optimize.NonlinearConstraint(fun=self.propagation1, lb=-width_init/2 + self.safety_radius, ub=width_init/2 - self.safety_radius),
+                            optimize.NonlinearConstraint(fun=self.propagation2, lb=-height_init/2 + self.safety_radius, ub=height_init/2 - self.safety_radius)]
+        if n_obs > 0:
+            self.constraints.append(optimize.NonlinearConstraint(fun=self.propagation3, lb=0, ub=np.inf))
+
+    def resize_obstacles(self, n_obs):
+        """
+        Reallocate the obstacle arrays for n_obs obstacles, all of them at the padding position.
+
+        Args:
+            n_obs (int): The number of obstacles.
+        """
+        had_obstacles = self.x_obs.shape[0] > 0
+        self.x_obs = np.full(n_obs, far_obstacle, dtype=float)
+        self.y_obs = np.full(n_obs, far_obstacle, dtype=float)
+        if n_obs > 0 and not had_obstacles:
+            self.constraints.append(optimize.NonlinearConstraint(fun=self.propagation3, lb=0, ub=np.inf))
+
+    def set_horizon(self, horizon):
+        """
+        Select the active horizon and its move-blocking layout.
+
+        Args:
+            horizon (int): The prediction horizon.
+        """
+        if horizon not in self.layouts:
+            blocks = [self.block_size] * (horizon // self.block_size)
+            if horizon % self.block_size > 0:
+                blocks.append(horizon % self.block_size)
+            starts = np.cumsum([0] + blocks[:-1])
+            bounds = [[min_acc, max_acc], [-max_steer, max_steer]] * len(blocks)
+            self.layouts[horizon] = (np.array(blocks), starts, bounds)
+        self.horizon = horizon
+        self.blocks, self.starts, self.bounds = self.layouts[horizon]
+
+    def expand(self, z):
+        """
+        Expand the decision variables to the control sequence of the active horizon.
+
+        Args:
+            z (numpy.ndarray): One (pedal, steering) pair per block.
+
+        Returns:
+            numpy.ndarray: One (pedal, steering) pair per step.
+        """
+        return np.repeat(np.reshape(z, (-1, 2)), self.blocks, axis=0).reshape(-1)
+
+    def compress(self, u):
+        """
+        Compress a control sequence to the decision variables, keeping the first input of each block.
+
+        Args:
+            u (numpy.ndarray): One (pedal, steering) pair per step, at least horizon steps.
+
+        Returns:
+            numpy.ndarray: One (pedal, steering) pair per block.
+        """
+        return np.reshape(u, (-1, 2))[self.starts].reshape(-1)
+
+    def cost(self, z, cost_function, *args):
+        """
+        Evaluate a cost function of the MPC on the expanded control sequence.
+
+        Args:
+            z (numpy.ndarray): The decision variables.
+            cost_function (function): The cost function.
+            args (tuple): Additional arguments of the cost function.
+
+        Returns:
+            float: The cost.
+
+        Raises:
+            DeadlineExpired: If the time budget is exhausted.
+        """
+        if self.deadline is not None and self.deadline.expired():
+            raise DeadlineExpired()
+        return cost_function(self.expand(z), *args)
+
+    def callback(self, z):
+        """
+        Store the iterate of the solver, used as best-so-far solution if the deadline expires.
+
+        Args:
+            z (numpy.ndarray): The decision variables.
+        """
+        self.best = np.copy(z)
+
+    def propagate(self, z):
+        """
+        Propagates the initial state with a given control sequence.
+
+        Args:
+            z (list): The decision variables.
+
+        Returns:
+            numpy.ndarray: The states of the robot, initial state included.
+        """
+        u = self.expand(z)
+        state = [self.initial_state]
+
+        for i in range(self.horizon):
+            state.append(self.plant_model(state[-1], self.dt, u[2*i], u[2*i + 1]))
+        return np.array(state)
+
+    def propagation1(self, u):
+        """
+        Propagates the system state in the x-direction based on a given control sequence.
+
+        Args:
+            u (list): The control sequence.
+
+        Returns:
+            numpy.ndarray: The system state in the x-direction.
+        """
+        return self.propagate(u)[:, 0]
+
+    def propagation2(self, u):
+        """
+        Propagates the system state in the y-direction based on a given control sequence.
+
+        Args:
+            u (list): The control sequence.
+
+        Returns:
+            numpy.ndarray: The system state in the y-direction.
+        """
+        return self.propagate(u)[:, 1]
+
+    def propagation3(self, u):
+        """
+        Computes the distance between the system state and the obstacles based on a given control sequence.
+
+        Args:
+            u (list): The control sequence.
+
+        Returns:
+            numpy.ndarray: The distances between the system state and the obstacles.
+        """
+        state = self.propagate(u)[1:]
+        distance = (state[:, 0, None] - self.x_obs[None, :])**2 + (state[:, 1, None] - self.y_obs[None, :])**2 - self.safety_radius**2
+        return distance.reshape(-1)
+
 class ModelPredictiveControl:
     """
     Class representing a Model Predictive Control (MPC) system.
@@ -81,16 +324,24 @@ class ModelPredictiveControl:
         dt (float): The time step.
         x_obs (list): The x-coordinates of the obstacles.
         y_obs (list): The y-coordinates of the obstacles.
-        initial_state (list): The initial state of the system.
         safety_radius (float): The safety radius for obstacle avoidance.
         cx (list): The x-coordinates of the path for each robot.
         cy (list): The y-coordinates of the path for each robot.
         ref (list): The reference points for each robot.
-        bounds (list): The bounds for the optimization problem.
-        constraints (list): The constraints for the optimization problem.
         predicted_trajectory (list): The predicted trajectories of all robots.
         reached_goal (list): A list of flags indicating whether each robot has reached the goal.
         computational_time (list): The computational time for each iteration of the MPC controller.
+        problems (list): The persistent optimization problem of each robot.
+        deadline (Deadline): Time budget of each robot, counts the deadline misses.
+        noise (StateNoise): Measurement noise of each robot, reproducible for a given noise_seed.
+        max_neighbours (int): The maximum number of reachable robots considered as obstacles.
+        truncations (list): Number of ticks in which reachable neighbours of each robot were dropped by max_neighbours.
+        reach (float): Distance within which a neighbour can be met over the horizon.
+        reallocations (list): Number of times the obstacle arrays of each robot were grown for more reachable neighbours.
+        solver (str): The optimizer used, either "SLSQP" or "iLQR".
+        ilqr (iLQR): The iLQR solver, only used if solver is "iLQR".
+        parallel (bool): Whether the problems of the robots are solved in parallel.
+        pool (ProcessPoolExecutor): The persistent worker pool, created at the first parallel tick.
 
     Methods:
         plant_model: Computes the next state of the system based on the current state and control inputs.
@@ -98,39 +349,64 @@ class ModelPredictiveControl:
         cost_function2: Computes the cost associated with a given control sequence.
         cost_function3: Computes the cost associated with a given control sequence.
         seed_cost: Computes the cost associated with a given control sequence.
-        propagation1: Propagates the system state in the x-direction based on a given control sequence.
-        propagation2: Propagates the system state in the y-direction based on a given control sequence.
-        propagation3: Computes the distance between the system state and the obstacles based on a given control sequence.
         run_mpc: Runs the MPC controller for a given number of iterations.
         go_to_goal: Moves the robot to the goal position.
+        go_to_goal_parallel: Moves the robots to the goal position, solving their problems in parallel.
         mpc_control: Computes the control inputs for the MPC controller.
+        prepare_problem: Prepares the warm start, initial state and obstacles of a robot.
+        adapt_horizon: Selects the horizon of a robot.
+        apply_solution: Applies the solution to a robot and updates its predicted trajectory.
+        solve: Solves the optimal control problem with the selected solver.
         update_obstacles: Update the obstacles for the model predictive control (MPC) algorithm.
 
     """
 
-    def __init__(self, obs_x, obs_y, x, robot_num=robot_num, cx=None, cy=None, ref=None, bounds=None, constraints=None):
+    def __init__(self, obs_x, obs_y, x, robot_num=robot_num, cx=None, cy=None, ref=None):
         self.horizon = horizon
         self.dt = dt_pred
 
         self.x_obs = obs_x
         self.y_obs = obs_y
 
-        self.initial_state = None
         self.safety_radius = safety_radius
         self.robot_num = robot_num
 
         self.cx = cx
         self.cy = cy
         self.ref = ref
-        self.bounds = bounds
-        self.constraints = constraints
         self.predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([self.horizon, x.shape[0]]))
         for i in range(robot_num):
             self.predicted_trajectory[i] = np.full((self.horizon, 4), x[:,i])
 
         self.reached_goal = [False]*robot_num
         self.computational_time = []
-        self.bounds, self.constraints = self.set_bounds_and_constraints()
+
+        # every 5th point of the predicted trajectory of the reachable other robots is an obstacle. The robots are
+        # at least min_dist apart, so about ((reach + min_dist)/min_dist)**2 of them fit in the reachable disk: the
+        # obstacle arrays are sized for that many neighbours and only grown if more are reachable
+        self.reach = max(max_speed, -min_speed) * self.horizon * self.dt + self.safety_radius
+        if max_neighbours > 0:
+            self.max_neighbours = min(robot_num - 1, max_neighbours)
+            capacity = self.max_neighbours
+        else:
+            self.max_neighbours = robot_num - 1
+            capacity = robot_num - 1 if min_dist <= 0 else min(robot_num - 1, int(np.ceil(((self.reach + min_dist) / min_dist)**2)))
+        self.truncations = [0]*robot_num
+        self.reallocations = [0]*robot_num
+        n_obs = capacity * len(range(0, self.horizon - 1, 5))
+        self.problems = [MPCProblem(self.plant_model, self.horizon, self.dt, self.safety_radius, n_obs, block_size) for i in range(robot_num)]
+
+        self.deadline = Deadline(deadline, robot_num)
+        self.noise = StateNoise(robot_num, noise_scale_param, noise_seed)
+        for problem in self.problems:
+            problem.deadline = self.deadline
+
+        self.solver = solver
+        self.ilqr = iLQR(self.horizon, self.dt, L, [min_acc, -max_steer], [max_acc, max_steer], min_speed, max_speed,
+                         self.safety_radius, width_init, height_init, max_iter=ilqr_max_iter, al_iter=ilqr_al_iter)
+
+        self.parallel = parallel
+        self.pool = None
 
     def plant_model(self, prev_state, dt, pedal, steering):
         """
@@ -169,16 +445,18 @@ class ModelPredictiveControl:
 
         Args:
             u (list): The control sequence.
-            args (tuple): Additional arguments (state, reference).
+            args (tuple): Additional arguments (state, reference and optionally the obstacle coordinates).
 
         Returns:
             float: The cost.
         """
         state = args[0]
         ref = args[1]
+        x_obs = args[2] if len(args) > 2 else self.x_obs
+        y_obs = args[3] if len(args) > 3 else self.y_obs
         cost = 0.0
 
-        for i in range(self.horizon):
+        for i in range(len(u)//2):
             speed = state[3]
             heading = state[2]
 
@@ -190,8 +468,8 @@ class ModelPredictiveControl:
             # cost +=  distance_to_goal
 
             # Obstacle cost
-            for z in range(len(self.x_obs)-1):
-                distance_to_obstacle = np.sqrt((self.x_obs[z] - state[0])**2 + (self.y_obs[z] - state[1])**2)
+            for z in range(len(x_obs)-1):
+                distance_to_obstacle = np.sqrt((x_obs[z] - state[0])**2 + (y_obs[z] - state[1])**2)
                 # if any(distance_to_obstacle < 3):
                 if distance_to_obstacle < 5:
                     cost += 100 #np.inf/distance_to_obstacle
@@ -217,9 +495,11 @@ class ModelPredictiveControl:
     def cost_function2(self,u, *args):
         state = args[0]
         ref = args[1]
+        x_obs = args[2] if len(args) > 2 else self.x_obs
+        y_obs = args[3] if len(args) > 3 else self.y_obs
         cost = 0.0
 
-        for i in range(self.horizon):
+        for i in range(len(u)//2):
             speed = state[3]
             heading = state[2]
 
@@ -231,8 +511,8 @@ class ModelPredictiveControl:
             cost +=  distance_to_goal
 
             # Obstacle cost
-            for z in range(len(self.x_obs)-1):
-                distance_to_obstacle = np.sqrt((self.x_obs[z] - state[0])**2 + (self.y_obs[z] - state[1])**2)
+            for z in range(len(x_obs)-1):
+                distance_to_obstacle = np.sqrt((x_obs[z] - state[0])**2 + (y_obs[z] - state[1])**2)
                 if distance_to_obstacle < 3:
                     cost += 40/distance_to_obstacle
 
@@ -270,7 +550,7 @@ class ModelPredictiveControl:
         ref = args[1]
         cost = 0.0
 
-        for i in range(self.horizon):
+        for i in range(len(u)//2):
             speed = state[3]
             heading = state[2]
 
@@ -321,7 +601,7 @@ class ModelPredictiveControl:
         ref = args[1]
         cost = 0.0
 
-        for i in range(self.horizon):
+        for i in range(len(u)//2):
             speed = state[3]
             heading = state[2]
 
@@ -355,88 +635,6 @@ class ModelPredictiveControl:
         cost += 100*distance_to_goal
         return cost
 
-    def propagation1(self, u):
-        """
-        Propagates the system state in the x-direction based on a given control sequence.
-        This function is used to check wether the states are propagated outside the boundaries
-        for a given control sequence u.
-
-        Args:
-            u (list): The control sequence.
-
-        Returns:
-            numpy.ndarray: The system state in the x-direction.
-        """
-        state = [self.initial_state]
-
-        for i in range(self.horizon):
-            state.append(self.plant_model(state[-1], self.dt, u[2*i], u[2*i + 1]))
-        return np.array(state)[:,0]
-    
-    def propagation2(self, u):
-        """
-        Propagates the system state in the y-direction based on a given control sequence.
-        This function is used to check wether the states are propagated outside the boundaries
-        for a given control sequence u.
-
-        Args:
-            u (list): The control sequence.
-
-        Returns:
-            numpy.ndarray: The system state in the y-direction.
-        """
-        state = [self.initial_state]
-
-        for i in range(self.horizon):
-            state.append(self.plant_model(state[-1], self.dt, u[2*i], u[2*i + 1]))
-        return np.array(state)[:,1]
-    
-    def propagation3(self, u):
-        """
-        Computes the distance between the system state and the obstacles based on a given control sequence.
-
-        Args:
-            u (list): The control sequence.
-
-        Returns:
-            numpy.ndarray: The distances between the system state and the obstacles.
-        """
-        state = self.initial_state
-        distance = []
-
-        for t in range(self.horizon):
-            state = self.plant_model(state, self.dt, u[2*t], u[2*t + 1])
-            for i in range(len(self.x_obs)):
-                distance.append((state[0] - self.x_obs[i])**2 + (state[1] - self.y_obs[i])**2-self.safety_radius**2)
-
-        return np.array(distance)
-    
-    def set_bounds_and_constraints(self):
-            """
-            Set the bounds and constraints for the optimization problem.
-
-            Returns:
-                bounds (list): List of bounds for the inputs.
-                constraints (list): List of constraints for the optimization problem.
-            """
-                
-            bounds = []
-            constraints = []
-            # Set bounds for inputs bounded optimization.
-            for i in range(self.horizon):
-                bounds += [[min_acc, max_acc]]
-                bounds += [[-max_steer, max_steer]]
-
-            constraint1 = NonlinearConstraint(fun=self.propagation1, lb=-width_init/2 + self.safety_radius, ub=width_init/2 - self.safety_radius)
-            constraint2 = NonlinearConstraint(fun=self.propagation2, lb=-height_init/2 + self.safety_radius, ub=height_init/2 - self.safety_radius)
-            if len(self.x_obs) > 0 or len(self.y_obs) > 0:
-                constraint3 = NonlinearConstraint(fun=self.propagation3, lb=0, ub=np.inf)
-                constraints = [constraint1, constraint2, constraint3]
-            else:
-                constraints = [constraint1, constraint2]
-
-            return bounds, constraints
-
     def run_mpc(self, x, u, break_flag):
         for i in range(self.robot_num):
             start_time = time.time()
@@ -451,9 +649,9 @@ class ModelPredictiveControl:
                 self.ref[i][1] = self.cy[i][0]
 
             # cx, cy, ref = update_paths(i, x, cx, cy, cyaw, target_ind, ref, dl)
-            t_prev = time.time()
+            t_prev = time.perf_counter_ns()
             x, u = self.mpc_control(i, x, u, self.ref, self.seed_cost)
-            self.computational_time.append(time.time() - t_prev)
+            self.computational_time.append((time.perf_counter_ns() - t_prev)*1e-9)
 
             if debug:
                 print('Robot ' + str(i+1) + ' of ' + str(self.robot_num) + '   Time ' + str(round(time.time() - start_time,5)))
@@ -463,6 +661,9 @@ class ModelPredictiveControl:
         return x, u, break_flag
     
     def go_to_goal(self, x, u, break_flag):
+        if self.parallel:
+            return self.go_to_goal_parallel(x, u, break_flag)
+
         for i in range(self.robot_num):
             self.check_collision(x, u, i)
             if not self.reached_goal[i]:                
@@ -473,9 +674,9 @@ class ModelPredictiveControl:
                     u[:,i] = 0
                     self.reached_goal[i] = True
                 else:
-                    t_prev = time.time()
+                    t_prev = time.perf_counter_ns()
                     x, u = self.mpc_control(i, x, u, self.ref, self.seed_cost)
-                    self.computational_time.append(time.time() - t_prev)
+                    self.computational_time.append((time.perf_counter_ns() - t_prev)*1e-9)
                     
             # If we want the robot to disappear when it reaches the goal, indent one more time
             if all(self.reached_goal):
@@ -484,6 +685,71 @@ class ModelPredictiveControl:
             if show_animation:
                 plot_robot_seed(x, u, self.predicted_trajectory, self.ref, i)
         return x, u, break_flag
+
+    def go_to_goal_parallel(self, x, u, break_flag):
+        """
+        Moves the robots to the goal position, the problems of the robots are solved in parallel
+        by a persistent pool of worker processes.
+        The predicted trajectories are snapshotted at the start of the tick, so every robot avoids
+        the trajectories predicted at the previous tick. The computational time of a robot is the
+        time spent on its own problem: its preparation, its solve in the worker and the application
+        of the solution, not the time spent waiting for the other robots.
+
+        Args:
+            x (numpy.ndarray): The state vector.
+            u (numpy.ndarray): The control vector.
+            break_flag (bool): Flag set when all the robots reached their goal.
+
+        Returns:
+            tuple: The updated state vector, control vector and break flag.
+        """
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=workers if workers > 0 else None,
+                                            initializer=init_worker, initargs=(self.robot_num, self.solver))
+
+        predicted_trajectory = {idx: traj.copy() for idx, traj in self.predicted_trajectory.items()}
+        jobs = {}
+        for i in range(self.robot_num):
+            self.check_collision(x, u, i)
+            if not self.reached_goal[i]:
+                # If goal is reached, stop the robot
+                if check_goal_reached(x, self.ref, i, distance=to_goal_stop_distance):
+                    x[3, i] = 0
+                    u[:,i] = 0
+                    self.reached_goal[i] = True
+                else:
+                    t_prev = time.perf_counter_ns()
+                    with span("MPC.prepare"):
+                        u1, state = self.prepare_problem(i, x, u, self.ref, predicted_trajectory)
+                    problem = self.problems[i]
+                    future = self.pool.submit(solve_worker, i, self.seed_cost.__name__, u1, np.array(state), self.ref[i],
+                                              problem.x_obs, problem.y_obs, problem.horizon)
+                    jobs[i] = (future, state, time.perf_counter_ns() - t_prev)
+
+        for i, (future, state, prepare_time) in jobs.items():
+            with span("MPC.wait"):
+                u1, missed, solve_time = future.result()
+            self.deadline.record(i, missed)
+            t_prev = time.perf_counter_ns()
+            with span("MPC.apply"):
+                x, u = self.apply_solution(i, x, u, u1, state)
+            self.computational_time.append((prepare_time + solve_time + time.perf_counter_ns() - t_prev)*1e-9)
+
+        if all(self.reached_goal):
+            break_flag = True
+
+        if show_animation:
+            for i in range(self.robot_num):
+                plot_robot_seed(x, u, self.predicted_trajectory, self.ref, i)
+        return x, u, break_flag
+
+    def close(self):
+        """
+        Shut down the worker pool, if any.
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
     
     def mpc_control(self, i, x, u, ref, cost_function):
         """
@@ -503,6 +769,28 @@ class ModelPredictiveControl:
             tuple: A tuple containing the updated state vector, control vector, and predicted trajectory.
 
         """
+        with span("MPC.prepare"):
+            u1, state = self.prepare_problem(i, x, u, ref, self.predicted_trajectory)
+        with span("MPC.solve"):
+            u1 = self.solve(i, cost_function, u1, state, ref[i])
+        with span("MPC.apply"):
+            return self.apply_solution(i, x, u, u1, state)
+
+    def prepare_problem(self, i, x, u, ref, predicted_trajectory):
+        """
+        Prepare the problem of robot i: shift the previous solution to warm start the solver,
+        measure the (noisy) state, select the horizon and update the obstacles.
+
+        Args:
+            i (int): The index of the current robot.
+            x (numpy.ndarray): The state vector.
+            u (numpy.ndarray): The control vector.
+            ref (list): The goals of all robots.
+            predicted_trajectory (dict): The predicted trajectories of all robots.
+
+        Returns:
+            tuple: The warm start of the control sequence and the initial state of the problem.
+        """
         x1 = x[:, i]
         u1 = u[:,i]
         u1 = np.delete(u1,0)
@@ -511,81 +799,174 @@ class ModelPredictiveControl:
         u1 = np.append(u1, u1[-2])  
 
         if add_noise:
-            noise = np.concatenate([np.random.normal(0, 0.21*noise_scale_param, 2).reshape(1, 2), np.random.normal(0, np.radians(5)*noise_scale_param, 1).reshape(1,1), np.random.normal(0, 0.2*noise_scale_param, 1).reshape(1,1)], axis=1)
-            noisy_pos = x1 + noise[0]
-            plt.plot(noisy_pos[0], noisy_pos[1], "x" + color_dict[i], markersize=10)
-            self.update_obstacles(i, noisy_pos, x, self.predicted_trajectory) 
-            self.bounds, self.constraints = self.set_bounds_and_constraints()
-            self.initial_state = noisy_pos
-            u_solution = minimize(cost_function, u1, (noisy_pos, ref[i]),
-                            method='SLSQP',
-                            bounds=self.bounds,
-                            constraints=self.constraints,
-                            tol = 1e-1)
+            state = x1 + self.noise.sample(i)
+            if show_animation:
+                plt.plot(state[0], state[1], "x" + color_dict[i], markersize=10)
         else:
-            self.update_obstacles(i, x1, x, self.predicted_trajectory) 
-            self.bounds, self.constraints = self.set_bounds_and_constraints()
-            self.initial_state = x1
-            u_solution = minimize(cost_function, u1, (x1, ref[i]),
-                            method='SLSQP',
-                            bounds=self.bounds,
-                            constraints=self.constraints,
-                            tol = 1e-1)
-               
-        u1 = u_solution.x
+            state = x1
+        if adaptive_horizon and self.solver == "SLSQP":
+            self.problems[i].set_horizon(self.adapt_horizon(i, state, x, ref[i]))
+        self.update_obstacles(i, state, x, predicted_trajectory) 
+        return u1, state
+
+    def adapt_horizon(self, i, state, x, ref):
+        """
+        Select the horizon of robot i. The horizon is shortened to min_horizon when no other robot
+        can come closer than the safety radius within the full horizon, and it is shortened to the
+        steps needed to reach the goal at max speed when the goal is closer than that.
+
+        Args:
+            i (int): The index of the current robot.
+            state (numpy.ndarray): The initial state of the robot.
+            x (numpy.ndarray): The state vector.
+            ref (list): The goal of the robot.
+
+        Returns:
+            int: The horizon.
+        """
+        reach = max_speed * self.horizon * self.dt
+        horizon = self.horizon
+
+        others = np.delete(x[0:2, :], i, axis=1)
+        if others.shape[1] == 0 or np.min(np.hypot(others[0] - state[0], others[1] - state[1])) > 2*reach + self.safety_radius:
+            horizon = min_horizon
+
+        dist_to_goal = np.hypot(ref[0] - state[0], ref[1] - state[1])
+        if dist_to_goal < reach:
+            horizon = min(horizon, max(min_horizon, int(np.ceil(dist_to_goal / (max_speed*self.dt)))))
+        return horizon
+
+    def apply_solution(self, i, x, u, u1, state):
+        """
+        Apply the first input of the solution to robot i and update its predicted trajectory.
+
+        Args:
+            i (int): The index of the current robot.
+            x (numpy.ndarray): The state vector.
+            u (numpy.ndarray): The control vector.
+            u1 (numpy.ndarray): The optimal control sequence.
+            state (numpy.ndarray): The initial state of the problem.
+
+        Returns:
+            tuple: A tuple containing the updated state vector and control vector.
+        """
         if u1[0]>max_acc or u1[0]<min_acc:
             print(f'Acceleration out of bounds: {u1[0]}')
             u1[0] = np.clip(u1[0], min_acc, max_acc)
         # x1 = self.plant_model(x1, dt, u1[0], u1[1])
-        x1 = utils.motion(x1, u1, dt)
+        x1 = utils.motion(x[:, i], u1, dt)
         x[:, i] = x1
         u[:, i] = u1
        
         if add_noise:
-            predicted_state = np.array([noisy_pos])
-
-            for j in range(1, self.horizon):
-                predicted = self.plant_model(predicted_state[-1], self.dt, u1[2*j], u1[2*j+1])
-                predicted_state = np.append(predicted_state, np.array([predicted]), axis=0)
+            predicted_state = np.array([state])
         else:
             predicted_state = np.array([x1])
 
-            for j in range(1, self.horizon):
-                predicted = self.plant_model(predicted_state[-1], self.dt, u1[2*j], u1[2*j+1])
-                predicted_state = np.append(predicted_state, np.array([predicted]), axis=0)
+        for j in range(1, self.horizon):
+            predicted = self.plant_model(predicted_state[-1], self.dt, u1[2*j], u1[2*j+1])
+            predicted_state = np.append(predicted_state, np.array([predicted]), axis=0)
         self.predicted_trajectory[i] = predicted_state
 
         return x, u
     
+    def solve(self, i, cost_function, u1, state, ref):
+        """
+        Solve the optimal control problem of robot i.
+
+        With the "SLSQP" solver the cost function is minimized under the constraints given by
+        propagation1, propagation2 and propagation3, over the active horizon and move-blocking
+        layout of the problem. With the "iLQR" solver the same constraints are handled by the
+        iLQR solver over the full horizon, the cost function argument is not used since iLQR
+        relies on its own goal-reaching cost.
+
+        SLSQP is capped at max_iter iterations. When the deadline expires the last iterate is used,
+        if no iteration was completed the robot brakes.
+
+        Args:
+            i (int): The index of the current robot.
+            cost_function (function): The cost function to be minimized (SLSQP only).
+            u1 (numpy.ndarray): The warm start of the control sequence.
+            state (numpy.ndarray): The initial state of the robot.
+            ref (list): The goal of the robot.
+
+        Returns:
+            numpy.ndarray: The optimal control sequence.
+        """
+        problem = self.problems[i]
+        self.deadline.start(i)
+        if self.solver == "iLQR":
+            u1 = self.ilqr.solve(state, u1, ref, problem.x_obs, problem.y_obs, expired=self.deadline.expired)
+            self.deadline.stop(i)
+            return u1
+
+        problem.initial_state = state
+        problem.best = None
+        try:
+            u_solution = optimize.minimize(problem.cost, problem.compress(u1), (cost_function, state, ref, problem.x_obs, problem.y_obs),
+                            method='SLSQP',
+                            bounds=problem.bounds,
+                            constraints=problem.constraints,
+                            callback=problem.callback,
+                            options={'maxiter': max_iter},
+                            tol = 1e-1)
+            z = u_solution.x
+        except DeadlineExpired:
+            z = problem.best
+        self.deadline.stop(i)
+
+        if z is None:
+            return np.tile(braking_input(state[3], min_acc, max_acc, self.dt), self.horizon)
+
+        # hold the last input after a shortened horizon
+        u1 = problem.expand(z)
+        return np.concatenate([u1, np.tile(u1[-2:], self.horizon - problem.horizon)])
+
     def update_obstacles(self, i, x1, x, predicted_trajectory):
         """
-        Update the obstacles for the model predictive control (MPC) algorithm.
+        Update the obstacles of the problem of robot i for the model predictive control (MPC) algorithm.
+        The obstacle arrays are overwritten in place. Neighbours that cannot be reached within the
+        horizon are culled, the reachable ones are all kept unless max_neighbours is set, in which case
+        only the nearest ones are kept and the truncation is reported. The unused slots are padded, so
+        the number of constraints does not change between ticks, and the arrays are only reallocated
+        (and counted) when more neighbours are reachable than they were sized for.
 
         Args:
-            mpc (MPC): The MPC object.
             i (int): The index of the current robot.
             x1 (list): The position of the current robot.
             x (ndarray): The positions of all robots.
             predicted_trajectory (list): The predicted trajectories of all robots.
 
-        Raises:
-            Exception: If a collision is detected.
-
         Returns:
             None
         """
-        self.x_obs = []
-        self.y_obs = []
-
-        for idx in range(self.robot_num):
-            if idx == i:
-                continue
-            
-            next_robot_state = predicted_trajectory[idx]
-            self.x_obs.append(next_robot_state[0:-1:5, 0])
-            self.y_obs.append(next_robot_state[0:-1:5, 1])
-        self.x_obs = [item for sublist in self.x_obs for item in sublist]
-        self.y_obs = [item for sublist in self.y_obs for item in sublist]
+        problem = self.problems[i]
+        others = [idx for idx in range(self.robot_num) if idx != i]
+        if not others:
+            return
+
+        # every 5th predicted point of the other robots, shape (robots, points, 2)
+        points = np.stack([predicted_trajectory[idx][0:-1:5, 0:2] for idx in others])
+
+        # a neighbour is kept only if one of its points can be reached within the horizon
+        distance = np.min(np.hypot(points[:, :, 0] - x1[0], points[:, :, 1] - x1[1]), axis=1)
+        nearest = np.argsort(distance)
+        nearest = nearest[distance[nearest] <= self.reach]
+        if nearest.shape[0] > self.max_neighbours:
+            if self.truncations[i] == 0:
+                print(f'Robot {i}: {nearest.shape[0]} reachable neighbours, only the nearest {self.max_neighbours} are considered')
+            self.truncations[i] += 1
+            nearest = nearest[0:self.max_neighbours]
+
+        # the remaining slots are padded with unreachable obstacles
+        n = nearest.shape[0] * points.shape[1]
+        if n > problem.x_obs.shape[0]:
+            self.reallocations[i] += 1
+            problem.resize_obstacles(n)
+        problem.x_obs[0:n] = points[nearest, :, 0].reshape(-1)
+        problem.y_obs[0:n] = points[nearest, :, 1].reshape(-1)
+        problem.x_obs[n:] = far_obstacle
+        problem.y_obs[n:] = far_obstacle
 
     def check_collision(self, x, u, i):
         """
@@ -895,6 +1276,10 @@ def main1():
     x = np.array([[0.0], [0.0], [0.0], [0.0]])
 
     mpc = ModelPredictiveControl(obs_x=[3], obs_y=[0.01], x=x, robot_num=x.shape[1])
+    # the problem of the single robot, with the fixed obstacles as its obstacles
+    problem = MPCProblem(mpc.plant_model, mpc.horizon, mpc.dt, mpc.safety_radius, len(mpc.x_obs))
+    problem.x_obs[:] = mpc.x_obs
+    problem.y_obs[:] = mpc.y_obs
 
     num_inputs = 2
     u = np.zeros([mpc.horizon*num_inputs, x.shape[1]])
@@ -935,11 +1320,11 @@ def main1():
         u1 = np.append(u1, u1[-2])  
 
         # self.update_obstacles(i, x1, x, self.predicted_trajectory) 
-        mpc.initial_state = x1
-        u_solution = minimize(mpc.cost_function3, u1, (x1, ref[i]),
+        problem.initial_state = x1
+        u_solution = optimize.minimize(mpc.cost_function3, u1, (x1, ref[i]),
                         method='SLSQP',
-                        bounds=mpc.bounds,
-                        constraints=mpc.constraints,
+                        bounds=problem.bounds,
+                        constraints=problem.constraints,
                         tol = 1e-3)
             
         u1 = u_solution.x
@@ -1068,6 +1453,7 @@ def main3():
         - Update the predicted trajectory.
         - Plot the map and pause for visualization.
     """
+    seed = load_data('seeds', 'circular_seed_10.json')
     print(__file__ + " start!!")
 
     # initial state [x(m), y(m), yaw(rad), v(m/s), omega(rad/s)]
@@ -1157,6 +1543,7 @@ def main_seed():
         - Update the predicted trajectory.
         - Plot the map and pause for visualization.
     """
+    seed = load_data('seeds', 'circular_seed_10.json')
     print(__file__ + " start!!")
 
     # initial state [x(m), y(m), yaw(rad), v(m/s), omega(rad/s)]
@@ -1177,8 +1564,8 @@ def main_seed():
     num_inputs = 2
     u = np.zeros([mpc.horizon*num_inputs, robot_num])
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     # Generate reference trajectory
     traj = seed['trajectories']
@@ -1211,7 +1598,7 @@ def main_seed():
 
         # x, u, break_flag = mpc.run_mpc(x, u, break_flag)
         x, u, break_flag = mpc.go_to_goal(x, u, break_flag)
-        trajectory = np.dstack([trajectory, x])
+        recorder.append(x)
 
         plt.title('MPC 2D')
         utils.plot_map(width=width_init, height=height_init)
@@ -1222,6 +1609,7 @@ def main_seed():
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -0,0 +1,72 @@
+"""
+Benchmark of move blocking and adaptive horizon for the MPC controller on the circular seeds.
+
+For every configuration the robots of each seed are driven to their goal, the script reports
+the mean solve time, the number of ticks needed by all robots to reach their goal, the number
+of robots that did not reach it and the minimum distance between two robots. Run with:
+
+    python3 -m mpc_dev.benchmark_horizon
+"""
+import numpy as np
+
+import mpc_dev.MPC as MPC
+from planner.config import load_data
+
+seeds = ['circular_seed_0', 'circular_seed_1', 'circular_seed_2', 'circular_seed_10', 'circular_seed_15']
+iterations = 300
+
+# name, block size, adaptive horizon
+configurations = [
+    ('baseline', 1, False),
+    ('blocking 2', 2, False),
+    ('blocking 4', 4, False),
+    ('adaptive', 1, True),
+    ('blocking 2 + adaptive', 2, True),
+]
+
+def run(seed):
+    """
+    Drive the robots of a seed to their goal with the current MPC configuration.
+
+    Args:
+        seed (dict): The seed.
+
+    Returns:
+        tuple: Mean solve time [s], ticks, robots not at the goal and minimum distance between robots [m].
+    """
+    initial_state = seed['initial_position']
+    x = np.array([initial_state['x'], initial_state['y'], initial_state['yaw'], initial_state['v']])
+    robot_num = x.shape[1]
+
+    mpc = MPC.ModelPredictiveControl(obs_x=[], obs_y=[], x=x, robot_num=robot_num)
+    mpc.ref = [list(seed['trajectories'][str(i)][0][0:2]) for i in range(robot_num)]
+    u = np.zeros([mpc.horizon*2, robot_num])
+    break_flag = False
+
+    min_dist = np.inf
+    for z in range(iterations):
+        x, u, break_flag = mpc.go_to_goal(x, u, break_flag)
+        diff = x[0:2, :, None] - x[0:2, None, :]
+        dist = np.hypot(diff[0], diff[1]) + np.diag(np.full(robot_num, np.inf))
+        min_dist = min(min_dist, np.min(dist))
+        if break_flag:
+            break
+
+    not_at_goal = sum(np.hypot(x[0, i] - mpc.ref[i][0], x[1, i] - mpc.ref[i][1]) > MPC.to_goal_stop_distance for i in range(robot_num))
+    return np.mean(mpc.computational_time), z + 1, not_at_goal, min_dist
+
+def main():
+    MPC.show_animation = False
+    MPC.add_noise = False
+
+    print(f'{"configuration":<22} {"seed":<17} {"solve [ms]":>10} {"ticks":>6} {"missed":>7} {"min dist [m]":>13}')
+    for name, block_size, adaptive_horizon in configurations:
+        MPC.block_size = block_size
+        MPC.adaptive_horizon = adaptive_horizon
+        for seed_name in seeds:
+            seed = load_data('seeds', seed_name + '.json')
+            solve_time, ticks, not_at_goal, min_dist = run(seed)
+            print(f'{name:<22} {seed_name:<17} {1000*solve_time:>10.1f} {ticks:>6} {not_at_goal:>7} {min_dist:>13.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark of the tick latency of the MPC controller versus the number of robots, for the
+serial (go_to_goal) and the parallel (go_to_goal_parallel) implementation.
+
+The robots are placed on a circle and each one has to reach the opposite point, like in the
+circular seeds. Run with:
+
+    python3 -m mpc_dev.benchmark_parallel
+"""
+import time
+
+import numpy as np
+
+import mpc_dev.MPC as MPC
+import planner.utils as utils
+
+robot_nums = [2, 4, 6, 8, 10, 12]
+ticks = 20
+radius = 10.0
+
+def run(robot_num, parallel):
+    """
+    Run the MPC controller for a fixed number of ticks.
+
+    Args:
+        robot_num (int): The number of robots.
+        parallel (bool): Whether the problems of the robots are solved in parallel.
+
+    Returns:
+        numpy.ndarray: The latency of each tick [s].
+    """
+    x0, y, yaw, v, omega, model_type = utils.circular_samples(MPC.width_init, MPC.height_init, radius, robot_num, MPC.safety_init)
+    x = np.array([x0, y, yaw, v])
+    mpc = MPC.ModelPredictiveControl(obs_x=[], obs_y=[], x=x, robot_num=robot_num)
+    mpc.parallel = parallel
+    mpc.ref = [[-x[0, i], -x[1, i]] for i in range(robot_num)]
+    u = np.zeros([mpc.horizon*2, robot_num])
+    break_flag = False
+
+    # first tick not timed, it includes the start up of the worker pool
+    x, u, break_flag = mpc.go_to_goal(x, u, break_flag)
+
+    latency = []
+    for z in range(ticks):
+        t_prev = time.perf_counter()
+        x, u, break_flag = mpc.go_to_goal(x, u, break_flag)
+        latency.append(time.perf_counter() - t_prev)
+        if break_flag:
+            break
+    mpc.close()
+    return np.array(latency)
+
+def main():
+    MPC.show_animation = False
+    MPC.add_noise = False
+
+    print(f'{"robots":>6} {"serial [ms]":>12} {"parallel [ms]":>14} {"speed up":>9}')
+    for robot_num in robot_nums:
+        serial = run(robot_num, parallel=False)
+        parallel = run(robot_num, parallel=True)
+        print(f'{robot_num:>6} {1000*np.mean(serial):>12.1f} {1000*np.mean(parallel):>14.1f} {np.mean(serial)/np.mean(parallel):>9.2f}')
+
+if __name__ == '__main__':
+    main()
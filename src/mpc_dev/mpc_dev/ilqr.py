@@ -0,0 +1,344 @@
+"""
+Iterative LQR solver for the kinematic bicycle model used by the MPC.
+
+The solver exploits the stage-wise structure of the optimal control problem: every iteration
+is a backward Riccati pass and a forward rollout over the horizon, so the cost of one
+iteration grows linearly with the horizon (instead of the cubic growth of the dense QP
+subproblems solved by SLSQP).
+Arena bounds and neighbour distances are handled with augmented Lagrangian terms.
+"""
+import numpy as np
+
+
+class iLQR:
+    """
+    Iterative Linear Quadratic Regulator with augmented Lagrangian constraint handling.
+
+    The state is [x, y, yaw, v] and the input is [pedal, steering], exactly like
+    ModelPredictiveControl.plant_model. The constraints are the same ones used by the SLSQP
+    formulation: the robot has to stay safety_radius away from the arena walls (propagation1,
+    propagation2) and from every obstacle point (propagation3).
+
+    Attributes:
+        horizon (int): Number of prediction steps.
+        dt (float): Prediction time step.
+        L (float): Wheel base of the vehicle.
+        u_min (numpy.ndarray): Lower bounds of the inputs [min_acc, -max_steer].
+        u_max (numpy.ndarray): Upper bounds of the inputs [max_acc, max_steer].
+        v_min (float): Minimum speed.
+        v_max (float): Maximum speed.
+        safety_radius (float): Minimum distance to the obstacles and to the arena walls.
+        arena (numpy.ndarray): Arena limits [x_min, x_max, y_min, y_max] already shrunk by the safety radius.
+        max_iter (int): Maximum number of iLQR iterations for each augmented Lagrangian update.
+        al_iter (int): Number of augmented Lagrangian (multiplier) updates.
+    """
+
+    def __init__(self, horizon, dt, L, u_min, u_max, v_min, v_max, safety_radius, width, height,
+                 max_iter=20, al_iter=5, goal_gain=5.0, terminal_gain=20.0, acc_gain=0.1, steer_gain=1.0):
+        self.horizon = horizon
+        self.dt = dt
+        self.L = L
+        self.u_min = np.array(u_min, dtype=float)
+        self.u_max = np.array(u_max, dtype=float)
+        self.v_min = v_min
+        self.v_max = v_max
+        self.safety_radius = safety_radius
+        self.arena = np.array([-width/2 + safety_radius, width/2 - safety_radius,
+                               -height/2 + safety_radius, height/2 - safety_radius])
+        self.max_iter = max_iter
+        self.al_iter = al_iter
+
+        self.goal_gain = goal_gain
+        self.terminal_gain = terminal_gain
+        self.R = np.diag([acc_gain, steer_gain])
+        self.eps = 0.1  # smoothing of the distance to goal [m]
+        self.mu_init = 100.0
+        self.mu_max = 1e4
+        self.tol = 1e-4
+
+    def dynamics(self, x, u):
+        """
+        Propagate the state one step forward, same equations as ModelPredictiveControl.plant_model.
+
+        Args:
+            x (numpy.ndarray): State [x, y, yaw, v].
+            u (numpy.ndarray): Input [pedal, steering].
+
+        Returns:
+            numpy.ndarray: The next state.
+        """
+        pedal = np.clip(u[0], self.u_min[0], self.u_max[0])
+        x_next = np.empty(4)
+        x_next[0] = x[0] + np.cos(x[2]) * x[3] * self.dt
+        x_next[1] = x[1] + np.sin(x[2]) * x[3] * self.dt
+        x_next[3] = np.clip(x[3] + pedal * self.dt, self.v_min, self.v_max)
+        x_next[2] = x[2] + x_next[3] * self.dt * np.tan(u[1]) / self.L
+        x_next[2] = (x_next[2] + np.pi) % (2 * np.pi) - np.pi
+        return x_next
+
+    def rollout(self, x0, U):
+        """
+        Propagate the whole input sequence.
+
+        Args:
+            x0 (numpy.ndarray): Initial state.
+            U (numpy.ndarray): Input sequence of shape (horizon, 2).
+
+        Returns:
+            numpy.ndarray: State sequence of shape (horizon+1, 4).
+        """
+        X = np.empty((self.horizon + 1, 4))
+        X[0] = x0
+        for k in range(self.horizon):
+            X[k+1] = self.dynamics(X[k], U[k])
+        return X
+
+    def jacobians(self, X, U):
+        """
+        Linearize the dynamics along a trajectory, vectorized over the horizon.
+
+        Args:
+            X (numpy.ndarray): State sequence of shape (horizon+1, 4).
+            U (numpy.ndarray): Input sequence of shape (horizon, 2).
+
+        Returns:
+            tuple: fx of shape (horizon, 4, 4) and fu of shape (horizon, 4, 2).
+        """
+        H = self.horizon
+        dt = self.dt
+        yaw = X[:-1, 2]
+        v = X[:-1, 3]
+        v_next = X[1:, 3]
+        tan_d = np.tan(U[:, 1])
+        # derivative of the clipped speed update, zero when saturated
+        v_free = v + np.clip(U[:, 0], self.u_min[0], self.u_max[0]) * dt
+        dv = ((v_free > self.v_min) & (v_free < self.v_max)).astype(float)
+        da = dv * ((U[:, 0] > self.u_min[0]) & (U[:, 0] < self.u_max[0]))
+
+        fx = np.zeros((H, 4, 4))
+        fx[:, 0, 0] = 1.0
+        fx[:, 1, 1] = 1.0
+        fx[:, 2, 2] = 1.0
+        fx[:, 0, 2] = -np.sin(yaw) * v * dt
+        fx[:, 0, 3] = np.cos(yaw) * dt
+        fx[:, 1, 2] = np.cos(yaw) * v * dt
+        fx[:, 1, 3] = np.sin(yaw) * dt
+        fx[:, 3, 3] = dv
+        fx[:, 2, 3] = dv * dt * tan_d / self.L
+
+        fu = np.zeros((H, 4, 2))
+        fu[:, 3, 0] = da * dt
+        fu[:, 2, 0] = da * dt * dt * tan_d / self.L
+        fu[:, 2, 1] = v_next * dt / (np.cos(U[:, 1])**2 * self.L)
+        return fx, fu
+
+    def constraints(self, X, x_obs, y_obs):
+        """
+        Evaluate the inequality constraints g <= 0 for the states X[1:].
+
+        Args:
+            X (numpy.ndarray): State sequence of shape (horizon+1, 4).
+            x_obs (numpy.ndarray): x-coordinates of the obstacles.
+            y_obs (numpy.ndarray): y-coordinates of the obstacles.
+
+        Returns:
+            tuple: Arena constraints of shape (horizon, 4) and obstacle constraints of shape (horizon, M).
+        """
+        x = X[1:, 0]
+        y = X[1:, 1]
+        g_arena = np.stack([self.arena[0] - x, x - self.arena[1], self.arena[2] - y, y - self.arena[3]], axis=1)
+        g_obs = self.safety_radius**2 - ((x[:, None] - x_obs[None, :])**2 + (y[:, None] - y_obs[None, :])**2)
+        return g_arena, g_obs
+
+    def cost(self, X, U, ref, lam_arena, lam_obs, mu, x_obs, y_obs):
+        """
+        Evaluate the augmented Lagrangian of the problem.
+
+        Args:
+            X (numpy.ndarray): State sequence of shape (horizon+1, 4).
+            U (numpy.ndarray): Input sequence of shape (horizon, 2).
+            ref (list): Goal position [x, y].
+            lam_arena (numpy.ndarray): Multipliers of the arena constraints.
+            lam_obs (numpy.ndarray): Multipliers of the obstacle constraints.
+            mu (float): Penalty parameter.
+            x_obs (numpy.ndarray): x-coordinates of the obstacles.
+            y_obs (numpy.ndarray): y-coordinates of the obstacles.
+
+        Returns:
+            float: The cost.
+        """
+        d = np.sqrt((X[1:, 0] - ref[0])**2 + (X[1:, 1] - ref[1])**2 + self.eps**2)
+        cost = self.goal_gain * np.sum(d) + self.terminal_gain * d[-1]
+        cost += np.sum((U @ self.R) * U)
+
+        g_arena, g_obs = self.constraints(X, x_obs, y_obs)
+        cost += (np.sum(np.maximum(0.0, lam_arena + mu * g_arena)**2 - lam_arena**2)
+                 + np.sum(np.maximum(0.0, lam_obs + mu * g_obs)**2 - lam_obs**2)) / (2 * mu)
+        return cost
+
+    def state_cost_derivatives(self, X, ref, lam_arena, lam_obs, mu, x_obs, y_obs):
+        """
+        Gradient and (Gauss-Newton) Hessian of the state cost for the states X[1:].
+
+        Returns:
+            tuple: lx of shape (horizon, 4) and lxx of shape (horizon, 4, 4).
+        """
+        H = self.horizon
+        lx = np.zeros((H, 4))
+        lxx = np.zeros((H, 4, 4))
+
+        # Distance to goal
+        p = X[1:, 0:2] - np.array(ref[0:2])
+        d = np.sqrt(np.sum(p**2, axis=1) + self.eps**2)
+        w = np.full(H, self.goal_gain)
+        w[-1] += self.terminal_gain
+        lx[:, 0:2] = (w / d)[:, None] * p
+        lxx[:, 0:2, 0:2] = (w / d)[:, None, None] * np.eye(2) - (w / d**3)[:, None, None] * p[:, :, None] * p[:, None, :]
+
+        # Arena walls, linear constraints
+        g_arena, g_obs = self.constraints(X, x_obs, y_obs)
+        act = np.maximum(0.0, lam_arena + mu * g_arena)
+        lx[:, 0] += -act[:, 0] + act[:, 1]
+        lx[:, 1] += -act[:, 2] + act[:, 3]
+        lxx[:, 0, 0] += mu * ((act[:, 0] > 0).astype(float) + (act[:, 1] > 0))
+        lxx[:, 1, 1] += mu * ((act[:, 2] > 0).astype(float) + (act[:, 3] > 0))
+
+        # Obstacles, dg/dp = -2 (p - p_obs)
+        if g_obs.shape[1] > 0:
+            act = np.maximum(0.0, lam_obs + mu * g_obs)
+            dgx = -2 * (X[1:, 0, None] - x_obs[None, :])
+            dgy = -2 * (X[1:, 1, None] - y_obs[None, :])
+            lx[:, 0] += np.sum(act * dgx, axis=1)
+            lx[:, 1] += np.sum(act * dgy, axis=1)
+            on = mu * (act > 0)
+            lxx[:, 0, 0] += np.sum(on * dgx * dgx, axis=1)
+            lxx[:, 0, 1] += np.sum(on * dgx * dgy, axis=1)
+            lxx[:, 1, 0] = lxx[:, 0, 1]
+            lxx[:, 1, 1] += np.sum(on * dgy * dgy, axis=1)
+        return lx, lxx
+
+    def backward_pass(self, fx, fu, lx, lxx, U, reg):
+        """
+        Riccati recursion over the horizon.
+
+        Returns:
+            tuple: Feedforward terms (horizon, 2), feedback gains (horizon, 2, 4) and expected
+            cost reduction, or None if the regularized Quu is not positive definite.
+        """
+        H = self.horizon
+        k_ff = np.zeros((H, 2))
+        K_fb = np.zeros((H, 2, 4))
+        Vx = lx[-1].copy()
+        Vxx = lxx[-1].copy()
+        dV = 0.0
+
+        for k in range(H - 1, -1, -1):
+            Qx = fx[k].T @ Vx
+            Qu = 2 * self.R @ U[k] + fu[k].T @ Vx
+            Qxx = fx[k].T @ Vxx @ fx[k]
+            Quu = 2 * self.R + fu[k].T @ Vxx @ fu[k] + reg * np.eye(2)
+            Qux = fu[k].T @ Vxx @ fx[k]
+            try:
+                Quu_chol = np.linalg.cholesky(Quu)
+            except np.linalg.LinAlgError:
+                return None
+            Quu_inv = np.linalg.inv(Quu_chol.T) @ np.linalg.inv(Quu_chol)
+            k_ff[k] = -Quu_inv @ Qu
+            K_fb[k] = -Quu_inv @ Qux
+            dV += k_ff[k] @ Qu
+
+            Vx = Qx + K_fb[k].T @ Quu @ k_ff[k] + K_fb[k].T @ Qu + Qux.T @ k_ff[k]
+            Vxx = Qxx + K_fb[k].T @ Quu @ K_fb[k] + K_fb[k].T @ Qux + Qux.T @ K_fb[k]
+            Vxx = 0.5 * (Vxx + Vxx.T)
+            if k > 0:
+                # the state reached at step k is X[k] = X[1:][k-1]
+                Vx = Vx + lx[k-1]
+                Vxx = Vxx + lxx[k-1]
+        return k_ff, K_fb, dV
+
+    def forward_pass(self, x0, X, U, k_ff, K_fb, alpha):
+        """
+        Roll out the updated policy, the inputs are projected on the box constraints.
+
+        Returns:
+            tuple: The new state and input sequences.
+        """
+        X_new = np.empty_like(X)
+        U_new = np.empty_like(U)
+        X_new[0] = x0
+        for k in range(self.horizon):
+            dx = X_new[k] - X[k]
+            dx[2] = (dx[2] + np.pi) % (2 * np.pi) - np.pi
+            U_new[k] = np.clip(U[k] + alpha * k_ff[k] + K_fb[k] @ dx, self.u_min, self.u_max)
+            X_new[k+1] = self.dynamics(X_new[k], U_new[k])
+        return X_new, U_new
+
+    def solve(self, x0, u0, ref, x_obs, y_obs, expired=None):
+        """
+        Solve the MPC problem starting from the warm start u0.
+
+        Args:
+            x0 (numpy.ndarray): Initial state [x, y, yaw, v].
+            u0 (numpy.ndarray): Flat warm start [pedal_0, steering_0, pedal_1, ...] of length 2*horizon.
+            ref (list): Goal position [x, y].
+            x_obs (list): x-coordinates of the obstacles.
+            y_obs (list): y-coordinates of the obstacles.
+            expired (function, optional): Returns True when the time budget is exhausted, the
+                solver then stops and returns its current input sequence. Defaults to None.
+
+        Returns:
+            numpy.ndarray: Flat optimal input sequence, same layout as u0.
+        """
+        x0 = np.array(x0[0:4], dtype=float)
+        x_obs = np.asarray(x_obs, dtype=float).reshape(-1)
+        y_obs = np.asarray(y_obs, dtype=float).reshape(-1)
+        U = np.clip(np.array(u0, dtype=float).reshape(self.horizon, 2), self.u_min, self.u_max)
+        X = self.rollout(x0, U)
+
+        lam_arena = np.zeros((self.horizon, 4))
+        lam_obs = np.zeros((self.horizon, x_obs.shape[0]))
+        mu = self.mu_init
+
+        for _ in range(self.al_iter):
+            J = self.cost(X, U, ref, lam_arena, lam_obs, mu, x_obs, y_obs)
+            reg = 1e-6
+            for _ in range(self.max_iter):
+                if expired is not None and expired():
+                    return U.reshape(-1)
+                fx, fu = self.jacobians(X, U)
+                lx, lxx = self.state_cost_derivatives(X, ref, lam_arena, lam_obs, mu, x_obs, y_obs)
+                result = self.backward_pass(fx, fu, lx, lxx, U, reg)
+                if result is None:
+                    reg = max(reg * 10, 1e-3)
+                    continue
+                k_ff, K_fb, dV = result
+
+                accepted = False
+                for alpha in (1.0, 0.5, 0.25, 0.1, 0.01):
+                    X_new, U_new = self.forward_pass(x0, X, U, k_ff, K_fb, alpha)
+                    J_new = self.cost(X_new, U_new, ref, lam_arena, lam_obs, mu, x_obs, y_obs)
+                    if J_new < J:
+                        accepted = True
+                        break
+
+                if not accepted:
+                    reg = max(reg * 10, 1e-3)
+                    if reg > 1e6:
+                        break
+                    continue
+
+                improvement = J - J_new
+                X, U, J = X_new, U_new, J_new
+                reg = max(reg / 10, 1e-6)
+                if improvement < self.tol * (1 + abs(J)):
+                    break
+
+            # Multipliers update
+            g_arena, g_obs = self.constraints(X, x_obs, y_obs)
+            lam_arena = np.maximum(0.0, lam_arena + mu * g_arena)
+            lam_obs = np.maximum(0.0, lam_obs + mu * g_obs)
+            if max(np.max(g_arena, initial=-np.inf), np.max(g_obs, initial=-np.inf)) <= 1e-3:
+                break
+            mu = min(mu * 10, self.mu_max)
+
+        return U.reshape(-1)
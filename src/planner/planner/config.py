@@ -0,0 +1,289 @@
+"""
+Central configuration of the bumper cars.
+
+The parameter file (bumper_cars/params.json) is parsed once per process, the first time
+get_config() is called, into a typed, read-only Config whose sections mirror the file:
+
+    params = get_config()
+    max_speed = params.DWA.max_speed
+
+The parameter file and the data files (trajectory libraries, seeds) are resolved relative to the
+src folder of the workspace: the BUMPER_CARS_SRC environment variable if set, else the source tree
+this package lives in (also with colcon --symlink-install), else the copy installed in the share
+folder of this package (see setup.py). BUMPER_CARS_PARAMS points to another parameter file.
+
+The modules copy the values they use into their globals when they are imported, a Config is not
+meant to change afterwards.
+"""
+import dataclasses
+import functools
+import json
+import os
+import pathlib
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class RobotariumParams:
+    max_steer: float
+    max_speed: float
+    min_speed: float
+    safety_radius: float
+    barrier_gain: float
+    magnitude_limit: float
+
+@dataclass(frozen=True)
+class CBFParams:
+    max_steer: float
+    max_acc: float
+    min_acc: float
+    safety_radius: float
+    barrier_gain: float
+    arena_gain: float
+    Kv: float
+
+@dataclass(frozen=True)
+class SamplingParams:
+    max_steer: float
+    max_speed: float
+    min_speed: float
+    max_acc: float
+    min_acc: float
+    a_resolution: float
+    v_resolution: float
+    delta_resolution: float
+    predict_time: float
+    to_goal_cost_gain: float
+    speed_cost_gain: float
+    obstacle_cost_gain: float
+    heading_cost_gain: float
+    robot_stuck_flag_cons: float
+    dilation_factor: float
+
+@dataclass(frozen=True)
+class MPCParams:
+    max_steer: float
+    max_speed: float
+    min_speed: float
+    max_acc: float
+    min_acc: float
+    horizon: int
+    dt_pred: float
+    safety_radius: float
+    max_iter: int
+    solver: str
+    ilqr_max_iter: int
+    ilqr_al_iter: int
+    block_size: int
+    adaptive_horizon: bool
+    min_horizon: int
+    max_neighbours: int
+    parallel: bool
+    workers: int
+
+@dataclass(frozen=True)
+class CarModelParams:
+    max_steer: float
+    max_speed: float
+    min_speed: float
+    L: float
+    Cf: float
+    Cr: float
+    Iz: float
+    m: float
+    c_a: float
+    c_r1: float
+
+@dataclass(frozen=True)
+class ControllerParams:
+    dt: float
+    max_steer: float
+    WB: float
+    L_d: float
+    max_acc: float
+    min_acc: float
+    controller_type: str
+    cbf_type: str
+    deadline: float
+    qp_max_iter: int
+
+@dataclass(frozen=True)
+class Config:
+    """
+    The parameters of params.json, one attribute per key and one typed section per controller.
+    """
+    CBF_robotarium: RobotariumParams
+    CBF_simple: CBFParams
+    C3BF: CBFParams
+    DWA: SamplingParams
+    LBP: SamplingParams
+    MPC: MPCParams
+    Car_model: CarModelParams
+    Controller: ControllerParams
+    robot_num: int
+    safety: float
+    min_dist: float
+    width: float
+    height: float
+    timer_freq: float
+    plot_traj: bool
+    to_goal_stop_distance: float
+    show_animation: bool
+    add_noise: bool
+    noise_scale_param: float
+    noise_seed: int
+    use_sim_time: bool
+    packed_messages: bool
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: The parameters in the layout of params.json.
+        """
+        return dataclasses.asdict(self)
+
+def check_type(value, kind, name):
+    """
+    Check the type of a parameter, ints are accepted for floats as in json.
+
+    Raises:
+        TypeError: If the value has the wrong type.
+    """
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        return
+    if kind is int and isinstance(value, bool):
+        raise TypeError(f"Parameter {name} should be int, got {value!r}")
+    if not isinstance(value, kind):
+        raise TypeError(f"Parameter {name} should be {kind.__name__}, got {value!r}")
+
+def build(cls, values, prefix=''):
+    """
+    Build a (possibly nested) parameter dataclass from a dictionary.
+
+    Args:
+        cls (type): The dataclass.
+        values (dict): The parameters.
+        prefix (str, optional): Name of the section, for the error messages. Defaults to ''.
+
+    Returns:
+        object: The dataclass instance.
+
+    Raises:
+        KeyError: If a parameter is missing or unknown.
+        TypeError: If a parameter has the wrong type.
+    """
+    fields = {field.name: field.type for field in dataclasses.fields(cls)}
+    unknown = set(values) - set(fields)
+    if unknown:
+        raise KeyError(f"Unknown parameters {sorted(prefix + name for name in unknown)}")
+    kwargs = {}
+    for name, kind in fields.items():
+        if name not in values:
+            raise KeyError(f"Missing parameter {prefix + name}")
+        if dataclasses.is_dataclass(kind):
+            kwargs[name] = build(kind, values[name], prefix + name + '.')
+        else:
+            check_type(values[name], kind, prefix + name)
+            kwargs[name] = values[name]
+    return cls(**kwargs)
+
+def installed_src():
+    """
+    The copy of the data files installed in the share folder of this package, see setup.py.
+
+    Returns:
+        pathlib.Path: The folder, None if the package is not installed in an ament index.
+    """
+    try:
+        from ament_index_python.packages import get_package_share_directory, PackageNotFoundError
+    except ImportError:
+        return None
+    try:
+        return pathlib.Path(get_package_share_directory('planner')) / 'data'
+    except PackageNotFoundError:
+        return None
+
+def workspace_src():
+    """
+    The src folder of the workspace, where the parameter file, the seeds and the trajectory
+    libraries live.
+
+    Returns:
+        pathlib.Path: The folder.
+
+    Raises:
+        FileNotFoundError: If the folder cannot be found.
+    """
+    if 'BUMPER_CARS_SRC' in os.environ:
+        return pathlib.Path(os.environ['BUMPER_CARS_SRC'])
+    # src/planner/planner/config.py, resolve() follows the links of a symlink install
+    src = pathlib.Path(__file__).resolve().parents[2]
+    if (src / 'bumper_cars' / 'params.json').exists():
+        return src
+    installed = installed_src()
+    if installed is not None and (installed / 'bumper_cars' / 'params.json').exists():
+        return installed
+    raise FileNotFoundError(f"No bumper_cars/params.json in {src} nor in the share folder of planner, "
+                            "set BUMPER_CARS_SRC to the src folder of the workspace")
+
+def data_file(*parts):
+    """
+    Path of a file of the workspace.
+
+    Args:
+        *parts (str): Path relative to the src folder, e.g. ('seeds', 'seed_1.json').
+
+    Returns:
+        pathlib.Path: The path.
+    """
+    return workspace_src().joinpath(*parts)
+
+def params_file():
+    """
+    Returns:
+        pathlib.Path: The parameter file, BUMPER_CARS_PARAMS if set.
+    """
+    if 'BUMPER_CARS_PARAMS' in os.environ:
+        return pathlib.Path(os.environ['BUMPER_CARS_PARAMS'])
+    return data_file('bumper_cars', 'params.json')
+
+def load_config(file=None):
+    """
+    Parse a parameter file.
+
+    Args:
+        file (str, optional): The parameter file. Defaults to params_file().
+
+    Returns:
+        Config: The parameters.
+    """
+    with open(file if file is not None else params_file(), 'r') as openfile:
+        return build(Config, json.load(openfile))
+
+current = None
+
+def get_config():
+    """
+    The current parameters, the parameter file is parsed at the first call.
+
+    Returns:
+        Config: The parameters.
+    """
+    global current
+    if current is None:
+        current = load_config()
+    return current
+
+@functools.lru_cache(maxsize=None)
+def load_data(*parts):
+    """
+    Load a json data file of the workspace once, e.g. a trajectory library or a seed. The returned
+    object is shared, it must not be modified.
+
+    Args:
+        *parts (str): Path relative to the src folder, e.g. ('trajectories.json',).
+
+    Returns:
+        object: The parsed json.
+    """
+    with open(data_file(*parts), 'r') as file:
+        return json.load(file)
@@ -0,0 +1,125 @@
+"""
+Per-robot time budget shared by the controllers (DWA, LBP, MPC, C3BF, CBF).
+
+A controller calls start(i) before computing the input of robot i, polls expired() while it
+improves its best-so-far solution and calls stop(i) once the input is chosen. stop counts a
+deadline miss when the budget was exhausted, so latency objectives can be monitored through
+the misses of each robot.
+"""
+import time
+
+import numpy as np
+
+class DeadlineExpired(Exception):
+    """
+    Raised inside an optimizer to interrupt it when the budget is exhausted.
+    """
+
+class Deadline:
+    """
+    Time budget of a controller for each robot.
+
+    Attributes:
+        budget (float): Time budget for the computation of the input of one robot [s], 0 disables the deadline.
+        calls (list): Number of computations of each robot.
+        misses (list): Number of computations of each robot that exhausted the budget.
+        hit (bool): Whether the budget of the current computation has been exhausted.
+    """
+
+    def __init__(self, budget, robot_num):
+        self.budget = budget
+        self.calls = [0]*robot_num
+        self.misses = [0]*robot_num
+        self.hit = False
+        self.t_end = np.inf
+
+    def start(self, i):
+        """
+        Start the budget of robot i.
+
+        Args:
+            i (int): Index of the robot.
+        """
+        self.calls[i] += 1
+        self.hit = False
+        self.t_end = time.perf_counter() + self.budget if self.budget > 0 else np.inf
+
+    def expired(self):
+        """
+        Check whether the budget of the current computation is exhausted.
+
+        Returns:
+            bool: True if the budget is exhausted.
+        """
+        if not self.hit and time.perf_counter() >= self.t_end:
+            self.hit = True
+        return self.hit
+
+    def remaining(self):
+        """
+        Time left in the budget of the current computation.
+
+        Returns:
+            float: Remaining time [s], inf if the deadline is disabled.
+        """
+        return max(0.0, self.t_end - time.perf_counter())
+
+    def stop(self, i):
+        """
+        Stop the budget of robot i and count a miss if it was exhausted.
+
+        Args:
+            i (int): Index of the robot.
+
+        Returns:
+            bool: True if the deadline was missed.
+        """
+        missed = self.expired()
+        if missed:
+            self.misses[i] += 1
+        self.t_end = np.inf
+        return missed
+
+    def record(self, i, missed):
+        """
+        Record a computation of robot i timed elsewhere, e.g. in a worker process.
+
+        Args:
+            i (int): Index of the robot.
+            missed (bool): Whether the deadline was missed.
+        """
+        self.calls[i] += 1
+        if missed:
+            self.misses[i] += 1
+
+    def miss_rate(self):
+        """
+        Fraction of computations that missed the deadline, over all the robots.
+
+        Returns:
+            float: The miss rate.
+        """
+        calls = sum(self.calls)
+        return sum(self.misses) / calls if calls > 0 else 0.0
+
+def braking_input(v, min_acc, max_acc, dt):
+    """
+    Safe fallback input: brake towards standstill with straight wheels.
+
+    The deceleration is the min acceleration (max if going backwards), reduced so that the speed
+    does not cross zero within one time step. A robot at standstill gets zero throttle.
+
+    Args:
+        v (float): Current speed of the robot [m/s].
+        min_acc (float): Minimum acceleration of the controller [m/ss].
+        max_acc (float): Maximum acceleration of the controller [m/ss].
+        dt (float): Time step over which the input is applied [s].
+
+    Returns:
+        list: The control input [throttle, delta].
+    """
+    if v > 0:
+        return [max(min_acc, -v/dt), 0.0]
+    if v < 0:
+        return [min(max_acc, -v/dt), 0.0]
+    return [0.0, 0.0]
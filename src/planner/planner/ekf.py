@@ -0,0 +1,127 @@
+"""
+Extended Kalman filter of the whole fleet.
+
+The batched counterpart of the single robot sample in kalman_filter.py: the states of the N robots
+are a (4, N) array and their covariances a stacked (N, 4, 4) array, the prediction uses the
+kinematic model of the simulations (utils.motion_batch) with its Jacobians built for all the robots
+at once, and the full state [x, y, yaw, v] is measured (H = I), so the update solves N 4x4 systems
+in one batched call:
+
+    ekf = FleetEKF(x0, R=measurement_covariance(noise_scale))
+    x_est = ekf.step(z, u, dt)
+"""
+import numpy as np
+
+import planner.utils as utils
+from planner.noise import noise_std
+
+# process noise of one step on [x, y, yaw, v], [m, m, rad, m/s]
+process_std = np.array([0.05, 0.05, np.radians(1.0), 0.1])
+# lower bound of the measurement variances, keeps the update well conditioned without noise
+min_variance = 1e-6
+
+def measurement_covariance(scale):
+    """
+    Covariance of the measurements of the sensor.
+
+    Args:
+        scale (float): Scaling of the noise, see planner.noise.
+
+    Returns:
+        numpy.ndarray: The (4, 4) covariance.
+    """
+    return np.diag(np.maximum((noise_std * scale)**2, min_variance))
+
+def motion_jacobian(x, u, dt):
+    """
+    Jacobians of utils.motion_batch with respect to the state, the clipping of the speed is ignored.
+
+    Args:
+        x (numpy.ndarray): States [x, y, yaw, v], (4, N).
+        u (numpy.ndarray): Inputs [throttle, delta], (2, N).
+        dt (float or numpy.ndarray): Time step, or one per robot.
+
+    Returns:
+        numpy.ndarray: The (N, 4, 4) Jacobians.
+    """
+    yaw, v = x[2], x[3]
+    delta = np.clip(u[1], -utils.max_steer, utils.max_steer)
+    dt = np.broadcast_to(dt, v.shape)
+    jF = np.zeros((x.shape[1], 4, 4))
+    jF[:, [0, 1, 2, 3], [0, 1, 2, 3]] = 1.0
+    jF[:, 0, 2] = -v * np.sin(yaw) * dt
+    jF[:, 0, 3] = np.cos(yaw) * dt
+    jF[:, 1, 2] = v * np.cos(yaw) * dt
+    jF[:, 1, 3] = np.sin(yaw) * dt
+    jF[:, 2, 3] = np.sin(np.arctan2(utils.Lr/utils.L * np.tan(delta), 1)) / utils.Lr * dt
+    return jF
+
+class FleetEKF:
+    """
+    Extended Kalman filter of the states of all the robots.
+
+    Attributes:
+        x (numpy.ndarray): The estimated states [x, y, yaw, v], (4, N).
+        P (numpy.ndarray): The covariances of the estimates, (N, 4, 4).
+        Q (numpy.ndarray): The process covariance of one step, (4, 4).
+        R (numpy.ndarray): The measurement covariance, (4, 4).
+    """
+
+    def __init__(self, x0, P0=None, Q=None, R=None):
+        """
+        Args:
+            x0 (numpy.ndarray): Initial states [x, y, yaw, v], (4, N).
+            P0 (numpy.ndarray, optional): Initial covariance, (4, 4) or (N, 4, 4). Defaults to R.
+            Q (numpy.ndarray, optional): Process covariance of one step. Defaults to diag(process_std**2).
+            R (numpy.ndarray, optional): Measurement covariance. Defaults to the one of the noise scale 1.
+        """
+        self.x = np.array(x0, dtype=float)[:4]
+        self.Q = np.diag(process_std**2) if Q is None else np.asarray(Q, dtype=float)
+        self.R = measurement_covariance(1.0) if R is None else np.asarray(R, dtype=float)
+        P0 = self.R if P0 is None else np.asarray(P0, dtype=float)
+        self.P = np.array(np.broadcast_to(P0, (self.x.shape[1], 4, 4)))
+
+    def predict(self, u, dt):
+        """
+        Propagate the estimates with the motion model.
+
+        Args:
+            u (numpy.ndarray): Inputs [throttle, delta], (2, N).
+            dt (float or numpy.ndarray): Time step, or one per robot.
+        """
+        jF = motion_jacobian(self.x, u, dt)
+        self.x = utils.motion_batch(self.x, u, dt)
+        self.P = jF @ self.P @ jF.transpose(0, 2, 1) + self.Q
+
+    def update(self, z):
+        """
+        Correct the estimates with a measurement of the full state.
+
+        Args:
+            z (numpy.ndarray): The measured states [x, y, yaw, v], (4, N).
+        """
+        y = np.asarray(z, dtype=float)[:4] - self.x
+        y[2] = np.remainder(y[2] + np.pi, 2.0*np.pi) - np.pi
+        S = self.P + self.R
+        # K = P S^-1, P and S are symmetric
+        K = np.linalg.solve(S, self.P).transpose(0, 2, 1)
+        self.x += np.einsum('nij,jn->in', K, y)
+        self.x[2] = np.remainder(self.x[2] + np.pi, 2.0*np.pi) - np.pi
+        self.P = self.P - K @ self.P
+        self.P = 0.5 * (self.P + self.P.transpose(0, 2, 1))
+
+    def step(self, z, u, dt):
+        """
+        Predict with the inputs applied over the last step, then update with the new measurement.
+
+        Args:
+            z (numpy.ndarray): The measured states [x, y, yaw, v], (4, N).
+            u (numpy.ndarray): Inputs [throttle, delta] applied over the step, (2, N).
+            dt (float or numpy.ndarray): Time step, or one per robot.
+
+        Returns:
+            numpy.ndarray: The estimated states, (4, N).
+        """
+        self.predict(u, dt)
+        self.update(z)
+        return self.x
@@ -0,0 +1,57 @@
+"""
+Deferred imports of the heavy and optional dependencies.
+
+The compute cores of the controllers (motion models, cost kernels, solvers) must import fast and
+without a display, a sourced ROS environment or the data files, so that a worker of a parallel
+sweep starts in a fraction of a second. The plotting (matplotlib, shapely.plotting), the ROS
+messages (custom_message.msg) and the solvers only some controllers use (cvxopt, scipy.optimize)
+are bound to lazy modules instead:
+
+    plt = lazy_import('matplotlib.pyplot')
+    msg = lazy_import('custom_message.msg')
+
+The module is imported at the first access to one of its attributes, e.g. plt.plot(...) or
+msg.Coordinate(...), so a missing dependency only fails the code that actually uses it.
+"""
+import importlib
+
+class LazyModule:
+    """
+    Proxy of a module, imported at the first access to one of its attributes.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'imported' if self.__dict__['_module'] is not None else 'not imported'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+def lazy_import(name):
+    """
+    Bind a module without importing it.
+
+    Args:
+        name (str): The module, e.g. 'matplotlib.pyplot'.
+
+    Returns:
+        LazyModule: The proxy of the module.
+    """
+    return LazyModule(name)
@@ -0,0 +1,214 @@
+"""
+Conversion between the packed messages of the fleet and NumPy arrays.
+
+custom_message/PackedState and PackedControl carry one float64[] array per field (x, y, yaw, v,
+omega, delta, throttle and throttle, delta) instead of one struct per robot, so a publish builds a
+handful of Python objects whatever the number of robots. rclpy stores a float64[] field as an
+array.array('d'), which shares its buffer with NumPy:
+
+    state = unpack_state(message)                  # (7, N) array
+    x = field_array(message.x)                     # (N,) read-only view, no copy
+    publisher.publish(pack_state(state, inputs))   # one memcpy per field
+
+The legacy MultiState/MultiControl messages are converted with to_multi_state/from_multi_state and
+to_multi_control/from_multi_control for the nodes that still work robot by robot, whose callbacks
+are wrapped with accept_packed.
+"""
+from array import array
+
+import numpy as np
+
+from planner.lazy import lazy_import
+
+msg = lazy_import('custom_message.msg')
+
+state_fields = ('x', 'y', 'yaw', 'v', 'omega', 'delta', 'throttle')
+
+def field_array(field):
+    """
+    View of a float64[] field as a NumPy array.
+
+    Args:
+        field (array.array or sequence): The field.
+
+    Returns:
+        numpy.ndarray: The values. If the field is an array.array('d') it is a read-only view without copy,
+            which aliases the message: copy it to modify the values.
+    """
+    if isinstance(field, array) and field.typecode == 'd':
+        if not len(field):
+            return np.empty(0)
+        view = np.frombuffer(field, dtype=np.float64)
+        view.flags.writeable = False
+        return view
+    return np.asarray(field, dtype=np.float64)
+
+def to_field(values):
+    """
+    Convert values to a float64[] field.
+
+    Args:
+        values (numpy.ndarray): The (N,) values.
+
+    Returns:
+        array.array: The field, filled with a single copy of the buffer.
+    """
+    field = array('d')
+    field.frombytes(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return field
+
+def pack_state(state, inputs=None, header=None, dt=0.0):
+    """
+    Build a PackedState.
+
+    Args:
+        state (numpy.ndarray): States [x, y, yaw, v, omega], (5, N), or [x, y, yaw, v, omega, delta, throttle], (7, N).
+        inputs (numpy.ndarray, optional): Inputs [throttle, delta], (2, N), for a (5, N) state. Defaults to zeros.
+        header (std_msgs.msg.Header, optional): The header. Defaults to None.
+        dt (float, optional): Time step [s] the plant applied to reach the states. Defaults to 0.0.
+
+    Returns:
+        PackedState: The message.
+    """
+    state = np.asarray(state, dtype=np.float64)
+    message = msg.PackedState()
+    if header is not None:
+        message.header = header
+    message.dt = float(dt)
+    for name, row in zip(state_fields, state):
+        setattr(message, name, to_field(row))
+    if state.shape[0] == 5:
+        inputs = np.zeros((2, state.shape[1])) if inputs is None else np.asarray(inputs, dtype=np.float64)
+        message.throttle = to_field(inputs[0])
+        message.delta = to_field(inputs[1])
+    return message
+
+def unpack_state(message):
+    """
+    The states of a PackedState, or of a MultiState.
+
+    Args:
+        message (PackedState or MultiState): The message.
+
+    Returns:
+        numpy.ndarray: States [x, y, yaw, v, omega, delta, throttle], (7, N).
+    """
+    if hasattr(message, 'multiple_state'):
+        return np.array([[getattr(s, name) for name in state_fields] for s in message.multiple_state]).reshape(-1, 7).T
+    return np.stack([field_array(getattr(message, name)) for name in state_fields])
+
+def pack_control(inputs, header=None):
+    """
+    Build a PackedControl.
+
+    Args:
+        inputs (numpy.ndarray): Inputs [throttle, delta], (2, N).
+        header (std_msgs.msg.Header, optional): The header. Defaults to None.
+
+    Returns:
+        PackedControl: The message.
+    """
+    message = msg.PackedControl()
+    if header is not None:
+        message.header = header
+    message.throttle = to_field(inputs[0])
+    message.delta = to_field(inputs[1])
+    return message
+
+def unpack_control(message):
+    """
+    The inputs of a PackedControl.
+
+    Args:
+        message (PackedControl): The message.
+
+    Returns:
+        numpy.ndarray: Inputs [throttle, delta], (2, N).
+    """
+    return np.stack([field_array(message.throttle), field_array(message.delta)])
+
+def multi_state(state, header=None, dt=0.0):
+    """
+    Build a MultiState.
+
+    Args:
+        state (numpy.ndarray): States [x, y, yaw, v, omega, delta, throttle], (7, N).
+        header (std_msgs.msg.Header, optional): The header. Defaults to None.
+        dt (float, optional): Time step [s] the plant applied to reach the states. Defaults to 0.0.
+
+    Returns:
+        MultiState: The message, one FullState per robot.
+    """
+    states = [msg.FullState(**dict(zip(state_fields, values))) for values in np.asarray(state, dtype=float).T.tolist()]
+    if header is None:
+        return msg.MultiState(multiple_state=states, dt=float(dt))
+    return msg.MultiState(header=header, multiple_state=states, dt=float(dt))
+
+def to_multi_state(message):
+    """
+    Convert a PackedState to a MultiState.
+
+    Args:
+        message (PackedState): The message.
+
+    Returns:
+        MultiState: The message, one FullState per robot.
+    """
+    return multi_state(unpack_state(message), message.header, message.dt)
+
+def from_multi_state(message, header=None):
+    """
+    Convert a MultiState to a PackedState.
+
+    Args:
+        message (MultiState): The message.
+        header (std_msgs.msg.Header, optional): The header. Defaults to the one of the message.
+
+    Returns:
+        PackedState: The message.
+    """
+    return pack_state(unpack_state(message), header=header if header is not None else message.header, dt=message.dt)
+
+def to_multi_control(message):
+    """
+    Convert a PackedControl to a MultiControl.
+
+    Args:
+        message (PackedControl): The message.
+
+    Returns:
+        MultiControl: The message, one ControlInputs per robot.
+    """
+    inputs = unpack_control(message).T.tolist()
+    return msg.MultiControl(header=message.header, multi_control=[msg.ControlInputs(throttle=throttle, delta=delta) for throttle, delta in inputs])
+
+def from_multi_control(message, header=None):
+    """
+    Convert a MultiControl to a PackedControl.
+
+    Args:
+        message (MultiControl): The message.
+        header (std_msgs.msg.Header, optional): The header. Defaults to the one of the message.
+
+    Returns:
+        PackedControl: The message.
+    """
+    inputs = np.array([[cmd.throttle, cmd.delta] for cmd in message.multi_control]).reshape(-1, 2)
+    return pack_control(inputs.T, header=header if header is not None else message.header)
+
+def accept_packed(callback):
+    """
+    Wrap a callback taking a MultiState (and possibly other messages) so that it also accepts a
+    PackedState, converted first.
+
+    Args:
+        callback (callable): The callback.
+
+    Returns:
+        callable: The wrapped callback.
+    """
+    def wrapper(message, *args):
+        if isinstance(message, msg.PackedState):
+            message = to_multi_state(message)
+        return callback(message, *args)
+    return wrapper
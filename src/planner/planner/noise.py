@@ -0,0 +1,72 @@
+"""
+Reproducible measurement noise for the controllers.
+
+Each robot has its own np.random.Generator spawned from one SeedSequence, so the noise of a robot
+does not depend on the order in which the robots are controlled nor on the other jobs running in
+the same process. The noise is drawn in vectorized blocks of many ticks and consumed one tick at a
+time, for one robot (sample) or for the whole fleet at once (sample_all), with the same values.
+"""
+import numpy as np
+
+# standard deviation of the noise on [x, y, yaw, v] before scaling, [m, m, rad, m/s]
+noise_std = np.array([0.21, 0.21, np.radians(5), 0.2])
+
+class StateNoise:
+    """
+    Gaussian noise on the measured state of each robot.
+
+    Attributes:
+        robot_num (int): Number of robots.
+        scale (float): Scaling of the standard deviations (noise_scale_param).
+        block (int): Number of ticks drawn at once for each robot.
+        generators (list): Generator of each robot.
+        blocks (numpy.ndarray): Pre-drawn noise, (robot_num, block, 4).
+        index (numpy.ndarray): Next unused tick of the block of each robot.
+    """
+
+    def __init__(self, robot_num, scale, seed=None, block=256):
+        """
+        Args:
+            robot_num (int): Number of robots.
+            scale (float): Scaling of the standard deviations.
+            seed (int or numpy.random.SeedSequence, optional): Seed of the job, None for fresh entropy. Defaults to None.
+            block (int, optional): Number of ticks drawn at once. Defaults to 256.
+        """
+        self.robot_num = robot_num
+        self.scale = scale
+        self.block = block
+        sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.generators = [np.random.default_rng(child) for child in sequence.spawn(robot_num)]
+        self.blocks = np.empty((robot_num, block, noise_std.shape[0]))
+        self.index = np.full(robot_num, block)
+
+    def sample(self, i):
+        """
+        Noise of the next tick of robot i.
+
+        Args:
+            i (int): Index of the robot.
+
+        Returns:
+            numpy.ndarray: The noise on [x, y, yaw, v].
+        """
+        if self.index[i] == self.block:
+            self.blocks[i] = self.generators[i].standard_normal((self.block, noise_std.shape[0])) * (noise_std * self.scale)
+            self.index[i] = 0
+        noise = self.blocks[i, self.index[i]].copy()
+        self.index[i] += 1
+        return noise
+
+    def sample_all(self):
+        """
+        Noise of the next tick of every robot, the same values as sample(i) for each i.
+
+        Returns:
+            numpy.ndarray: The noise on [x, y, yaw, v], (robot_num, 4).
+        """
+        for i in np.flatnonzero(self.index == self.block):
+            self.blocks[i] = self.generators[i].standard_normal((self.block, noise_std.shape[0])) * (noise_std * self.scale)
+            self.index[i] = 0
+        noise = self.blocks[np.arange(self.robot_num), self.index]
+        self.index += 1
+        return noise
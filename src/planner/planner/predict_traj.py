@@ -12,32 +12,27 @@ import matplotlib.pyplot as plt
 from rclpy.node import Node
 
 # For the parameter file
-import pathlib
-import json
-
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-max_steer = json_object["Car_model"]["max_steer"] # [rad] max steering angle
-max_speed = json_object["Car_model"]["max_speed"] # [m/s]
-min_speed = json_object["Car_model"]["min_speed"] # [m/s]
-dt = json_object["Controller"]["dt"]  # [s] Time step
-L = json_object["Car_model"]["L"]  # [m] Wheel base of vehicle
+from planner.config import get_config
+
+params = get_config()
+
+max_steer = params.Car_model.max_steer # [rad] max steering angle
+max_speed = params.Car_model.max_speed # [m/s]
+min_speed = params.Car_model.min_speed # [m/s]
+dt = params.Controller.dt  # [s] Time step
+L = params.Car_model.L  # [m] Wheel base of vehicle
 Lr = L / 2.0  # [m]
 Lf = L - Lr
-Cf = json_object["Car_model"]["Cf"]  # N/rad
-Cr = json_object["Car_model"]["Cr"] # N/rad
-Iz = json_object["Car_model"]["Iz"]  # kg/m2
-m = json_object["Car_model"]["m"]  # kg
+Cf = params.Car_model.Cf  # N/rad
+Cr = params.Car_model.Cr # N/rad
+Iz = params.Car_model.Iz  # kg/m2
+m = params.Car_model.m  # kg
 # Aerodynamic and friction coefficients
-c_a = json_object["Car_model"]["c_a"]
-c_r1 = json_object["Car_model"]["c_r1"]
+c_a = params.Car_model.c_a
+c_r1 = params.Car_model.c_r1
 
-WB = json_object["Controller"]["WB"] 
-L_d = json_object["Controller"]["L_d"] 
+WB = params.Controller.WB 
+L_d = params.Controller.L_d 
 
 debug = False
 
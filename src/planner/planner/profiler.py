@@ -0,0 +1,178 @@
+"""
+Lightweight per-phase profiler of the controllers and of the simulation loops.
+
+The hot paths are split in named phases with spans:
+
+    with profiler.span("DWA.rollout"):
+        ...
+
+When the profiler is disabled (the default) span returns a shared no-op context manager, so the
+instrumentation costs one function call. When enabled, the duration of every span is measured with
+time.perf_counter_ns and aggregated per phase, and with trace=True every span is also kept as a
+Chrome trace event, which can be exported and opened in chrome://tracing or Perfetto.
+
+The spans can be nested, the time of a phase includes the time of the phases nested in it.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+enabled = False
+trace = False
+
+class NullSpan:
+    """
+    No-op span returned when the profiler is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+null_span = NullSpan()
+
+class Span:
+    """
+    Span of a phase, records its duration on exit.
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        profiler.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+class Profiler:
+    """
+    Aggregates the durations of the spans of each phase over a run.
+
+    Attributes:
+        samples (dict): Durations [ns] of the spans of each phase in the current run.
+        events (list): Chrome trace events of all the runs, only filled when tracing.
+        runs (list): Names of the runs, the index of a run is the tid of its events.
+        t0 (int): Origin of the timestamps of the trace [ns].
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.events = []
+        self.runs = []
+        self.t0 = time.perf_counter_ns()
+
+    def record(self, name, start, end):
+        """
+        Record a span.
+
+        Args:
+            name (str): Name of the phase.
+            start (int): Start of the span [ns], from time.perf_counter_ns.
+            end (int): End of the span [ns].
+        """
+        self.samples.setdefault(name, []).append(end - start)
+        if trace:
+            self.events.append({"name": name, "ph": "X", "ts": (start - self.t0)*1e-3, "dur": (end - start)*1e-3,
+                                "pid": os.getpid(), "tid": len(self.runs) if self.runs else threading.get_ident()})
+
+    def new_run(self, name):
+        """
+        Start a new run: the aggregated durations are reset, the trace events are kept and the events
+        of the new run are shown on their own row of the trace.
+
+        Args:
+            name (str): Name of the run, e.g. "DWA 4 robots".
+        """
+        self.samples = {}
+        self.runs.append(name)
+
+    def reset(self):
+        """
+        Forget all the recorded spans, runs and events.
+        """
+        self.samples = {}
+        self.events = []
+        self.runs = []
+        self.t0 = time.perf_counter_ns()
+
+    def summary(self):
+        """
+        Statistics of each phase of the current run. The histogram counts the spans by power of two
+        of their duration: bucket k holds the durations in [2**k, 2**(k+1)) ns.
+
+        Returns:
+            dict: Count, total, mean, percentiles and histogram [ns] of each phase.
+        """
+        summary = {}
+        for name, samples in self.samples.items():
+            durations = np.asarray(samples, dtype=np.int64)
+            p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+            buckets = np.bincount(np.log2(np.maximum(durations, 1)).astype(int))
+            summary[name] = {
+                "count": int(durations.shape[0]),
+                "total_ns": int(durations.sum()),
+                "mean_ns": int(durations.mean()),
+                "p50_ns": int(p50),
+                "p95_ns": int(p95),
+                "p99_ns": int(p99),
+                "histogram_log2_ns": {str(k): int(c) for k, c in enumerate(buckets) if c > 0},
+            }
+        return summary
+
+    def export_chrome_trace(self, file):
+        """
+        Write the recorded events in the Chrome trace event format.
+
+        Args:
+            file (str): The json file.
+        """
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                    for tid, name in enumerate(self.runs, start=1)]
+        with open(file, 'w') as f:
+            json.dump({"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}, f)
+
+profiler = Profiler()
+
+def span(name):
+    """
+    Span of a phase, to be used as a context manager.
+
+    Args:
+        name (str): Name of the phase, e.g. "MPC.solve".
+
+    Returns:
+        Span: The span, a shared no-op span if the profiler is disabled.
+    """
+    if not enabled:
+        return null_span
+    return Span(name)
+
+def enable(with_trace=False):
+    """
+    Enable the profiler.
+
+    Args:
+        with_trace (bool, optional): Also keep the Chrome trace events. Defaults to False.
+    """
+    global enabled, trace
+    enabled = True
+    trace = with_trace
+
+def disable():
+    """
+    Disable the profiler, the recorded spans are kept.
+    """
+    global enabled, trace
+    enabled = False
+    trace = False
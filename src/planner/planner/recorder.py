@@ -0,0 +1,124 @@
+"""
+Trajectory recorder for the simulation loops.
+
+The simulations used to grow the trajectory with np.dstack at every step, which copies the whole
+history each time. TrajectoryRecorder writes every step in place in a preallocated buffer that grows
+geometrically, optionally spilling to a memory-mapped file for long runs, and returns the usual
+(rows, robot_num, T) layout expected by DataProcessor.
+"""
+import numpy as np
+
+class TrajectoryRecorder:
+    """
+    Records the state (and input) of all the robots at every step.
+
+    The buffer is stored time-major, (T, rows, robot_num), so that growing it never moves the steps
+    already recorded inside a memory-mapped file. array() returns a (rows, robot_num, T) view.
+
+    Attributes:
+        rows (int): Number of values recorded for each robot, e.g. 4 for the state or 6 for state and input.
+        robot_num (int): Number of robots.
+        length (int): Number of recorded steps.
+        capacity (int): Number of steps that fit in the buffer.
+        growth (float): Factor by which the capacity grows when the buffer is full.
+        path (str): File the buffer spills to, None to keep it in memory.
+        max_memory (int): Size [bytes] above which the buffer spills to path.
+        buffer (numpy.ndarray): The (capacity, rows, robot_num) buffer, a numpy.memmap once spilled.
+    """
+
+    def __init__(self, rows, robot_num, capacity=1024, growth=2.0, path=None, max_memory=0):
+        """
+        Args:
+            rows (int): Number of values recorded for each robot.
+            robot_num (int): Number of robots.
+            capacity (int, optional): Initial number of steps. Defaults to 1024.
+            growth (float, optional): Growth factor of the capacity. Defaults to 2.0.
+            path (str, optional): File the buffer spills to, None to keep it in memory. Defaults to None.
+            max_memory (int, optional): Size [bytes] above which the buffer spills to path, 0 spills
+                from the start. Defaults to 0.
+        """
+        self.rows = rows
+        self.robot_num = robot_num
+        self.length = 0
+        self.capacity = max(1, capacity)
+        self.growth = growth
+        self.path = path
+        self.max_memory = max_memory
+        self.buffer = None
+        self.allocate(self.capacity)
+
+    def spilled(self):
+        """
+        Check whether the buffer lives in the memory-mapped file.
+
+        Returns:
+            bool: True if the buffer is a numpy.memmap.
+        """
+        return isinstance(self.buffer, np.memmap)
+
+    def allocate(self, capacity):
+        """
+        Allocate a buffer of the given capacity and move the recorded steps into it.
+
+        Args:
+            capacity (int): The new number of steps.
+        """
+        shape = (capacity, self.rows, self.robot_num)
+        size = np.dtype(float).itemsize * capacity * self.rows * self.robot_num
+
+        if self.path is not None and (self.spilled() or size > self.max_memory):
+            if self.spilled():
+                # extend the file in place, the recorded steps stay where they are
+                self.buffer.flush()
+                del self.buffer
+                with open(self.path, 'r+b') as file:
+                    file.truncate(size)
+                self.buffer = np.memmap(self.path, dtype=float, mode='r+', shape=shape)
+                self.capacity = capacity
+                return
+            buffer = np.memmap(self.path, dtype=float, mode='w+', shape=shape)
+        else:
+            buffer = np.empty(shape)
+
+        if self.buffer is not None:
+            buffer[:self.length] = self.buffer[:self.length]
+        self.buffer = buffer
+        self.capacity = capacity
+
+    def append(self, *values):
+        """
+        Record one step. The values are stacked along the rows, e.g. append(x, u) records
+        np.concatenate((x, u)) without allocating it.
+
+        Args:
+            *values (numpy.ndarray): Arrays of shape (k, robot_num) whose k sum up to rows.
+        """
+        if self.length == self.capacity:
+            self.allocate(max(self.capacity + 1, int(self.capacity * self.growth)))
+
+        step = self.buffer[self.length]
+        row = 0
+        for value in values:
+            value = np.asarray(value)
+            step[row:row + value.shape[0]] = value
+            row += value.shape[0]
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def array(self):
+        """
+        The recorded trajectory.
+
+        Returns:
+            numpy.ndarray: View of shape (rows, robot_num, length), same layout as the np.dstack version.
+        """
+        return self.buffer[:self.length].transpose(1, 2, 0)
+
+    def flush(self):
+        """
+        Write the recorded steps to the memory-mapped file, if the buffer was spilled.
+        """
+        if self.spilled():
+            self.buffer.flush()
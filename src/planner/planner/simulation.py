@@ -0,0 +1,287 @@
+"""
+Fixed-step simulation engine of the bumper cars, without ROS.
+
+The engine holds the state of the whole fleet in arrays and advances it with the batched models of
+planner.utils (motion_batch for the 'linear' model, dynamic_motion_batch for the 'nonlinear' one)
+on a simulated clock, so a scenario runs as fast as the CPU allows instead of at the rate of the
+wall-clock timers of the ROS nodes. At every step the sensor measures the state (with the noise of
+planner.noise), the controller plug-in maps the measurement to the inputs and the model advances
+the state by dt:
+
+    sim = Simulation(x0, controller=PurePursuit(paths))
+    trajectory = sim.run(1000)
+
+A controller plug-in is any callable controller(t, x) -> u taking the simulated time [s] and the
+measured (4, N) state and returning the (2, N) inputs [throttle, delta]. The ROS nodes wrap the
+same engine: the car model node feeds it the received inputs and publishes its state (and /clock),
+the sensor node measures through Sensor.
+"""
+import numpy as np
+
+import planner.utils as utils
+from planner.config import get_config
+from planner.noise import StateNoise
+from planner.recorder import TrajectoryRecorder
+
+L_d = get_config().Controller.L_d  # [m] look-ahead distance
+
+class SimClock:
+    """
+    Simulated time, kept in integer nanoseconds so that many steps do not drift.
+
+    Attributes:
+        time_ns (int): The current time [ns].
+        steps (int): Number of steps since the start.
+    """
+
+    def __init__(self, t0=0.0):
+        """
+        Args:
+            t0 (float, optional): Initial time [s]. Defaults to 0.0.
+        """
+        self.time_ns = int(round(t0*1e9))
+        self.steps = 0
+
+    def now(self):
+        """
+        Returns:
+            float: The current time [s].
+        """
+        return self.time_ns*1e-9
+
+    def advance(self, dt):
+        """
+        Advance the clock by one step.
+
+        Args:
+            dt (float): Length of the step [s].
+        """
+        self.time_ns += int(round(dt*1e9))
+        self.steps += 1
+
+    def stamp(self):
+        """
+        Returns:
+            tuple: The current time as (sec, nanosec), the fields of a ROS time stamp.
+        """
+        return divmod(self.time_ns, 10**9)
+
+class Sensor:
+    """
+    Measurement of the state of the robots, with the reproducible noise of planner.noise.
+
+    Attributes:
+        noise (StateNoise): The noise of each robot, None for exact measurements.
+    """
+
+    def __init__(self, robot_num, noise_scale=0.0, seed=None):
+        """
+        Args:
+            robot_num (int): Number of robots.
+            noise_scale (float, optional): Scaling of the noise, 0 for exact measurements. Defaults to 0.0.
+            seed (int, optional): Seed of the noise. Defaults to None.
+        """
+        self.noise = StateNoise(robot_num, noise_scale, seed) if noise_scale else None
+
+    def measure(self, state):
+        """
+        Measure the state of all the robots.
+
+        Args:
+            state (numpy.ndarray): The true states [x, y, yaw, v, ...], (4 or more, N).
+
+        Returns:
+            numpy.ndarray: The measured states [x, y, yaw, v], (4, N).
+        """
+        measured = np.array(state[:4], dtype=float)
+        if self.noise is not None:
+            measured += self.noise.sample_all().T
+        return measured
+
+class PurePursuit:
+    """
+    Controller plug-in: pure pursuit towards the waypoints of each robot, vectorized over the
+    fleet, as utils.pure_pursuit_steer_control.
+
+    Attributes:
+        paths (list): The remaining (x, y) waypoints of each robot.
+        lookahead (float): Distance [m] at which a waypoint counts as reached.
+    """
+
+    def __init__(self, paths, lookahead=L_d):
+        """
+        Args:
+            paths (list): The (x, y) waypoints of each robot.
+            lookahead (float, optional): Distance [m] at which a waypoint counts as reached. Defaults to L_d.
+        """
+        self.paths = [[tuple(point) for point in path] for path in paths]
+        self.lookahead = lookahead
+
+    def targets(self, x):
+        """
+        Current waypoint of each robot, the reached waypoints are dropped (the last one is kept).
+
+        Args:
+            x (numpy.ndarray): The measured states, (4, N).
+
+        Returns:
+            numpy.ndarray: The targets, (2, N).
+        """
+        for i, path in enumerate(self.paths):
+            while len(path) > 1 and np.hypot(path[0][0] - x[0, i], path[0][1] - x[1, i]) < self.lookahead:
+                path.pop(0)
+        return np.array([path[0] for path in self.paths]).T
+
+    def __call__(self, t, x):
+        target = self.targets(x)
+        alpha = np.arctan2(target[1] - x[1], target[0] - x[0]) - x[2]
+        alpha = np.remainder(alpha + np.pi, 2.0*np.pi) - np.pi
+        delta = np.arctan2(2.0*utils.WB*np.sin(alpha), utils.Lf)
+        # the waypoints behind the car are reached with full steering
+        delta = np.where(alpha > np.pi/2.0, utils.max_steer, np.where(alpha < -np.pi/2.0, -utils.max_steer, delta))
+        desired_speed = np.where(np.abs(delta) > np.radians(10), 2.0, utils.max_speed)
+        delta = np.clip(delta, -utils.max_steer, utils.max_steer)
+        return np.stack((3*(desired_speed - x[3]), delta))
+
+class AlgorithmController:
+    """
+    Controller plug-in wrapping the controllers of the seed simulations, whose run method takes
+    and returns (x, u, break_flag), e.g. DWA_algorithm.run_dwa or LBP_algorithm.run_lbp. The state
+    they predict is discarded, the engine advances the state with its own model.
+
+    Attributes:
+        run (callable): The run method.
+        u (numpy.ndarray): The last inputs, (2, N).
+        done (bool): The break flag returned by the controller.
+    """
+
+    def __init__(self, run, robot_num):
+        """
+        Args:
+            run (callable): The run method.
+            robot_num (int): Number of robots.
+        """
+        self.run = run
+        self.u = np.zeros((2, robot_num))
+        self.done = False
+
+    def __call__(self, t, x):
+        _, self.u, self.done = self.run(x.copy(), self.u, False)
+        return self.u
+
+class Simulation:
+    """
+    The fleet, its model, sensor and controller, and the simulated clock.
+
+    Attributes:
+        state (numpy.ndarray): States [x, y, yaw, v, omega], (5, N).
+        inputs (numpy.ndarray): Inputs [throttle, delta] applied at the next step, (2, N).
+        dynamic (numpy.ndarray): States [x, y, yaw, vx, vy, omega] of the nonlinear model, (6, N).
+        dt (float): Length of a step [s].
+        model (str): 'linear' (kinematic) or 'nonlinear' (dynamic).
+        integrator (str): Integrator of the nonlinear model, see utils.dynamic_motion_batch.
+        substeps (int): Integration steps of the nonlinear model in a step.
+        steer_limit (float): Steering limit [rad] of the nonlinear model, None for the default one.
+        max_speed_limit (float): Speed limit [m/s] of the nonlinear model, None for the default one.
+        controller (callable): The controller plug-in, None to set the inputs from outside.
+        sensor (Sensor): The sensor.
+        clock (SimClock): The simulated clock.
+    """
+
+    def __init__(self, x0, dt=utils.dt, model='linear', integrator='semi-implicit', substeps=1, steer_limit=None,
+                 max_speed_limit=None, controller=None, sensor=None, clock=None):
+        """
+        Args:
+            x0 (numpy.ndarray): Initial states [x, y, yaw, v] or [x, y, yaw, v, omega], (4 or 5, N).
+            dt (float, optional): Length of a step [s]. Defaults to the dt of the parameter file.
+            model (str, optional): 'linear' or 'nonlinear'. Defaults to 'linear'.
+            integrator (str, optional): Integrator of the nonlinear model. Defaults to 'semi-implicit'.
+            substeps (int, optional): Integration steps of the nonlinear model in a step. Defaults to 1.
+            steer_limit (float, optional): Steering limit [rad] of the nonlinear model. Defaults to None.
+            max_speed_limit (float, optional): Speed limit [m/s] of the nonlinear model. Defaults to None.
+            controller (callable, optional): The controller plug-in. Defaults to None.
+            sensor (Sensor, optional): The sensor. Defaults to exact measurements.
+            clock (SimClock, optional): The clock. Defaults to a clock starting at 0.
+        """
+        x0 = np.asarray(x0, dtype=float)
+        self.robot_num = x0.shape[1]
+        self.state = np.zeros((5, self.robot_num))
+        self.state[:x0.shape[0]] = x0
+        self.inputs = np.zeros((2, self.robot_num))
+        self.dt = dt
+        if model not in ('linear', 'nonlinear'):
+            raise ValueError(f"Unknown model {model}")
+        self.model = model
+        self.integrator = integrator
+        self.substeps = substeps
+        self.steer_limit = steer_limit
+        self.max_speed_limit = max_speed_limit
+        self.dynamic = utils.dynamic_state(self.state, np.zeros(self.robot_num)) if model == 'nonlinear' else None
+        self.controller = controller
+        self.sensor = sensor if sensor is not None else Sensor(self.robot_num)
+        self.clock = clock if clock is not None else SimClock()
+
+    def set_inputs(self, u):
+        """
+        Set the inputs applied from the next step on, e.g. the ones received by the ROS node.
+
+        Args:
+            u (numpy.ndarray): Inputs [throttle, delta], (2, N).
+        """
+        self.inputs = np.array(u, dtype=float).reshape(2, self.robot_num)
+
+    def measure(self):
+        """
+        Returns:
+            numpy.ndarray: The measured states [x, y, yaw, v], (4, N).
+        """
+        return self.sensor.measure(self.state)
+
+    def advance(self, dt=None):
+        """
+        Advance the state with the current inputs and the clock by one step.
+
+        Args:
+            dt (float or numpy.ndarray, optional): Length of the step [s], or one per robot. Defaults to self.dt.
+        """
+        dt = self.dt if dt is None else dt
+        if self.model == 'linear':
+            self.state[:4] = utils.motion_batch(self.state[:4], self.inputs, dt)
+        else:
+            self.dynamic = utils.dynamic_motion_batch(self.dynamic, self.inputs, dt, self.integrator, self.substeps,
+                                                      self.steer_limit, self.max_speed_limit)
+            max_speed = utils.max_speed if self.max_speed_limit is None else self.max_speed_limit
+            self.state[:3] = self.dynamic[:3]
+            self.state[3] = np.clip(np.hypot(self.dynamic[3], self.dynamic[4]), utils.min_speed, max_speed)
+            self.state[4] = self.dynamic[5]
+        self.clock.advance(float(np.max(dt)))
+
+    def step(self):
+        """
+        One step: measure, control and advance.
+        """
+        if self.controller is not None:
+            self.inputs = np.asarray(self.controller(self.clock.now(), self.measure()), dtype=float)
+        self.advance()
+
+    def run(self, steps, callback=None):
+        """
+        Run a number of steps.
+
+        Args:
+            steps (int): Number of steps.
+            callback (callable, optional): Called with the simulation after every step, a True return
+                stops the run. Defaults to None.
+
+        Returns:
+            numpy.ndarray: The trajectory in the layout of the seed simulations, (6, N, steps + 1)
+                with rows x, y, yaw, v, throttle and steering.
+        """
+        recorder = TrajectoryRecorder(6, self.robot_num, capacity=steps + 1)
+        recorder.append(self.state[:4], self.inputs)
+        for _ in range(steps):
+            self.step()
+            recorder.append(self.state[:4], self.inputs)
+            if callback is not None and callback(self):
+                break
+        return recorder.array()
@@ -1,56 +1,56 @@
 #!/usr/bin/env python3
 
-from custom_message.msg import ControlInputs, State, FullState, Coordinate, Path
+from __future__ import annotations
+
 import numpy as np
 # from planner.cubic_spline_planner import *
 # from planner.frenet import *
 # from planner.predict_traj import *
-from scipy.spatial.transform import Rotation as Rot
 import random
+from dataclasses import dataclass
 
 # For the parameter file
-import pathlib
-import json
+from planner.config import get_config
+from planner.lazy import lazy_import
 import time
-import matplotlib.pyplot as plt
 import math
+
+plt = lazy_import('matplotlib.pyplot')
+transform = lazy_import('scipy.spatial.transform')
+msg = lazy_import('custom_message.msg')
+
 color_dict = {0: 'r', 1: 'b', 2: 'g', 3: 'y', 4: 'm', 5: 'c', 6: 'k', 7: 'tab:orange', 8: 'tab:brown', 9: 'tab:gray', 10: 'tab:olive'}
 
-# TODO: import all this parameters from a config file so that we can easily change them in one place
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-max_steer = json_object["CBF_simple"]["max_steer"]   # [rad] max steering angle
-max_speed = json_object["Car_model"]["max_speed"] # [m/s]
-min_speed = json_object["Car_model"]["min_speed"]  # [m/s]
-car_max_acc = json_object["Controller"]["max_acc"]
-car_min_acc = json_object["Controller"]["min_acc"]
-dt = json_object["Controller"]["dt"] 
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-min_dist = json_object["min_dist"]
-L = json_object["Car_model"]["L"] # [m] Wheel base of vehicle
+params = get_config()
+
+max_steer = params.CBF_simple.max_steer   # [rad] max steering angle
+max_speed = params.Car_model.max_speed # [m/s]
+min_speed = params.Car_model.min_speed  # [m/s]
+car_max_acc = params.Controller.max_acc
+car_min_acc = params.Controller.min_acc
+dt = params.Controller.dt 
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
+L = params.Car_model.L # [m] Wheel base of vehicle
 Lr = L / 2.0  # [m]
 Lf = L - Lr
-Cf = json_object["Car_model"]["Cf"]  # N/rad
-Cr = json_object["Car_model"]["Cr"] # N/rad
-Iz = json_object["Car_model"]["Iz"]  # kg/m2
-m = json_object["Car_model"]["m"]  # kg
+Cf = params.Car_model.Cf  # N/rad
+Cr = params.Car_model.Cr # N/rad
+Iz = params.Car_model.Iz  # kg/m2
+m = params.Car_model.m  # kg
 # Aerodynamic and friction coefficients
-c_a = json_object["Car_model"]["c_a"]
-c_r1 = json_object["Car_model"]["c_r1"]
-WB = json_object["Controller"]["WB"]
+c_a = params.Car_model.c_a
+c_r1 = params.Car_model.c_r1
+WB = params.Controller.WB
 
 def motion(x, u, dt):
     """
-    Motion model for a robot.
+    Motion model for a robot, see motion_batch.
 
     Args:
-        x (list): Initial state of the robot [x(m), y(m), yaw(rad), v(m/s), omega(rad/s)].
+        x (list): Initial state of the robot [x(m), y(m), yaw(rad), v(m/s), omega(rad/s)], updated in place.
         u (list): Control inputs [throttle, delta].
         dt (float): Time step.
 
@@ -58,23 +58,47 @@ def motion(x, u, dt):
         list: Updated state of the robot.
 
     """
-    delta = u[1]
-    delta = np.clip(delta, -max_steer, max_steer)
-    throttle = u[0]
-    throttle = np.clip(throttle, car_min_acc, car_max_acc)
-
-    x[0] = x[0] + x[3] * math.cos(x[2]) * dt
-    x[1] = x[1] + x[3] * math.sin(x[2]) * dt
-    x[2] = x[2] + x[3] / Lr * np.sin(np.arctan2(Lr/L * np.tan(delta),1)) * dt
-    # x[2] = x[2] + x[3] / L * math.tan(delta) * dt
+    x[:4] = motion_batch(np.asarray(x[:4], dtype=float), np.asarray(u[:2], dtype=float), dt)
+    return x
 
-    x[2] = normalize_angle(x[2])
-    x[3] = x[3] + throttle * dt
-    x[3] = np.clip(x[3], min_speed, max_speed)
+def motion_batch(x, u, dt, axis=0):
+    """
+    Motion model for a batch of robots: kinematic bicycle with the slip angle at the centre of the
+    rear axle (Lr), clipped steering, throttle and speed, and the yaw wrapped to [-pi, pi].
 
-    return x
+    Args:
+        x (numpy.ndarray): States [x(m), y(m), yaw(rad), v(m/s)] along axis, e.g. (4, N), or (B, 4) with axis=-1.
+        u (numpy.ndarray): Control inputs [throttle, delta] along the same axis, e.g. (2, N), or (B, 2) with axis=-1.
+        dt (float): Time step.
+        axis (int, optional): Axis of the state and input components. Defaults to 0.
 
-def linear_model_callback(initial_state: State, cmd: ControlInputs):
+    Returns:
+        numpy.ndarray: The updated states, same shape as x. Any component after the fourth is copied.
+    """
+    x = np.asarray(x, dtype=float)
+    u = np.asarray(u, dtype=float)
+    if axis != 0:
+        x = np.moveaxis(x, axis, 0)
+        u = np.moveaxis(u, axis, 0)
+    delta = np.minimum(np.maximum(u[1], -max_steer), max_steer)
+    throttle = np.minimum(np.maximum(u[0], car_min_acc), car_max_acc)
+
+    new = x.copy()
+    new[0] = x[0] + x[3] * np.cos(x[2]) * dt
+    new[1] = x[1] + x[3] * np.sin(x[2]) * dt
+    new[2] = x[2] + x[3] / Lr * np.sin(np.arctan2(Lr/L * np.tan(delta), 1)) * dt
+    yaw = new[2:3]
+    while (yaw > np.pi).any():
+        yaw[yaw > np.pi] -= 2.0 * np.pi
+    while (yaw < -np.pi).any():
+        yaw[yaw < -np.pi] += 2.0 * np.pi
+    new[3] = np.minimum(np.maximum(x[3] + throttle * dt, min_speed), max_speed)
+
+    if axis != 0:
+        new = np.moveaxis(new, 0, axis)
+    return new
+
+def linear_model_callback(initial_state: msg.State, cmd: msg.ControlInputs):
     """
     Computes the next state using a non-linear kinematic model.
 
@@ -87,7 +111,7 @@ def linear_model_callback(initial_state: State, cmd: ControlInputs):
     """
 
     dt = 0.1
-    state = State()
+    state = msg.State()
     cmd.delta = np.clip(cmd.delta, -max_steer, max_steer)
 
     state.x = initial_state.x + initial_state.v * np.cos(initial_state.yaw) * dt
@@ -99,9 +123,9 @@ def linear_model_callback(initial_state: State, cmd: ControlInputs):
 
     return state
 
-def nonlinear_model_callback(initial_state: State, cmd: ControlInputs, old_time: float):
+def nonlinear_model_callback(initial_state: msg.State, cmd: msg.ControlInputs, old_time: float):
     """
-    Calculates the state of the system using a nonlinear dynamic model.
+    Calculates the state of the system using a nonlinear dynamic model, see dynamic_motion_batch.
 
     Args:
         initial_state (State): The initial state of the system.
@@ -113,34 +137,169 @@ def nonlinear_model_callback(initial_state: State, cmd: ControlInputs, old_time:
     """
 
     dt = 0.1
-    state = State()
     #dt = time.time() - old_time
     cmd.delta = np.clip(cmd.delta, -max_steer, max_steer)
-    cmd.delta = np.clip(cmd.delta, -max_steer, max_steer)
+    s = dynamic_state(np.array([[initial_state.x], [initial_state.y], [initial_state.yaw], [initial_state.v], [initial_state.omega]]),
+                      np.array([cmd.delta]))
+    s = dynamic_motion_batch(s, np.array([[cmd.throttle], [cmd.delta]]), dt, method='euler')[:, 0]
 
-    beta = math.atan2((Lr * math.tan(cmd.delta) / L), 1.0)
-    vx = initial_state.v * math.cos(beta)
-    vy = initial_state.v * math.sin(beta)
+    state = msg.State(x=float(s[0]), y=float(s[1]), yaw=float(s[2]), v=float(np.clip(np.hypot(s[3], s[4]), min_speed, max_speed)), omega=float(s[5]))
+    return state, time.time()
 
-    Ffy = -Cf * ((vy + Lf * initial_state.omega) / (vx + 0.0001) - cmd.delta)
-    Fry = -Cr * (vy - Lr * initial_state.omega) / (vx + 0.0001)
-    R_x = c_r1 * abs(vx)
-    F_aero = c_a * vx ** 2 # 
-    F_load = F_aero + R_x #
-    state.omega = initial_state.omega + (Ffy * Lf * math.cos(cmd.delta) - Fry * Lr) / Iz * dt
-    vx = vx + (cmd.throttle - Ffy * math.sin(cmd.delta) / m - F_load / m + vy * state.omega) * dt
-    vy = vy + (Fry / m + Ffy * math.cos(cmd.delta) / m - vx * state.omega) * dt
+def dynamic_state(x, delta):
+    """
+    State of the dynamic model from the pose, the speed and the yaw rate, the speed is split into
+    longitudinal and lateral velocity with the slip angle of the steering.
 
-    state.yaw = initial_state.yaw + state.omega * dt
-    state.yaw = normalize_angle(state.yaw)
+    Args:
+        x (numpy.ndarray): States [x(m), y(m), yaw(rad), v(m/s), omega(rad/s)], (5, N).
+        delta (numpy.ndarray): Steering angles [rad], (N,).
 
-    state.x = initial_state.x + vx * math.cos(state.yaw) * dt - vy * math.sin(state.yaw) * dt
-    state.y = initial_state.y + vx * math.sin(state.yaw) * dt + vy * math.cos(state.yaw) * dt
+    Returns:
+        numpy.ndarray: States [x(m), y(m), yaw(rad), vx(m/s), vy(m/s), omega(rad/s)], (6, N).
+    """
+    x = np.asarray(x, dtype=float)
+    beta = np.arctan2(Lr * np.tan(delta) / L, 1.0)
+    return np.stack((x[0], x[1], x[2], x[3] * np.cos(beta), x[3] * np.sin(beta), x[4]))
 
-    state.v = math.sqrt(vx ** 2 + vy ** 2)
-    state.v = np.clip(state.v, min_speed, max_speed)
+def tyre_forces(vx, vy, omega, delta):
+    """
+    Lateral forces of the front and rear tyres, linear in the slip angles.
 
-    return state, time.time()
+    Args:
+        vx (numpy.ndarray): Longitudinal velocities [m/s].
+        vy (numpy.ndarray): Lateral velocities [m/s].
+        omega (numpy.ndarray): Yaw rates [rad/s].
+        delta (numpy.ndarray): Steering angles [rad].
+
+    Returns:
+        tuple: The front and rear lateral forces [N].
+    """
+    Ffy = -Cf * ((vy + Lf * omega) / (vx + 0.0001) - delta)
+    Fry = -Cr * (vy - Lr * omega) / (vx + 0.0001)
+    return Ffy, Fry
+
+def dynamic_derivatives(s, u):
+    """
+    Time derivative of the dynamic bicycle model: tyre forces (Cf, Cr), aerodynamic (c_a) and
+    rolling (c_r1) drag.
+
+    Args:
+        s (numpy.ndarray): States [x(m), y(m), yaw(rad), vx(m/s), vy(m/s), omega(rad/s)], (6, N).
+        u (numpy.ndarray): Control inputs [throttle, delta], (2, N).
+
+    Returns:
+        numpy.ndarray: The derivatives of the states, (6, N).
+    """
+    _, _, yaw, vx, vy, omega = s
+    throttle, delta = u
+    Ffy, Fry = tyre_forces(vx, vy, omega, delta)
+    F_load = c_a * vx ** 2 + c_r1 * np.abs(vx)
+    return np.stack((vx * np.cos(yaw) - vy * np.sin(yaw),
+                     vx * np.sin(yaw) + vy * np.cos(yaw),
+                     omega,
+                     throttle - Ffy * np.sin(delta) / m - F_load / m + vy * omega,
+                     Fry / m + Ffy * np.cos(delta) / m - vx * omega,
+                     (Ffy * Lf * np.cos(delta) - Fry * Lr) / Iz))
+
+def dynamic_step_euler(s, u, h):
+    """
+    One step of the original integrator of the dynamic model: explicit Euler, with the yaw rate,
+    the velocities and the yaw each updated with the ones already updated.
+    """
+    x, y, yaw, vx, vy, omega = s
+    throttle, delta = u
+    Ffy, Fry = tyre_forces(vx, vy, omega, delta)
+    F_load = c_a * vx ** 2 + c_r1 * np.abs(vx)
+    omega = omega + (Ffy * Lf * np.cos(delta) - Fry * Lr) / Iz * h
+    vx = vx + (throttle - Ffy * np.sin(delta) / m - F_load / m + vy * omega) * h
+    vy = vy + (Fry / m + Ffy * np.cos(delta) / m - vx * omega) * h
+    yaw = yaw + omega * h
+    x = x + vx * np.cos(yaw) * h - vy * np.sin(yaw) * h
+    y = y + vx * np.sin(yaw) * h + vy * np.cos(yaw) * h
+    return np.stack((x, y, yaw, vx, vy, omega))
+
+def dynamic_step_semi_implicit(s, u, h):
+    """
+    One semi-implicit Euler step of the dynamic model. For a given vx the lateral dynamics are
+    linear in (vy, omega) and stiff at low speed, they are integrated with implicit Euler (a 2x2
+    linear system per robot), then vx explicitly and the pose with the new velocities.
+    """
+    x, y, yaw, vx, vy, omega = s
+    throttle, delta = u
+    d = vx + 0.0001
+    cos_delta = np.cos(delta)
+    # d/dt (vy, omega) = A (vy, omega) + b
+    a11 = -(Cr + Cf * cos_delta) / (m * d)
+    a12 = (Cr * Lr - Cf * Lf * cos_delta) / (m * d) - vx
+    a21 = (Cr * Lr - Cf * Lf * cos_delta) / (Iz * d)
+    a22 = -(Cf * Lf ** 2 * cos_delta + Cr * Lr ** 2) / (Iz * d)
+    b1 = Cf * delta * cos_delta / m
+    b2 = Cf * Lf * delta * cos_delta / Iz
+    # (I - h A) (vy, omega)' = (vy, omega) + h b
+    m11, m12, m21, m22 = 1.0 - h * a11, -h * a12, -h * a21, 1.0 - h * a22
+    r1, r2 = vy + h * b1, omega + h * b2
+    det = m11 * m22 - m12 * m21
+    vy = (m22 * r1 - m12 * r2) / det
+    omega = (m11 * r2 - m21 * r1) / det
+
+    Ffy, _ = tyre_forces(vx, vy, omega, delta)
+    F_load = c_a * vx ** 2 + c_r1 * np.abs(vx)
+    vx = vx + (throttle - Ffy * np.sin(delta) / m - F_load / m + vy * omega) * h
+    yaw = yaw + omega * h
+    x = x + (vx * np.cos(yaw) - vy * np.sin(yaw)) * h
+    y = y + (vx * np.sin(yaw) + vy * np.cos(yaw)) * h
+    return np.stack((x, y, yaw, vx, vy, omega))
+
+def dynamic_step_rk4(s, u, h):
+    """
+    One classic Runge-Kutta 4 step of the dynamic model.
+    """
+    k1 = dynamic_derivatives(s, u)
+    k2 = dynamic_derivatives(s + h / 2 * k1, u)
+    k3 = dynamic_derivatives(s + h / 2 * k2, u)
+    k4 = dynamic_derivatives(s + h * k3, u)
+    return s + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+dynamic_steps = {'euler': dynamic_step_euler, 'semi-implicit': dynamic_step_semi_implicit, 'rk4': dynamic_step_rk4}
+
+def dynamic_motion_batch(s, u, dt, method='semi-implicit', substeps=1, steer_limit=None, max_speed_limit=None):
+    """
+    Dynamic bicycle model for a batch of robots, the dynamic counterpart of motion_batch. The
+    model is integrated over dt with substeps steps of the chosen method:
+
+    - 'euler': the original explicit scheme, unstable at low speed or for large steps.
+    - 'semi-implicit': implicit lateral dynamics, stable for large steps and at low speed.
+    - 'rk4': Runge-Kutta 4, the most accurate when the steps are small enough to be stable.
+
+    Args:
+        s (numpy.ndarray): States [x(m), y(m), yaw(rad), vx(m/s), vy(m/s), omega(rad/s)], (6, N), see dynamic_state.
+        u (numpy.ndarray): Control inputs [throttle, delta], (2, N).
+        dt (float or numpy.ndarray): Time step, or one time step per robot (N,).
+        method (str, optional): The integrator, a key of dynamic_steps. Defaults to 'semi-implicit'.
+        substeps (int, optional): Number of integration steps in dt. Defaults to 1.
+        steer_limit (float, optional): Maximum steering angle [rad]. Defaults to max_steer.
+        max_speed_limit (float, optional): Maximum speed [m/s]. Defaults to max_speed.
+
+    Returns:
+        numpy.ndarray: The updated states, (6, N), with the yaw in [-pi, pi] and the speed clipped.
+    """
+    s = np.asarray(s, dtype=float)
+    u = np.asarray(u, dtype=float)
+    steer_limit = max_steer if steer_limit is None else steer_limit
+    max_speed_limit = max_speed if max_speed_limit is None else max_speed_limit
+    step = dynamic_steps[method]
+
+    u = np.stack((u[0], np.minimum(np.maximum(u[1], -steer_limit), steer_limit)))
+    h = np.asarray(dt, dtype=float) / substeps
+    for _ in range(substeps):
+        s = step(s, u, h)
+
+    wrap = np.abs(s[2]) > np.pi
+    s[2] = np.where(wrap, np.remainder(s[2] + np.pi, 2.0 * np.pi) - np.pi, s[2])
+    speed = np.sqrt(s[3] ** 2 + s[4] ** 2)
+    s[3:5] *= np.where(speed > max_speed_limit, max_speed_limit / np.maximum(speed, 1e-12), 1.0)
+    return s
 
 def pure_pursuit_steer_control(target, pose):
     """
@@ -224,14 +383,37 @@ def array_to_state(array):
     Returns:
         State: The State object with the values from the array.
     """
-    state = State()
+    state = msg.State()
     state.x = array[0]
     state.y = array[1]
     state.yaw = array[2]
     state.v = array[3]
     return state
 
-def state_to_array(state: State):
+@dataclass
+class Pose:
+    """
+    The x, y, yaw and v fields of a custom_message/State, for the code that runs without the ROS
+    messages (e.g. the seed simulations).
+    """
+    x: float
+    y: float
+    yaw: float
+    v: float
+
+def array_to_pose(array):
+    """
+    Convert an array to a Pose.
+
+    Args:
+        array (list): The array containing the state values.
+
+    Returns:
+        Pose: The Pose with the values from the array.
+    """
+    return Pose(array[0], array[1], array[2], array[3])
+
+def state_to_array(state: msg.State):
     """
     Convert a State object to a numpy array.
 
@@ -259,7 +441,7 @@ def plot_map(width=100, height=100):
 
         plt.plot(corner_x, corner_y, label="map", linewidth=4)
 
-def plot_path(path: Path):
+def plot_path(path: msg.Path):
         x = []
         y = []
         for coord in path.path:
@@ -364,7 +546,7 @@ def rot_mat_2d(angle):
 
 
     """
-    return Rot.from_euler('z', angle).as_matrix()[0:2, 0:2]
+    return transform.Rotation.from_euler('z', angle).as_matrix()[0:2, 0:2]
 
 def samplegrid(width_init, height_init, min_dist, robot_num, safety_init):
     """
@@ -461,7 +643,7 @@ def dist(point1, point2):
     distance = math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
     return distance
 
-def update_path(path: Path):
+def update_path(path: msg.Path):
     """
     Updates the path by removing the first waypoint and adding a new random waypoint.
 
@@ -469,7 +651,7 @@ def update_path(path: Path):
     """
     safety = 2
     path.pop(0)
-    path.append(Coordinate(x=float(random.randint(-width_init/2+safety, width_init/2-safety)), y=float(random.randint(-height_init/2+safety, height_init/2-safety))))
+    path.append(msg.Coordinate(x=float(random.randint(-width_init/2+safety, width_init/2-safety)), y=float(random.randint(-height_init/2+safety, height_init/2-safety))))
     return path
 
 def create_path(len_path=5):
@@ -481,7 +663,7 @@ def create_path(len_path=5):
     safety = 2
     path = []
     while len(path)<len_path:
-        path.append(Coordinate(x=float(random.randint(-width_init/2+safety, width_init/2-safety)), y=float(random.randint(-height_init/2+safety, height_init/2-safety))))
+        path.append(msg.Coordinate(x=float(random.randint(-width_init/2+safety, width_init/2-safety)), y=float(random.randint(-height_init/2+safety, height_init/2-safety))))
     return path
 
 def create_seed(len_path=5):
@@ -1,7 +1,16 @@
+import os
+from glob import glob
 from setuptools import find_packages, setup
 
 package_name = 'planner'
 
+# data files of the workspace read through planner.config, installed in share/planner/data with
+# their path relative to src
+data = ['bumper_cars/params.json', 'bumper_cars/init.json', 'bumper_cars/rviz2_config.rviz',
+        'trajectories.json', 'lbp_dev/lbp_dev/LBP.json']
+data += sorted(os.path.relpath(file, '..') for file in glob('../seeds/*.json'))
+data_dirs = sorted(set(os.path.dirname(file) for file in data))
+
 setup(
     name=package_name,
     version='0.0.0',
@@ -10,7 +19,8 @@ setup(
         ('share/ament_index/resource_index/packages',
             ['resource/' + package_name]),
         ('share/' + package_name, ['package.xml']),
-    ],
+    ] + [(os.path.join('share', package_name, 'data', folder),
+          [os.path.join('..', file) for file in data if os.path.dirname(file) == folder]) for folder in data_dirs],
     install_requires=['setuptools'],
     zip_safe=True,
     maintainer='giacomo',
@@ -0,0 +1,41 @@
+import numpy as np
+
+from planner import utils
+from planner.ekf import FleetEKF, measurement_covariance, motion_jacobian
+from planner.noise import StateNoise
+
+
+def test_motion_jacobian_matches_finite_differences():
+    rng = np.random.default_rng(0)
+    n = 20
+    # speeds inside the limits, the Jacobian ignores the clipping of the speed
+    x = np.stack([rng.uniform(-10.0, 10.0, n), rng.uniform(-10.0, 10.0, n),
+                  rng.uniform(-3.0, 3.0, n), rng.uniform(0.5, 0.5 * utils.max_speed, n)])
+    u = np.stack([np.zeros(n), rng.uniform(-utils.max_steer, utils.max_steer, n)])
+    dt, eps = 0.1, 1e-6
+    jF = motion_jacobian(x, u, dt)
+    for j in range(4):
+        step = np.zeros((4, 1))
+        step[j] = eps
+        column = (utils.motion_batch(x + step, u, dt) - utils.motion_batch(x - step, u, dt)) / (2.0 * eps)
+        np.testing.assert_allclose(jF[:, :, j], column.T, atol=1e-6)
+
+
+def test_fleet_ekf_reduces_the_measurement_error():
+    rng = np.random.default_rng(1)
+    n, steps, dt = 50, 200, 0.1
+    noise = StateNoise(n, 1.0, seed=2)
+    x = np.stack([rng.uniform(-10.0, 10.0, n), rng.uniform(-10.0, 10.0, n),
+                  rng.uniform(-np.pi, np.pi, n), np.full(n, 1.0)])
+    u = np.stack([np.zeros(n), rng.uniform(-0.5 * utils.max_steer, 0.5 * utils.max_steer, n)])
+    ekf = FleetEKF(x + noise.sample_all().T, R=measurement_covariance(1.0))
+    raw_error, ekf_error = [], []
+    for _ in range(steps):
+        x = utils.motion_batch(x, u, dt)
+        z = x + noise.sample_all().T
+        estimate = ekf.step(z, u, dt)
+        raw_error.append(np.hypot(*(z[:2] - x[:2])))
+        ekf_error.append(np.hypot(*(estimate[:2] - x[:2])))
+    raw_error = np.mean(raw_error[steps // 2:])
+    ekf_error = np.mean(ekf_error[steps // 2:])
+    assert ekf_error < 0.6 * raw_error
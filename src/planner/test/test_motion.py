@@ -0,0 +1,39 @@
+import numpy as np
+
+from planner import utils
+
+
+def scalar_motion(x, u, dt):
+    # the per-robot model motion_batch replaced
+    delta = np.clip(u[1], -utils.max_steer, utils.max_steer)
+    throttle = np.clip(u[0], utils.car_min_acc, utils.car_max_acc)
+    x[0] = x[0] + x[3] * np.cos(x[2]) * dt
+    x[1] = x[1] + x[3] * np.sin(x[2]) * dt
+    x[2] = x[2] + x[3] / utils.Lr * np.sin(np.arctan2(utils.Lr/utils.L * np.tan(delta), 1)) * dt
+    x[2] = utils.normalize_angle(x[2])
+    x[3] = np.clip(x[3] + throttle * dt, utils.min_speed, utils.max_speed)
+    return x
+
+
+def random_fleet(rng, n):
+    x = np.stack([rng.uniform(-20.0, 20.0, n), rng.uniform(-20.0, 20.0, n),
+                  rng.uniform(-np.pi, np.pi, n), rng.uniform(utils.min_speed - 1.0, utils.max_speed + 1.0, n)])
+    u = np.stack([rng.uniform(-2.0 * utils.car_max_acc, 2.0 * utils.car_max_acc, n),
+                  rng.uniform(-2.0 * utils.max_steer, 2.0 * utils.max_steer, n)])
+    return x, u
+
+
+def test_motion_batch_matches_scalar_model():
+    x, u = random_fleet(np.random.default_rng(0), 500)
+    expected = np.stack([scalar_motion(list(x[:, i]), u[:, i], 0.1) for i in range(x.shape[1])], axis=1)
+    assert np.array_equal(utils.motion_batch(x, u, 0.1), expected)
+    assert np.array_equal(utils.motion_batch(x.T, u.T, 0.1, axis=-1), expected.T)
+
+
+def test_motion_updates_in_place():
+    x, u = random_fleet(np.random.default_rng(1), 50)
+    for i in range(x.shape[1]):
+        state = list(x[:, i]) + [0.5]
+        assert utils.motion(state, u[:, i], 0.1) is state
+        assert np.array_equal(state[:4], scalar_motion(list(x[:, i]), u[:, i], 0.1))
+        assert state[4] == 0.5
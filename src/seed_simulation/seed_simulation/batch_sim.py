@@ -0,0 +1,175 @@
+"""
+Headless batch runner for the seed simulations.
+
+Every (seed, method, overrides) combination is a job, the jobs are run in a pool of worker
+processes with plotting disabled and each worker appends its result to the results store as soon
+as its job finishes, so an interrupted sweep keeps the results of the finished jobs. Run from this
+folder, like seed_sim.py:
+
+    python3 batch_sim.py --methods DWA MPC --overrides "" "MPC.horizon=8 MPC.block_size=2"
+
+An override has the form Module.attribute=value, where Module is one of DWA, LBP, MPC, C3BF, CBF
+or seed_sim and value is parsed as json (plain strings are kept as they are). The overrides are
+set on the module before the job runs and restored afterwards, so they only affect the
+parameters read at run time and not the ones derived at import.
+
+The measurement noise of every job is drawn from its own generators seeded by noise_seed, so the
+results do not depend on the number of workers nor on the order of the jobs. Use --noise-seeds to
+repeat each job with different noise realizations.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from itertools import product
+
+# headless: the backend is only read when pyplot is first imported
+os.environ['MPLBACKEND'] = 'Agg'
+
+import seed_sim
+import dwa_dev.DWA as DWA
+import lbp_dev.LBP as LBP
+import cbf_dev.CBF_simple as CBF
+import cbf_dev.C3BF as C3BF
+import mpc_dev.MPC as MPC
+from planner.config import data_file
+from data_process import DataProcessor
+from results_store import ResultsStore, db_file
+from scenario import load_seed
+
+seeds_path = data_file('seeds')
+
+modules = {'DWA': DWA, 'LBP': LBP, 'MPC': MPC, 'C3BF': C3BF, 'CBF': CBF, 'seed_sim': seed_sim}
+simulations = {'DWA': seed_sim.dwa_sim, 'LBP': seed_sim.lbp_sim, 'MPC': seed_sim.mpc_sim,
+               'C3BF': seed_sim.c3bf_sim, 'CBF': seed_sim.cbf_sim}
+
+def parse_overrides(text):
+    """
+    Parse a set of overrides.
+
+    Args:
+        text (str): Space separated Module.attribute=value overrides.
+
+    Returns:
+        list: The (module, attribute, value) triplets.
+    """
+    overrides = []
+    for item in text.split():
+        key, value = item.split('=', 1)
+        module, attribute = key.split('.', 1)
+        if module not in modules:
+            raise ValueError(f"Unknown module {module} in override {item}")
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+        overrides.append((module, attribute, value))
+    return overrides
+
+@contextmanager
+def applied_overrides(overrides):
+    """
+    Set the overrides on the modules and restore the previous values on exit.
+
+    Args:
+        overrides (str): Space separated Module.attribute=value overrides.
+    """
+    previous = []
+    try:
+        for module, attribute, value in parse_overrides(overrides):
+            previous.append((module, attribute, getattr(modules[module], attribute)))
+            setattr(modules[module], attribute, value)
+        yield
+    finally:
+        for module, attribute, value in reversed(previous):
+            setattr(modules[module], attribute, value)
+
+def init_worker():
+    """
+    Disable every plot in the worker process.
+    """
+    for module in modules.values():
+        module.show_animation = False
+
+def run_job(seed_file, method, overrides, output):
+    """
+    Run one simulation, post process it and append the result to the store.
+
+    Args:
+        seed_file (str): Path of the seed, json or npz (see scenario).
+        method (str): The controller, a key of simulations.
+        overrides (str): Space separated Module.attribute=value overrides.
+        output (str): The results store.
+
+    Returns:
+        dict: The post processed data of the simulation.
+    """
+    with applied_overrides(overrides):
+        seed = load_seed(seed_file)
+        robot_num = seed['robot_num']
+        data_process = DataProcessor(robot_num, file_name=os.path.basename(seed_file), seed=seed)
+
+        t_prev = time.time()
+        result = simulations[method](seed, robot_num)
+        wall_time = time.time() - t_prev
+
+        trajectory, computational_time, solver_failure, deadline_miss_rate = result
+        data = data_process.post_process_simultation(trajectory, computational_time, method=method,
+                                                     solver_failure=solver_failure,
+                                                     deadline_miss_rate=deadline_miss_rate)
+
+    data["Wall Time"] = wall_time
+    store = ResultsStore(output)
+    store.append(data, overrides)
+    store.close()
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the seed simulations headless in a process pool.")
+    parser.add_argument('--seeds', nargs='+', default=None,
+                        help="seed files in the seeds folder, default all the circular seeds")
+    parser.add_argument('--methods', nargs='+', default=list(simulations), choices=list(simulations))
+    parser.add_argument('--overrides', nargs='+', default=[''],
+                        help="sets of space separated Module.attribute=value overrides, one job per set")
+    parser.add_argument('--noise-seeds', nargs='+', type=int, default=None,
+                        help="seeds of the measurement noise, one job per seed, default noise_seed of the parameter file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default=db_file, help="the results store (sqlite)")
+    parser.add_argument('--skip-existing', action='store_true', help="skip the jobs already in the store")
+    args = parser.parse_args()
+
+    seeds = args.seeds
+    if seeds is None:
+        seeds = sorted(filename for filename in os.listdir(seeds_path) if 'circular' in filename)
+    for overrides in args.overrides:
+        parse_overrides(overrides)
+
+    jobs = list(product(seeds, args.methods, args.overrides))
+    if args.noise_seeds is not None:
+        # the noise seed is an override of the controller, so each seed is a different run in the store
+        jobs = [(seed, method, (overrides + f' {method}.noise_seed={noise_seed}').strip())
+                for (seed, method, overrides), noise_seed in product(jobs, args.noise_seeds)]
+    if args.skip_existing:
+        store = ResultsStore(args.output)
+        jobs = [job for job in jobs if not store.contains(*job)]
+        store.close()
+    print(f"Running {len(jobs)} jobs on {args.workers} workers")
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        futures = {pool.submit(run_job, str(seeds_path / seed), method, overrides, args.output): (seed, method, overrides)
+                   for seed, method, overrides in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            seed, method, overrides = futures[future]
+            try:
+                data = future.result()
+            except Exception as error:
+                print(f"[{done}/{len(jobs)}] {seed} {method} '{overrides}' failed: {error!r}")
+                continue
+            print(f"[{done}/{len(jobs)}] {seed} {method} '{overrides}' done in {data['Wall Time']:.1f} s")
+
+    print(f"Data saved to the results store: {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Step-latency benchmark of the controllers (DWA, LBP, MPC, C3BF, CBF) versus the number of robots.
+
+Every controller is run headless on circular seeds built by generate_seed.make_circular_seed with a
+fixed random seed, the latency of each robot step is the computational time measured by the
+controller with time.perf_counter_ns. The percentiles and the deadline miss rate (see
+planner.deadline) of each (method, robot number) are written to a json report, and the report can
+be compared with a stored baseline to flag the regressions of any controller. Run from this folder,
+like seed_sim.py:
+
+    python3 benchmark_latency.py --output latency.json
+    python3 benchmark_latency.py --baseline latency.json --output latency_new.json
+    python3 benchmark_latency.py --methods MPC --profile --trace mpc_trace.json
+    python3 benchmark_latency.py --scenario poisson --crossing 0.8 --robot-nums 5 10 15
+
+The benchmark runs in a single process, so the jobs do not compete for the CPU. The comparison
+exits with status 1 if a percentile is slower than the baseline by more than the tolerance.
+
+With --profile every result also holds the statistics of the phases of the controllers (see
+planner.profiler), and --trace writes all the spans as a Chrome trace, one row per run.
+
+With --scenario poisson the seeds are built by scenario.make_scenario in the arena of the
+parameter file instead of on a circle, --crossing sets the fraction of robots with a random goal.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+
+import numpy as np
+
+# headless: the backend is only read when pyplot is first imported
+os.environ['MPLBACKEND'] = 'Agg'
+
+import seed_sim
+from batch_sim import simulations, applied_overrides, parse_overrides, init_worker
+from generate_seed import make_circular_seed
+from scenario import make_scenario, to_seed
+from results_store import params_hash
+import planner.profiler as profiler
+
+robot_nums = [2, 4, 6, 8, 10]
+percentiles = [50, 95, 99]
+iterations = 300
+radius = 10.0
+
+def latency_stats(latency_ns):
+    """
+    Statistics of the latency of the robot steps.
+
+    Args:
+        latency_ns (numpy.ndarray): Latency of each robot step [ns].
+
+    Returns:
+        dict: Number of samples, mean, max and percentiles [ns].
+    """
+    stats = {"samples": int(latency_ns.shape[0])}
+    if latency_ns.shape[0] == 0:
+        return stats
+    stats["mean_ns"] = int(np.mean(latency_ns))
+    stats["max_ns"] = int(np.max(latency_ns))
+    for p, value in zip(percentiles, np.percentile(latency_ns, percentiles)):
+        stats[f"p{p}_ns"] = int(value)
+    return stats
+
+def make_seed(robot_num, random_seed=0, scenario='circular', crossing=0.5):
+    """
+    Build the seed of a run.
+
+    Args:
+        robot_num (int): Number of robots.
+        random_seed (int, optional): Seed of the random generator. Defaults to 0.
+        scenario (str, optional): 'circular' or 'poisson'. Defaults to 'circular'.
+        crossing (float, optional): Fraction of the robots with a random goal (poisson only). Defaults to 0.5.
+
+    Returns:
+        dict: The seed.
+    """
+    if scenario == 'poisson':
+        return to_seed(make_scenario(robot_num, crossing=crossing, seed=random_seed))
+    random.seed(random_seed)
+    return make_circular_seed(robot_num, radius)
+
+def run(method, robot_num, random_seed=0, overrides='', scenario='circular', crossing=0.5):
+    """
+    Run one controller on a generated seed and measure the latency of its robot steps.
+
+    Args:
+        method (str): The controller, a key of batch_sim.simulations.
+        robot_num (int): Number of robots.
+        random_seed (int, optional): Seed of the generated seed. Defaults to 0.
+        overrides (str, optional): Space separated Module.attribute=value overrides. Defaults to ''.
+        scenario (str, optional): 'circular' or 'poisson'. Defaults to 'circular'.
+        crossing (float, optional): Fraction of the robots with a random goal (poisson only). Defaults to 0.5.
+
+    Returns:
+        dict: The latency statistics and the deadline miss rate of the run.
+    """
+    seed = make_seed(robot_num, random_seed, scenario, crossing)
+    if profiler.enabled:
+        profiler.profiler.new_run(f"{method} {robot_num} robots")
+    with applied_overrides(overrides):
+        result = simulations[method](seed, robot_num)
+    trajectory, computational_time, _, deadline_miss_rate = result
+    latency_ns = np.rint(np.asarray(computational_time, dtype=float)*1e9).astype(np.int64)
+
+    stats = {"method": method, "robot_num": robot_num, "steps": int(trajectory.shape[2]),
+             "deadline_miss_rate": deadline_miss_rate}
+    stats.update(latency_stats(latency_ns))
+    if profiler.enabled:
+        stats["phases"] = profiler.profiler.summary()
+    return stats
+
+def compare(report, baseline, tolerance):
+    """
+    Compare the percentiles of a report with a baseline.
+
+    Args:
+        report (dict): The new report.
+        baseline (dict): The baseline report.
+        tolerance (float): Relative slowdown above which a percentile is a regression, e.g. 0.2 for 20%.
+
+    Returns:
+        list: The (method, robot_num, percentile, baseline [ns], new [ns]) regressions.
+    """
+    previous = {(entry["method"], entry["robot_num"]): entry for entry in baseline["results"]}
+    regressions = []
+    print(f'{"method":>6} {"robots":>6} ' + ' '.join(f'{"p" + str(p) + " ratio":>10}' for p in percentiles))
+    for entry in report["results"]:
+        old = previous.get((entry["method"], entry["robot_num"]))
+        if old is None:
+            print(f'{entry["method"]:>6} {entry["robot_num"]:>6} {"no baseline":>10}')
+            continue
+        ratios = []
+        for p in percentiles:
+            name = f"p{p}_ns"
+            if name not in entry or name not in old or old[name] == 0:
+                ratios.append(f'{"-":>10}')
+                continue
+            ratio = entry[name] / old[name]
+            flag = '!' if ratio > 1.0 + tolerance else ' '
+            ratios.append(f'{ratio:>9.2f}{flag}')
+            if flag == '!':
+                regressions.append((entry["method"], entry["robot_num"], p, old[name], entry[name]))
+        print(f'{entry["method"]:>6} {entry["robot_num"]:>6} ' + ' '.join(ratios))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the step latency of the controllers.")
+    parser.add_argument('--methods', nargs='+', default=list(simulations), choices=list(simulations))
+    parser.add_argument('--robot-nums', nargs='+', type=int, default=robot_nums)
+    parser.add_argument('--iterations', type=int, default=iterations, help="maximum number of ticks of each run")
+    parser.add_argument('--random-seed', type=int, default=0, help="seed of the generated seeds")
+    parser.add_argument('--scenario', default='circular', choices=['circular', 'poisson'])
+    parser.add_argument('--crossing', type=float, default=0.5, help="fraction of the robots with a random goal (poisson)")
+    parser.add_argument('--overrides', default='', help="space separated Module.attribute=value overrides")
+    parser.add_argument('--output', default=None, help="json report, default print only")
+    parser.add_argument('--baseline', default=None, help="json report to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative slowdown flagged as a regression")
+    parser.add_argument('--profile', action='store_true', help="add the statistics of the phases to the report")
+    parser.add_argument('--trace', default=None, help="Chrome trace of the phases (json), implies --profile")
+    args = parser.parse_args()
+
+    parse_overrides(args.overrides)
+    init_worker()
+    if args.profile or args.trace is not None:
+        profiler.enable(with_trace=args.trace is not None)
+    seed_sim.iterations = args.iterations
+
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "params_hash": params_hash(args.overrides),
+            "overrides": args.overrides,
+            "iterations": args.iterations,
+            "random_seed": args.random_seed,
+            "scenario": args.scenario,
+            "radius": radius,
+            "crossing": args.crossing,
+        },
+        "results": [],
+    }
+
+    print(f'{"method":>6} {"robots":>6} {"samples":>8} ' + ' '.join(f'{"p" + str(p) + " [ms]":>10}' for p in percentiles) +
+          f' {"misses":>8}')
+    for method in args.methods:
+        for robot_num in args.robot_nums:
+            stats = run(method, robot_num, args.random_seed, args.overrides, args.scenario, args.crossing)
+            report["results"].append(stats)
+            print(f'{method:>6} {robot_num:>6} {stats["samples"]:>8} ' +
+                  ' '.join(f'{stats.get(f"p{p}_ns", 0)*1e-6:>10.3f}' for p in percentiles) +
+                  f' {stats["deadline_miss_rate"]:>8.1%}')
+
+    if args.trace is not None:
+        profiler.profiler.export_chrome_trace(args.trace)
+        print(f"Trace saved to {args.trace}")
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=3)
+        print(f"Report saved to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        for key in ("scenario", "crossing", "iterations", "random_seed"):
+            if baseline["meta"].get(key) != report["meta"][key]:
+                print(f"Warning: the baseline has {key} {baseline['meta'].get(key)}, this report {report['meta'][key]}")
+        regressions = compare(report, baseline, args.tolerance)
+        for method, robot_num, p, old, new in regressions:
+            print(f"Regression: {method} with {robot_num} robots, p{p} {old*1e-6:.3f} ms -> {new*1e-6:.3f} ms")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
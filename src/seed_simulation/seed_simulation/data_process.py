@@ -1,65 +1,73 @@
 # class to process the data from the simulation
 
 import numpy as np
-import pandas as pd
 import os
-import matplotlib.pyplot as plt
-import json
-import pathlib
+from planner.config import get_config
 
-# TODO: import all this parameters from a config file so that we can easily change them in one place
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
+params = get_config()
 
-L = json_object["Car_model"]["L"] # [m] Wheel base of vehicle
-WB = json_object["Controller"]["WB"] # Wheel base
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-min_dist = json_object["min_dist"]
-to_goal_stop_distance = json_object["to_goal_stop_distance"]
-add_noise = json_object["add_noise"]
-noise_scale_param = json_object["noise_scale_param"]
+L = params.Car_model.L # [m] Wheel base of vehicle
+WB = params.Controller.WB # Wheel base
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
+to_goal_stop_distance = params.to_goal_stop_distance
+add_noise = params.add_noise
+noise_scale_param = params.noise_scale_param
 
 class DataProcessor:
+    """
+    Metrics of the simulations of one seed.
+
+    Every metric is computed with array operations over the whole trajectory, of shape
+    (6, robot_num, T) with rows x, y, yaw, v, throttle and steering. The *_all methods also accept a
+    stack of runs of shape (runs, 6, robot_num, T), see batch_post_process.
+    """
     def __init__(self, robot_num, file_name, seed):
         self.robot_num = robot_num
         self.file_name = file_name
         self.seed = seed
     
-    def calculate_goal_reached_index(self, trajectory, i):
-        last_idx = 0
-        for idx in range(1, len(trajectory[4,i,:])):
-            idx_prev = idx-1
-            if trajectory[4, i, idx] == 0.0 and trajectory[5, i, idx] == 0.0 and idx > last_idx:
-                if trajectory[4, i, idx_prev] != 0.0 or trajectory[5, i, idx_prev] != 0.0:
-                    last_idx = idx
-        
-        return last_idx
-    
-    def get_initial_length(self, trajectory, i):
-        initial_state = self.seed['initial_position']
-        x0 = initial_state['x']
-        y = initial_state['y']
-        yaw = initial_state['yaw']
-        v = initial_state['v']
+    def goal_reached_indices(self, trajectory):
+        """
+        Index of the last step at which each robot stopped, i.e. both inputs switch to zero.
+        :param trajectory: the trajectory, (..., 6, robot_num, T)
+        :return: the indices, (..., robot_num), 0 if the robot never stopped
+        """
+        stopped = (trajectory[..., 4, :, :] == 0.0) & (trajectory[..., 5, :, :] == 0.0)
+        transitions = stopped[..., 1:] & ~stopped[..., :-1]
+        last = transitions.shape[-1] - np.argmax(transitions[..., ::-1], axis=-1)
+        return np.where(transitions.any(axis=-1), last, 0)
 
-        # Step 3: Create an array x with the initial values
-        x = np.array([x0, y, yaw, v])
+    def calculate_goal_reached_index(self, trajectory, i):
+        return self.goal_reached_indices(trajectory)[i]
 
+    def initial_lengths(self):
+        """
+        Distance of each robot from its first target, minus the goal tolerance.
+        :return: the initial lengths, (robot_num,)
+        """
+        initial_state = self.seed['initial_position']
+        x = np.array(initial_state['x'][:self.robot_num])
+        y = np.array(initial_state['y'][:self.robot_num])
         traj = self.seed['trajectories']
-        paths = [[(traj[str(idx)][i][0], traj[str(idx)][i][1]) for i in range(len(traj[str(idx)]))] for idx in range(self.robot_num)]
-
-        # Step 5: Extract the target coordinates from the paths
-        targets = [[path[0][0], path[0][1]] for path in paths]
+        targets = np.array([traj[str(idx)][0][0:2] for idx in range(self.robot_num)])
+        return np.sqrt((x - targets[:, 0]) ** 2 + (y - targets[:, 1]) ** 2) - to_goal_stop_distance
 
-        # Step 6: Calculate the distance between the initial position and the target position
-        initial_length = np.sqrt((x[0, i] - targets[i][0]) ** 2 + (x[1,i] - targets[i][1]) ** 2)
+    def get_initial_length(self, trajectory, i):
+        return self.initial_lengths()[i]
 
-        return initial_length - to_goal_stop_distance
+    def path_lengths(self, trajectory):
+        """
+        Percentage increase of the path length of each robot with respect to the initial distance to the goal.
+        :param trajectory: the trajectory, (..., 6, robot_num, T)
+        :return: the path lengths, (..., robot_num)
+        """
+        dx = np.diff(trajectory[..., 0, :, :], axis=-1)
+        dy = np.diff(trajectory[..., 1, :, :], axis=-1)
+        path_length = np.sum(np.sqrt(dx ** 2 + dy ** 2), axis=-1)
+        return (path_length/self.initial_lengths()-1)*100
 
     def calculate_path_length(self, trajectory, i):
         """
@@ -68,31 +76,7 @@ class DataProcessor:
         :param trajectory: the trajectory
         :return: the path length
         """
-        initial_length = self.get_initial_length(trajectory, i)
-        x_list = trajectory[0, i, :]
-        y_list = trajectory[1, i, :]
-
-        path_length = 0.0
-
-        initial_x = x_list[0]
-        initial_y = y_list[0]
-
-        assert len(x_list) == len(y_list)
-
-        for idx in range(len(x_list)):
-
-            x = x_list[idx]
-            y = y_list[idx]
-
-            dx = x - initial_x
-            dy = y - initial_y
-
-            initial_x = x
-            initial_y = y
-
-            path_length += np.sqrt(dx ** 2 + dy ** 2)
-        
-        return (path_length/initial_length-1)*100
+        return self.path_lengths(trajectory)[i]
     
     def calculate_avg_path_length(self, trajectory):
         """
@@ -102,20 +86,29 @@ class DataProcessor:
         :return: the average path length
         """
         print("Calculating Path Length...")
-        path_length = 0
-        for i in range(self.robot_num):
-            path_length += self.calculate_path_length(trajectory, i)
-        return path_length / self.robot_num
-    
+        return np.mean(self.path_lengths(trajectory))
+
+    def mean_until_goal(self, values, trajectory):
+        """
+        Mean of the values of each robot up to the step at which it reached the goal (included).
+        :param values: the values, (..., robot_num, T)
+        :param trajectory: the trajectory, (..., 6, robot_num, T)
+        :return: the means, (..., robot_num)
+        """
+        idx = self.goal_reached_indices(trajectory)
+        mask = np.arange(values.shape[-1]) <= idx[..., None]
+        return np.sum(np.where(mask, values, 0.0), axis=-1) / (idx + 1)
+
+    def acceleration_usages(self, trajectory):
+        return self.mean_until_goal(np.abs(trajectory[..., 4, :, :]), trajectory)
+
     def calculate_acceleration_usage(self, trajectory, i):
         """
         Calculate the acceleration usage of the trajectory or robot i
         :param trajectory: the trajectory
         :return: the acceleration usage
         """
-        idx = self.calculate_goal_reached_index(trajectory, i)
-        a = trajectory[4, i, :idx+1]
-        return np.mean(np.abs(a))
+        return self.acceleration_usages(trajectory)[i]
     
     def calculate_avg_acceleration_usage(self, trajectory):
         """
@@ -124,10 +117,10 @@ class DataProcessor:
         :return: the average acceleration usage
         """
         print("Calculating Acceleration Usage...")
-        acceleration_usage = 0
-        for i in range(self.robot_num):
-            acceleration_usage += self.calculate_acceleration_usage(trajectory, i)
-        return acceleration_usage / self.robot_num
+        return np.mean(self.acceleration_usages(trajectory))
+
+    def steering_usages(self, trajectory):
+        return self.mean_until_goal(np.abs(trajectory[..., 5, :, :]), trajectory)
     
     def calculate_steering_usage(self, trajectory, i):
         """
@@ -135,9 +128,7 @@ class DataProcessor:
         :param trajectory: the trajectory
         :return: the steering usage
         """
-        idx = self.calculate_goal_reached_index(trajectory, i)
-        steering = trajectory[5, i, :idx+1]
-        return np.mean(np.abs(steering))
+        return self.steering_usages(trajectory)[i]
     
     def calculate_avg_steering_usage(self, trajectory):
         """
@@ -146,10 +137,10 @@ class DataProcessor:
         :return: the average steering usage
         """
         print("Calculating Steering Usage...")
-        steering_usage = 0
-        for i in range(self.robot_num):
-            steering_usage += self.calculate_steering_usage(trajectory, i)
-        return steering_usage / self.robot_num
+        return np.mean(self.steering_usages(trajectory))
+
+    def speeds(self, trajectory):
+        return self.mean_until_goal(trajectory[..., 3, :, :], trajectory)
     
     def calculate_speed_avg(self, trajectory, i):
         """
@@ -157,9 +148,7 @@ class DataProcessor:
         :param trajectory: the trajectory
         :return: the average speed
         """
-        idx = self.calculate_goal_reached_index(trajectory, i)
-        v = trajectory[3, i, :idx+1]
-        return np.mean(v)
+        return self.speeds(trajectory)[i]
     
     def calculate_avg_speed(self, trajectory):
         """
@@ -168,10 +157,7 @@ class DataProcessor:
         :return: the average speed
         """
         print("Calculating Average Speed...")
-        speed = 0
-        for i in range(self.robot_num):
-            speed += self.calculate_speed_avg(trajectory, i)
-        return speed / self.robot_num
+        return np.mean(self.speeds(trajectory))
     
     def calculate_avg_computational_time(self, computational_time):
         """
@@ -181,6 +167,9 @@ class DataProcessor:
         """
         print("Calculating Average Computational Time...")
         return sum(computational_time) / len(computational_time)
+
+    def initial_dists(self, trajectory):
+        return np.sqrt(trajectory[..., 0, :, 0] ** 2 + trajectory[..., 1, :, 0] ** 2)
     
     def calculate_initial_dist(self, trajectory, i):
         """
@@ -188,9 +177,7 @@ class DataProcessor:
         :param trajectory: the trajectory
         :return: the initial distance
         """
-        x = trajectory[0, i, :]
-        y = trajectory[1, i, :]
-        return np.sqrt(x[0] ** 2 + y[0] ** 2)
+        return self.initial_dists(trajectory)[i]
     
     def calculate_avg_initial_dist(self, trajectory):
         """
@@ -199,10 +186,23 @@ class DataProcessor:
         :return: the average initial distance
         """
         print("Calculating Initial Distance...")
-        initial_dist = 0
-        for i in range(self.robot_num):
-            initial_dist += self.calculate_initial_dist(trajectory, i)
-        return initial_dist / self.robot_num
+        return np.mean(self.initial_dists(trajectory))
+
+    def collisions(self, trajectory):
+        """
+        Count the colliding pairs of robots (at most once per pair) and the robots that leave the arena.
+        The distances of all the pairs are computed at once by broadcasting over the time axis.
+        :param trajectory: the trajectory, (..., 6, robot_num, T)
+        :return: the number of collisions, (...)
+        """
+        x = trajectory[..., 0, :, :]
+        y = trajectory[..., 1, :, :]
+        dist = np.sqrt((x[..., :, None, :] - x[..., None, :, :]) ** 2 + (y[..., :, None, :] - y[..., None, :, :]) ** 2)
+        pairs = np.triu(np.ones((self.robot_num, self.robot_num), dtype=bool), k=1)
+        collision = np.sum(np.any(dist <= WB, axis=-1) & pairs, axis=(-2, -1))
+
+        out = (x >= width_init/2-WB) | (x <= -width_init/2+WB) | (y >= height_init/2-WB) | (y <= -height_init/2+WB)
+        return collision + np.sum(np.any(out, axis=-1), axis=-1)
     
     def count_collision(self, trajectory):
         """
@@ -211,27 +211,20 @@ class DataProcessor:
         :return: the number of collisions
         """
         print("Counting Collisions...")
-        collision = 0
-        for i in range(self.robot_num):
-            x = trajectory[0, i, :]
-            y = trajectory[1, i, :]
-            for j in range(i + 1, self.robot_num):
-                x2 = trajectory[0, j, :]
-                y2 = trajectory[1, j, :]
-                for k in range(len(x)):
-                    if np.sqrt((x[k] - x2[k]) ** 2 + (y[k] - y2[k]) ** 2) <= WB:
-                        collision += 1
-                        break
-            
-            if (x>=width_init/2-WB).any() or (x<=-width_init/2+WB).any() or (y>=height_init/2-WB).any() or (y<=-height_init/2+WB).any():
-                collision += 1
-        return collision
+        return int(self.collisions(trajectory))
+
+    def noise_scaling(self):
+        if add_noise:
+            return noise_scale_param
+        return 0.0
 
-    def post_process_simultation(self, trajectory, computational_time, method, solver_failure=0):
+    def post_process_simultation(self, trajectory, computational_time, method, solver_failure=0, deadline_miss_rate=0.0):
         """
         Post process the simulation
         :param trajectory: the trajectory
         :param computational_time: the computational time
+        :param solver_failure: the number of solver failures
+        :param deadline_miss_rate: the fraction of robot steps that missed the deadline, see planner.deadline
         :return: the post processed data
         """
         avg_path_length = self.calculate_avg_path_length(trajectory)
@@ -242,11 +235,6 @@ class DataProcessor:
         avg_initial_dist = self.calculate_avg_initial_dist(trajectory)
         collision_number = self.count_collision(trajectory)
 
-        if add_noise:
-            noise_scaling = noise_scale_param
-        else:
-            noise_scaling = 0.0
-
         data = {
             "Path Length": avg_path_length,
             "Acceleration Usage": acceleration_usage,
@@ -255,15 +243,69 @@ class DataProcessor:
             "Avg Computational Time": avg_computational_time,
             "Initial Distance": avg_initial_dist,
             "Solver Failure": solver_failure,
+            "Deadline Miss Rate": deadline_miss_rate,
             "Robot Number": self.robot_num,
             "File Name": self.file_name,
             "Method": method,
             "Collision Number": collision_number,
-            "Noise Scaling": noise_scaling
+            "Noise Scaling": self.noise_scaling()
         }
 
         print("Data Processed Successfully!\n")
         return data
+
+    def stack_trajectories(self, trajectories):
+        """
+        Stack runs of different lengths, the shorter ones are padded by repeating their last step,
+        which changes none of the metrics.
+        :param trajectories: list of trajectories, (6, robot_num, T_k)
+        :return: the stacked trajectories, (runs, 6, robot_num, max T_k)
+        """
+        length = max(trajectory.shape[-1] for trajectory in trajectories)
+        return np.stack([np.pad(trajectory, ((0, 0), (0, 0), (0, length - trajectory.shape[-1])), mode='edge')
+                         for trajectory in trajectories])
+
+    def batch_post_process(self, trajectories, computational_times, methods, solver_failures=None, deadline_miss_rates=None):
+        """
+        Post process many simulations of this seed at once, e.g. different methods or parameters.
+        :param trajectories: list of trajectories, (6, robot_num, T_k)
+        :param computational_times: list of computational times of each run
+        :param methods: list of method names, or a single name for all the runs
+        :param solver_failures: list of solver failures of each run, default 0
+        :param deadline_miss_rates: list of deadline miss rates of each run, default 0
+        :return: list of post processed data, same keys as post_process_simultation
+        """
+        runs = len(trajectories)
+        if isinstance(methods, str):
+            methods = [methods]*runs
+        if solver_failures is None:
+            solver_failures = [0]*runs
+        if deadline_miss_rates is None:
+            deadline_miss_rates = [0.0]*runs
+
+        trajectory = self.stack_trajectories(trajectories)
+        path_length = np.mean(self.path_lengths(trajectory), axis=-1)
+        acceleration_usage = np.mean(self.acceleration_usages(trajectory), axis=-1)
+        steering_usage = np.mean(self.steering_usages(trajectory), axis=-1)
+        speed = np.mean(self.speeds(trajectory), axis=-1)
+        initial_dist = np.mean(self.initial_dists(trajectory), axis=-1)
+        collision_number = self.collisions(trajectory)
+
+        return [{
+            "Path Length": path_length[k],
+            "Acceleration Usage": acceleration_usage[k],
+            "Steering Usage": steering_usage[k],
+            "Average Speed": speed[k],
+            "Avg Computational Time": np.mean(computational_times[k]),
+            "Initial Distance": initial_dist[k],
+            "Solver Failure": solver_failures[k],
+            "Deadline Miss Rate": deadline_miss_rates[k],
+            "Robot Number": self.robot_num,
+            "File Name": self.file_name,
+            "Method": methods[k],
+            "Collision Number": int(collision_number[k]),
+            "Noise Scaling": self.noise_scaling()
+        } for k in range(runs)]
     
     def remove_df_duplicates(self, df):
         """
@@ -1,30 +1,25 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import random
 import os
-from cvxopt import matrix, solvers
-from cvxopt import matrix
 from planner import utils as utils
 # For the parameter file
-import pathlib
+from planner.config import get_config, data_file
+from planner.lazy import lazy_import
 import json
 
-# TODO: import all this parameters from a config file so that we can easily change them in one place
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
+plt = lazy_import('matplotlib.pyplot')
 
-# robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-min_dist = json_object["min_dist"]
+params = get_config()
+
+# robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
 
 # write a main function that generates a path for robot_num robots using the function create_path and saves the the generated trajectories to a dictionary.
 # The dictionary is then saved to a file using the function save_dict_to_file
-def save_dict_to_file(dict, filename='src/seeds/seed_'):
+def save_dict_to_file(dict, filename=str(data_file('seeds', 'seed_'))):
     # save the dictionary to a file
     i = 0
     while os.path.exists(f"{filename}{i}.json"):
@@ -56,21 +51,23 @@ def random_seed(robot_num):
     seed['initial_position'] = initial_position
     seed['trajectories'] = trajectories
     seed['robot_num'] = robot_num
-    save_dict_to_file(seed, filename='src/seeds/seed_')
+    save_dict_to_file(seed, filename=str(data_file('seeds', 'seed_')))
 
-def circular_seed(robot_num, R=10.0):
-    # generate a path for robot_num robots
-    # save the generated trajectories to a dictionary
-    # save the dictionary to a file
-    # create a dictionary to save the generated trajectories
+def make_circular_seed(robot_num, R=10.0):
+    """
+    Build a circular seed without plotting nor saving it: the robots are placed on a circle of
+    radius R and each one goes to the starting point of another robot.
+
+    Args:
+        robot_num (int): Number of robots.
+        R (float, optional): Radius of the circle [m]. Defaults to 10.0.
+
+    Returns:
+        dict: The seed, same layout as the seed files (the keys of the trajectories are strings).
+    """
     initial_position = {}
     x0, y, yaw, v, omega, model_type = utils.circular_samples(width_init, height_init, R, robot_num, safety_init)
-    
-    plt.plot(x0, y, 'ro')
-    for i in range(len(x0)):
-        utils.plot_arrow(x0[i], y[i], yaw[i], length=2.5, width=1.0)
-        utils.plot_map(width_init, height_init)
-    plt.show()
+
     initial_position['x'] = x0
     initial_position['y'] = y
     initial_position['yaw'] = yaw
@@ -83,15 +80,30 @@ def circular_seed(robot_num, R=10.0):
         # generate a path for each robot
         idx = random.choice([ele for ele in possibles_indexes if ele != i])
         path.append([x0[idx], y[idx]])
-        trajectories[i] = path
+        trajectories[str(i)] = path
         possibles_indexes.remove(idx)
-    # save the dictionary to a file
-        
+
     seed = {}
     seed['initial_position'] = initial_position
     seed['trajectories'] = trajectories
     seed['robot_num'] = robot_num
-    save_dict_to_file(seed, filename='src/seeds/circular_seed_')
+    return seed
+
+def circular_seed(robot_num, R=10.0):
+    # generate a path for robot_num robots
+    # save the generated trajectories to a dictionary
+    # save the dictionary to a file
+    seed = make_circular_seed(robot_num, R)
+    initial_position = seed['initial_position']
+    x0, y, yaw = initial_position['x'], initial_position['y'], initial_position['yaw']
+
+    plt.plot(x0, y, 'ro')
+    for i in range(len(x0)):
+        utils.plot_arrow(x0[i], y[i], yaw[i], length=2.5, width=1.0)
+        utils.plot_map(width_init, height_init)
+    plt.show()
+    # save the dictionary to a file
+    save_dict_to_file(seed, filename=str(data_file('seeds', 'circular_seed_')))
 
 if __name__ == "__main__":
 
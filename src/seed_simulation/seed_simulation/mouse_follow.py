@@ -3,11 +3,12 @@ import matplotlib.pyplot as plt
 import numpy as np
 import math
 # For the parameter file
-import pathlib
+from planner.config import get_config, data_file
 import json
 from custom_message.msg import Coordinate
 from shapely.geometry import Point
 import planner.utils as utils
+from planner.recorder import TrajectoryRecorder
 
 from lbp_dev import LBP as LBP
 from dwa_dev import DWA as DWA
@@ -18,19 +19,15 @@ from cbf_dev import CBF_simple as CBF
 # for debugging
 from numpy import cos, sin
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
+params = get_config()
 
-dt = json_object["Controller"]["dt"] # [s] Time tick for motion prediction
-predict_time = json_object["LBP"]["predict_time"] # [s]
-dilation_factor = json_object["LBP"]["dilation_factor"]
+dt = params.Controller.dt # [s] Time tick for motion prediction
+predict_time = params.LBP.predict_time # [s]
+dilation_factor = params.LBP.dilation_factor
 
-robot_num = json_object["robot_num"]
-width_init = json_object["width"]
-height_init = json_object["height"]
+robot_num = params.robot_num
+width_init = params.width
+height_init = params.height
 
 show_animation = True
 check_collision_bool = False
@@ -83,8 +80,8 @@ def main_lbp(seed):
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -122,7 +119,7 @@ def main_lbp(seed):
         # piloting the first robot
         lbp.targets[0] = (coords[-1][0], coords[-1][1])
 
-        trajectory = np.dstack([trajectory, x])
+        recorder.append(x)
 
         utils.plot_map(width=width_init, height=height_init)
         plt.plot(coords[-1][0], coords[-1][1], 'k', marker='o', markersize=20)
@@ -133,6 +130,7 @@ def main_lbp(seed):
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -183,8 +181,8 @@ def main_dwa(seed):
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -212,7 +210,7 @@ def main_dwa(seed):
         plt.gcf().canvas.mpl_connect('key_release_event', lambda event: [exit(0) if event.key == 'escape' else None])
         
         x, u, break_flag = dwa.run_dwa(x, u, break_flag)
-        trajectory = np.dstack([trajectory, x])
+        recorder.append(x)
         dwa.targets[0] = (coords[-1][0], coords[-1][1])
 
         plt.plot(coords[-1][0], coords[-1][1], 'k', marker='o', markersize=20)
@@ -224,6 +222,7 @@ def main_dwa(seed):
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -280,8 +279,8 @@ def main_mpc(seed):
     num_inputs = 2
     u = np.zeros([mpc.horizon*num_inputs, robot_num])
 
-    trajectory = np.zeros((x.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = x
+    recorder = TrajectoryRecorder(x.shape[0], robot_num)
+    recorder.append(x)
 
     # Generate reference trajectory
     traj = seed['trajectories']
@@ -317,7 +316,7 @@ def main_mpc(seed):
         mpc.ref[0][0] = coords[-1][0]
         mpc.ref[0][1] = coords[-1][1]
 
-        trajectory = np.dstack([trajectory, x])
+        recorder.append(x)
 
         plt.plot(coords[-1][0], coords[-1][1], 'k', marker='o', markersize=20)
         plt.title('MPC 2D')
@@ -329,6 +328,7 @@ def main_mpc(seed):
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -380,8 +380,8 @@ def main_c3bf(seed):
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0]+u.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = np.concatenate((x,u))
+    recorder = TrajectoryRecorder(x.shape[0]+u.shape[0], robot_num)
+    recorder.append(x, u)
     
     # Step 4: Create paths for each robot
     traj = seed['trajectories']
@@ -399,7 +399,7 @@ def main_c3bf(seed):
             lambda event: [exit(0) if event.key == 'escape' else None])
         
         x, break_flag = c3bf.run_3cbf(x, break_flag)
-        trajectory = np.dstack([trajectory, np.concatenate((x,c3bf.dxu))])
+        recorder.append(x, c3bf.dxu)
         c3bf.targets[0] = (coords[-1][0], coords[-1][1])
 
         plt.plot(coords[-1][0], coords[-1][1], 'k', marker='o', markersize=20)
@@ -411,6 +411,7 @@ def main_c3bf(seed):
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -462,8 +463,8 @@ def main_cbf(seed):
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0]+u.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = np.concatenate((x,u))
+    recorder = TrajectoryRecorder(x.shape[0]+u.shape[0], robot_num)
+    recorder.append(x, u)
     
     # Step 4: Create paths for each robot
     traj = seed['trajectories']
@@ -481,7 +482,7 @@ def main_cbf(seed):
             lambda event: [exit(0) if event.key == 'escape' else None])
         
         x, u, break_flag = cbf.run_cbf(x, break_flag)
-        trajectory = np.dstack([trajectory, np.concatenate((x,u))])
+        recorder.append(x, u)
         cbf.targets[0] = (coords[-1][0], coords[-1][1])
 
         plt.plot(coords[-1][0], coords[-1][1], 'k', marker='o', markersize=20)
@@ -493,6 +494,7 @@ def main_cbf(seed):
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -505,8 +507,8 @@ def main_cbf(seed):
 
 if __name__ == '__main__':
      # Load the seed from a file
-    filename = '/home/giacomo/thesis_ws/src/seed_1.json'
-    # filename = '/home/giacomo/thesis_ws/src/circular_seed_0.json'
+    filename = data_file('seed_1.json')
+    # filename = data_file('circular_seed_0.json')
     with open(filename, 'r') as file:
         seed = json.load(file)
     # main_lbp(seed)
@@ -0,0 +1,146 @@
+"""
+Store of the results of the seed simulations.
+
+The post processed runs (see DataProcessor) are appended to an SQLite table, keyed by seed file,
+method and a hash of the parameters, so the runs of the batch runner and of seed_sim accumulate in
+one place and can be exported to csv:
+
+    store = ResultsStore()
+    store.append(data, overrides)
+    store.export_csv('seed_sim.csv')
+"""
+import hashlib
+import json
+import sqlite3
+
+from planner.config import get_config, data_file
+from planner.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+db_file = str(data_file('seed_simulation', 'seed_simulation', 'seed_sim.db'))
+
+# column name, sqlite type
+columns = [
+    ("Path Length", "REAL"),
+    ("Acceleration Usage", "REAL"),
+    ("Steering Usage", "REAL"),
+    ("Average Speed", "REAL"),
+    ("Avg Computational Time", "REAL"),
+    ("Robot Number", "INTEGER"),
+    ("File Name", "TEXT"),
+    ("Method", "TEXT"),
+    ("Initial Distance", "REAL"),
+    ("Solver Failure", "INTEGER"),
+    ("Deadline Miss Rate", "REAL"),
+    ("Collision Number", "INTEGER"),
+    ("Noise Scaling", "REAL"),
+    ("Overrides", "TEXT"),
+    ("Wall Time", "REAL"),
+    ("Params Hash", "TEXT"),
+]
+key = ("File Name", "Method", "Params Hash")
+
+def params_hash(overrides=''):
+    """
+    Hash of the parameters of a run: the parameter file and the overrides applied on top of it.
+
+    Args:
+        overrides (str, optional): Overrides of the run, see batch_sim. Defaults to ''.
+
+    Returns:
+        str: The hash.
+    """
+    text = json.dumps(get_config().to_dict(), sort_keys=True) + '\n' + overrides
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+def quote(column):
+    """
+    Quote a column name for SQL, the names contain spaces.
+
+    Args:
+        column (str): The column name.
+
+    Returns:
+        str: The quoted name.
+    """
+    return '"' + column + '"'
+
+class ResultsStore:
+    """
+    Append-only SQLite store of the post processed simulations, one row per run.
+
+    A run is identified by (file name, method, params hash): the unique index replaces the previous
+    row of the same run instead of rewriting the whole table. The database is in WAL mode with a busy
+    timeout, so several processes (e.g. the batch_sim workers) can append at the same time.
+    """
+    def __init__(self, file=db_file, timeout=60.0):
+        self.file = file
+        self.connection = sqlite3.connect(file, timeout=timeout)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results (' +
+                                    ', '.join(quote(name) + ' ' + kind for name, kind in columns) + ')')
+            # columns added since the table was created
+            existing = {row[1] for row in self.connection.execute('PRAGMA table_info(results)')}
+            for name, kind in columns:
+                if name not in existing:
+                    self.connection.execute('ALTER TABLE results ADD COLUMN ' + quote(name) + ' ' + kind)
+            self.connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS run ON results (' +
+                                    ', '.join(quote(name) for name in key) + ')')
+
+    def append(self, data, overrides=''):
+        """
+        Store the post processed data of one run, replacing the previous result of the same run.
+
+        Args:
+            data (dict): Output of DataProcessor.post_process_simultation, extra keys are ignored.
+            overrides (str, optional): Overrides of the run, part of its key. Defaults to ''.
+        """
+        row = dict(data)
+        row["Overrides"] = overrides
+        row.setdefault("Wall Time", None)
+        row["Params Hash"] = params_hash(overrides)
+        values = [row.get(name) for name, _ in columns]
+        values = [value.item() if hasattr(value, 'item') else value for value in values]
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO results (' + ', '.join(quote(name) for name, _ in columns) +
+                                    ') VALUES (' + ', '.join('?'*len(columns)) + ')', values)
+
+    def contains(self, file_name, method, overrides=''):
+        """
+        Check whether a run is already stored, e.g. to skip it.
+
+        Args:
+            file_name (str): File name of the seed.
+            method (str): The controller.
+            overrides (str, optional): Overrides of the run. Defaults to ''.
+
+        Returns:
+            bool: True if the run is in the store.
+        """
+        cursor = self.connection.execute('SELECT 1 FROM results WHERE ' + ' AND '.join(quote(name) + ' = ?' for name in key),
+                                         (file_name, method, params_hash(overrides)))
+        return cursor.fetchone() is not None
+
+    def to_dataframe(self):
+        """
+        Returns:
+            pandas.DataFrame: All the stored runs.
+        """
+        return pd.read_sql_query('SELECT * FROM results', self.connection)
+
+    def export_csv(self, csv_file):
+        """
+        Write all the stored runs to a csv file.
+
+        Args:
+            csv_file (str): The csv file.
+        """
+        self.to_dataframe().to_csv(csv_file, index=False)
+
+    def close(self):
+        """
+        Close the connection to the database.
+        """
+        self.connection.close()
@@ -0,0 +1,292 @@
+"""
+Scenario generator for large fleets and arenas.
+
+The starting points are sampled with a vectorized, grid-accelerated Poisson-disk dart throwing, so
+thousands of robots can be placed in a large arena with a minimum distance between any two of
+them. The goals are a permutation of the starting points, like in the circular seeds, so they are
+spaced as well: the permutation pairs the points that are close along a Morton (Z-order) curve,
+which gives short paths that rarely cross, and a fraction `crossing` of the robots then exchange
+their goals at random, which makes the paths longer and crossing more often.
+
+The scenarios are saved as compressed .npz files, load_seed reads them (and the json seeds) in the
+usual seed layout. Run from this folder, like seed_sim.py:
+
+    python3 scenario.py --robot-num 2000 --width 400 --height 400 --crossing 0.3 --stats
+
+The controllers read the size of the arena from the parameter file, so the runs of a scenario
+larger than the default arena need the matching overrides, e.g. "DWA.width_init=400 DWA.height_init=400".
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+from planner.config import get_config, data_file
+
+params = get_config()
+
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
+
+seeds_path = data_file('seeds')
+
+# neighbour cells to check, the cells have side min_dist/sqrt(2) so the neighbours within min_dist
+# are at most two cells away
+offsets = np.array([(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3)])
+
+def poisson_disk_samples(width, height, min_dist, robot_num, rng, max_failures=50):
+    """
+    Sample points in a rectangle with a minimum distance between any two of them.
+
+    The candidates are drawn in batches. A candidate is rejected if a point already accepted lies
+    within min_dist, looked up in a background grid with at most one point per cell, and among the
+    candidates of the same batch only the ones without a conflicting candidate of lower index are
+    kept.
+
+    Args:
+        width (float): Width of the rectangle, centred in the origin [m].
+        height (float): Height of the rectangle [m].
+        min_dist (float): Minimum distance between two points [m].
+        robot_num (int): Number of points.
+        rng (numpy.random.Generator): The random generator.
+        max_failures (int, optional): Consecutive batches without new points before giving up. Defaults to 50.
+
+    Returns:
+        numpy.ndarray: The (robot_num, 2) points.
+
+    Raises:
+        ValueError: If the points do not fit in the rectangle.
+    """
+    cell = min_dist / np.sqrt(2)
+    nx = int(np.ceil(width / cell))
+    ny = int(np.ceil(height / cell))
+    # the grid is padded by two cells, so the neighbours of every cell are valid indices
+    grid = np.full((nx + 4, ny + 4), -1)
+    points = np.empty((robot_num, 2))
+    count = 0
+    failures = 0
+
+    def conflicts(candidates, cells, lookup, reference):
+        neighbours = lookup[cells[:, 0, None] + offsets[:, 0], cells[:, 1, None] + offsets[:, 1]]
+        delta = reference[np.maximum(neighbours, 0)] - candidates[:, None, :]
+        return (neighbours >= 0) & (np.einsum('ijk,ijk->ij', delta, delta) < min_dist**2), neighbours
+
+    while count < robot_num:
+        batch = max(256, 2*(robot_num - count))
+        candidates = rng.uniform((0.0, 0.0), (width, height), (batch, 2))
+        cells = np.minimum((candidates // cell).astype(int), (nx - 1, ny - 1)) + 2
+
+        # conflicts with the accepted points
+        conflict, _ = conflicts(candidates, cells, grid, points)
+        keep = ~conflict.any(axis=1)
+        candidates, cells = candidates[keep], cells[keep]
+
+        # conflicts inside the batch: one candidate per cell, then the lowest index wins
+        _, first = np.unique(cells[:, 0]*grid.shape[1] + cells[:, 1], return_index=True)
+        first.sort()
+        candidates, cells = candidates[first], cells[first]
+        batch_grid = np.full(grid.shape, -1)
+        batch_grid[cells[:, 0], cells[:, 1]] = np.arange(candidates.shape[0])
+        conflict, neighbours = conflicts(candidates, cells, batch_grid, candidates)
+        conflict &= neighbours < np.arange(candidates.shape[0])[:, None]
+        keep = ~conflict.any(axis=1)
+        candidates, cells = candidates[keep][:robot_num - count], cells[keep][:robot_num - count]
+
+        if candidates.shape[0] == 0:
+            failures += 1
+            if failures >= max_failures:
+                raise ValueError(f"Cannot place {robot_num} robots {min_dist} m apart in a {width}x{height} arena, "
+                                 f"placed {count}")
+            continue
+        failures = 0
+        grid[cells[:, 0], cells[:, 1]] = np.arange(count, count + candidates.shape[0])
+        points[count:count + candidates.shape[0]] = candidates
+        count += candidates.shape[0]
+
+    return points - (width/2, height/2)
+
+def morton_order(points, bits=16):
+    """
+    Order of the points along a Morton (Z-order) curve, close points are close in the order.
+
+    Args:
+        points (numpy.ndarray): The (N, 2) points.
+        bits (int, optional): Resolution of the curve on each axis. Defaults to 16.
+
+    Returns:
+        numpy.ndarray: The indices of the points sorted along the curve.
+    """
+    span = np.ptp(points, axis=0)
+    span[span == 0] = 1.0
+    cells = ((points - points.min(axis=0)) / span * (2**bits - 1)).astype(np.uint64)
+    code = np.zeros(points.shape[0], dtype=np.uint64)
+    for b in range(bits):
+        bit = np.uint64(b)
+        code |= ((cells[:, 0] >> bit) & np.uint64(1)) << (np.uint64(2)*bit)
+        code |= ((cells[:, 1] >> bit) & np.uint64(1)) << (np.uint64(2)*bit + np.uint64(1))
+    return np.argsort(code, kind='stable')
+
+def assign_goals(starts, crossing, rng):
+    """
+    Assign to each robot the starting point of another robot as goal.
+
+    Along the Morton curve each robot takes the start of the next one (the last one takes the
+    start of the first), then a fraction crossing of the robots shuffle their goals at random.
+
+    Args:
+        starts (numpy.ndarray): The (N, 2) starting points.
+        crossing (float): Fraction of the robots with a random goal, between 0 (local goals, few
+            crossings) and 1 (random goals, many crossings).
+        rng (numpy.random.Generator): The random generator.
+
+    Returns:
+        numpy.ndarray: Index of the goal of each robot, a permutation of the robots.
+    """
+    robot_num = starts.shape[0]
+    order = morton_order(starts)
+    goal = np.empty(robot_num, dtype=int)
+    goal[order] = np.roll(order, -1)
+
+    shuffled = rng.choice(robot_num, size=int(round(crossing*robot_num)), replace=False)
+    goal[shuffled] = goal[rng.permutation(shuffled)]
+    return goal
+
+def crossing_density(starts, goals, chunk=1024):
+    """
+    Fraction of the pairs of robots whose straight paths from start to goal cross.
+
+    Args:
+        starts (numpy.ndarray): The (N, 2) starting points.
+        goals (numpy.ndarray): The (N, 2) goals.
+        chunk (int, optional): Number of paths compared at once. Defaults to 1024.
+
+    Returns:
+        float: The crossing density.
+    """
+    robot_num = starts.shape[0]
+    if robot_num < 2:
+        return 0.0
+    direction = goals - starts
+
+    def orientation(origin, direction, points):
+        delta = points - origin
+        return np.sign(direction[..., 0]*delta[..., 1] - direction[..., 1]*delta[..., 0])
+
+    crossings = 0
+    for begin in range(0, robot_num, chunk):
+        a, da = starts[begin:begin + chunk, None], direction[begin:begin + chunk, None]
+        b, db = starts[None], direction[None]
+        cross = ((orientation(a, da, b) * orientation(a, da, b + db) < 0) &
+                 (orientation(b, db, a) * orientation(b, db, a + da) < 0))
+        crossings += np.triu(cross, k=begin + 1).sum()
+    return crossings / (robot_num*(robot_num - 1)/2)
+
+def make_scenario(robot_num, width=width_init, height=height_init, spacing=min_dist, crossing=0.5, seed=None):
+    """
+    Build a scenario: Poisson-disk spaced starts with random headings and one goal per robot.
+
+    Args:
+        robot_num (int): Number of robots.
+        width (float, optional): Width of the arena [m]. Defaults to the width of the parameter file.
+        height (float, optional): Height of the arena [m]. Defaults to the height of the parameter file.
+        spacing (float, optional): Minimum distance between the robots [m]. Defaults to min_dist.
+        crossing (float, optional): Fraction of the robots with a random goal. Defaults to 0.5.
+        seed (int, optional): Seed of the random generator. Defaults to None.
+
+    Returns:
+        dict: The scenario arrays, see save_scenario.
+    """
+    rng = np.random.default_rng(seed)
+    starts = poisson_disk_samples(width - safety_init, height - safety_init, spacing, robot_num, rng)
+    goal = assign_goals(starts, crossing, rng)
+    return {
+        "x": starts[:, 0],
+        "y": starts[:, 1],
+        "yaw": rng.uniform(-np.pi, np.pi, robot_num),
+        "v": np.zeros(robot_num),
+        "goals": starts[goal][:, None, :],
+        "width": float(width),
+        "height": float(height),
+        "spacing": float(spacing),
+        "crossing": float(crossing),
+    }
+
+def save_scenario(scenario, file):
+    """
+    Save a scenario as a compressed .npz file.
+
+    Args:
+        scenario (dict): Arrays x, y, yaw, v (N,) and goals (N, waypoints, 2), plus the scalars
+            width, height, spacing and crossing.
+        file (str): The .npz file.
+    """
+    np.savez_compressed(file, **scenario)
+
+def to_seed(scenario):
+    """
+    Convert a scenario to the seed layout used by the simulations.
+
+    Args:
+        scenario (dict): The scenario arrays.
+
+    Returns:
+        dict: The seed, the arena size is kept under width and height.
+    """
+    goals = np.asarray(scenario["goals"])
+    return {
+        "initial_position": {key: np.asarray(scenario[key]).tolist() for key in ("x", "y", "yaw", "v")},
+        "trajectories": {str(i): goals[i].tolist() for i in range(goals.shape[0])},
+        "robot_num": int(goals.shape[0]),
+        "width": float(scenario["width"]),
+        "height": float(scenario["height"]),
+    }
+
+def load_seed(file):
+    """
+    Load a seed, either a json seed or a .npz scenario.
+
+    Args:
+        file (str): The seed file.
+
+    Returns:
+        dict: The seed.
+    """
+    if str(file).endswith('.npz'):
+        with np.load(file) as scenario:
+            return to_seed({key: scenario[key] for key in scenario.files})
+    with open(file, 'r') as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a large scale scenario.")
+    parser.add_argument('--robot-num', type=int, required=True)
+    parser.add_argument('--width', type=float, default=width_init, help="[m]")
+    parser.add_argument('--height', type=float, default=height_init, help="[m]")
+    parser.add_argument('--spacing', type=float, default=min_dist, help="minimum distance between the robots [m]")
+    parser.add_argument('--crossing', type=float, default=0.5, help="fraction of the robots with a random goal")
+    parser.add_argument('--seed', type=int, default=None, help="seed of the random generator")
+    parser.add_argument('--output', default=None, help="npz file, default the next scenario_<i>.npz in the seeds folder")
+    parser.add_argument('--stats', action='store_true', help="print the path length and crossing density")
+    args = parser.parse_args()
+
+    scenario = make_scenario(args.robot_num, args.width, args.height, args.spacing, args.crossing, args.seed)
+
+    output = args.output
+    if output is None:
+        i = 0
+        while os.path.exists(seeds_path / f"scenario_{i}.npz"):
+            i += 1
+        output = str(seeds_path / f"scenario_{i}.npz")
+    save_scenario(scenario, output)
+    print(f"Saving scenario to {output}")
+
+    if args.stats:
+        starts = np.stack((scenario["x"], scenario["y"]), axis=1)
+        goals = scenario["goals"][:, 0, :]
+        print(f"Average path length: {np.mean(np.hypot(*(goals - starts).T)):.2f} m")
+        print(f"Crossing density: {crossing_density(starts, goals):.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,107 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import json
-import pathlib
 import dwa_dev.DWA as DWA
 import lbp_dev.LBP as LBP
 import cbf_dev.CBF_simple as CBF
 import cbf_dev.C3BF as C3BF
 import mpc_dev.MPC as MPC
 import planner.utils as utils
-from custom_message.msg import Coordinate
+from planner.recorder import TrajectoryRecorder
+from planner.profiler import span
 from shapely.geometry import Point, LineString
-import pandas as pd
 from data_process import DataProcessor
+from results_store import ResultsStore
 import os
-import matplotlib
-
-matplotlib.use("Qt5Agg")
-mgr = plt.get_current_fig_manager()
-mgr.full_screen_toggle()
-py = mgr.canvas.height()
-px = mgr.canvas.width()+1000
-mgr.window.close()
-
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
-
-# robot_num = json_object["robot_num"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-show_animation = json_object["show_animation"]
+from dataclasses import dataclass
+from planner.config import get_config, data_file
+from planner.lazy import lazy_import
+
+matplotlib = lazy_import('matplotlib')
+plt = lazy_import('matplotlib.pyplot')
+
+params = get_config()
+
+# robot_num = params.robot_num
+width_init = params.width
+height_init = params.height
+show_animation = params.show_animation
 go_to_goal_bool = True
 iterations = 1000
 
 color_dict = {0: 'r', 1: 'b', 2: 'g', 3: 'y', 4: 'm', 5: 'c', 6: 'k'}
 
+# [pixel] position of the live figure, set by init_window
+px = 0
+py = 0
+
+@dataclass
+class Coordinate:
+    """
+    A waypoint of a path, with the fields of custom_message/Coordinate, so that the simulations do
+    not need the ROS messages.
+    """
+    x: float
+    y: float
+
+def init_window():
+    """
+    Switch to the Qt backend and measure the screen, the live figures are then moved next to it.
+    Only needed when the simulations are plotted, the headless runner (batch_sim) never calls it.
+    """
+    global px, py
+    matplotlib.use("Qt5Agg")
+    mgr = plt.get_current_fig_manager()
+    mgr.full_screen_toggle()
+    py = mgr.canvas.height()
+    px = mgr.canvas.width()+1000
+    mgr.window.close()
+
+def open_figure():
+    """
+    Open the live figure of a simulation.
+
+    Returns:
+        matplotlib.axes.Axes: The axes of the figure, None if show_animation is False.
+    """
+    if not show_animation:
+        return None
+    plt.ion()
+    fig = plt.figure(1, dpi=90)
+    figManager = plt.get_current_fig_manager()
+    figManager.window.move(px, 0)
+    # figManager.window.showMaximized()
+    # figManager.window.setFocus()
+    ax = fig.add_subplot(111)
+    plt.show(block=False)
+    return ax
+
+def clear_frame():
+    """
+    Clear the live figure before the controllers draw the robots of the next step.
+    """
+    if not show_animation:
+        return
+    with span("plot"):
+        plt.cla()
+        plt.gcf().canvas.mpl_connect('key_release_event', lambda event: [exit(0) if event.key == 'escape' else None])
+
+def draw_frame(title=None):
+    """
+    Draw the map on the live figure and refresh it.
+
+    Args:
+        title (str, optional): Title of the figure. Defaults to None.
+    """
+    if not show_animation:
+        return
+    with span("plot"):
+        if title is not None:
+            plt.title(title)
+        utils.plot_map(width=width_init, height=height_init)
+        plt.axis("equal")
+        plt.grid(True)
+        mypause(0.0001)
+
 def mypause(interval):
     backend = plt.rcParams['backend']
     if backend in matplotlib.rcsetup.interactive_bk:
@@ -50,9 +115,9 @@ def mypause(interval):
 
 def dwa_sim(seed, robot_num):
 
-    dt = json_object["Controller"]["dt"] # [s] Time tick for motion prediction
-    predict_time = json_object["DWA"]["predict_time"] # [s]
-    dilation_factor = json_object["DWA"]["dilation_factor"]
+    dt = params.Controller.dt # [s] Time tick for motion prediction
+    predict_time = params.DWA.predict_time # [s]
+    dilation_factor = params.DWA.dilation_factor
 
     """
     Main function that controls the execution of the program.
@@ -85,8 +150,8 @@ def dwa_sim(seed, robot_num):
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0]+u.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = np.concatenate((x,u))
+    recorder = TrajectoryRecorder(x.shape[0]+u.shape[0], robot_num)
+    recorder.append(x, u)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -105,14 +170,7 @@ def dwa_sim(seed, robot_num):
         dilated_traj.append(Point(x[0, i], x[1, i]).buffer(dilation_factor, cap_style=3))
     
     
-    plt.ion()
-    fig = plt.figure(1, dpi=90)
-    figManager = plt.get_current_fig_manager()
-    figManager.window.move(px, 0)
-    # figManager.window.showMaximized()
-    # figManager.window.setFocus()
-    ax = fig.add_subplot(111)
-    plt.show(block=False)
+    ax = open_figure()
     
     u_hist = dict.fromkeys(range(robot_num),[[0,0] for _ in range(int(predict_time/dt))])    
     # Step 7: Create an instance of the DWA_algorithm class
@@ -120,25 +178,22 @@ def dwa_sim(seed, robot_num):
     
     for z in range(iterations):
         
-        plt.cla()
-        plt.gcf().canvas.mpl_connect('key_release_event', lambda event: [exit(0) if event.key == 'escape' else None])
+        clear_frame()
         
-        if go_to_goal_bool:
-            x, u, break_flag = dwa.go_to_goal(x, u, break_flag)
-        else:
-            x, u, break_flag = dwa.run_dwa(x, u, break_flag)
-        trajectory = np.dstack([trajectory, np.concatenate((x,u))])
+        with span("DWA.tick"):
+            if go_to_goal_bool:
+                x, u, break_flag = dwa.go_to_goal(x, u, break_flag)
+            else:
+                x, u, break_flag = dwa.run_dwa(x, u, break_flag)
+        recorder.append(x, u)
 
           
-        utils.plot_map(width=width_init, height=height_init)
-        plt.axis("equal")
-        plt.grid(True)
-        # plt.pause(0.0001)
-        mypause(0.0001)
+        draw_frame()
 
         if break_flag:
             break
     
+    trajectory = recorder.array()
     # plt.close()
     print("Done")
     if show_animation:
@@ -152,7 +207,7 @@ def dwa_sim(seed, robot_num):
         mypause(3)
         plt.close()
 
-    return trajectory, dwa.computational_time
+    return trajectory, dwa.computational_time, 0, dwa.deadline.miss_rate()
 
 def mpc_sim(seed, robot_num):
     """
@@ -189,8 +244,8 @@ def mpc_sim(seed, robot_num):
     num_inputs = 2
     u = np.zeros([mpc.horizon*num_inputs, robot_num])
 
-    trajectory = np.zeros((x.shape[0] + num_inputs, robot_num, 1))
-    trajectory[:, :, 0] = np.concatenate((x,u[:2]))
+    recorder = TrajectoryRecorder(x.shape[0] + num_inputs, robot_num)
+    recorder.append(x, u[:2])
 
     # Generate reference trajectory
     traj = seed['trajectories']
@@ -209,14 +264,7 @@ def mpc_sim(seed, robot_num):
         ref.append([cx[i][0], cy[i][0]])
     
     # input [throttle, steer (delta)]
-    plt.ion()
-    fig = plt.figure(1, dpi=90)
-    figManager = plt.get_current_fig_manager()
-    figManager.window.move(px, 0)
-    # figManager.window.showMaximized()
-    # figManager.window.setFocus()
-    ax = fig.add_subplot(111)
-    plt.show(block=False)
+    ax = open_figure()
 
     # mpc = MPC_algorithm(cx, cy, ref, mpc, bounds, constraints, predicted_trajectory)
     mpc.cx = cx
@@ -224,25 +272,21 @@ def mpc_sim(seed, robot_num):
     mpc.ref = ref
 
     for z in range(iterations):
-        plt.cla()
-        plt.gcf().canvas.mpl_connect('key_release_event',
-                lambda event: [exit(0) if event.key == 'escape' else None])
+        clear_frame()
 
-        if go_to_goal_bool:
-            x, u, break_flag = mpc.go_to_goal(x, u, break_flag)
-        else:
-            x, u, break_flag = mpc.run_mpc(x, u, break_flag)
-        trajectory = np.dstack([trajectory, np.concatenate((x,u[:2]))])
+        with span("MPC.tick"):
+            if go_to_goal_bool:
+                x, u, break_flag = mpc.go_to_goal(x, u, break_flag)
+            else:
+                x, u, break_flag = mpc.run_mpc(x, u, break_flag)
+        recorder.append(x, u[:2])
 
-        plt.title('MPC 2D')
-        utils.plot_map(width=width_init, height=height_init)
-        plt.axis("equal")
-        plt.grid(True)
-        mypause(0.0001)
+        draw_frame('MPC 2D')
 
         if break_flag:
             break
     
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -255,7 +299,7 @@ def mpc_sim(seed, robot_num):
         mypause(3)
         plt.close()
 
-    return trajectory, mpc.computational_time
+    return trajectory, mpc.computational_time, 0, mpc.deadline.miss_rate()
 
 def c3bf_sim(seed, robot_num):
     """
@@ -291,17 +335,10 @@ def c3bf_sim(seed, robot_num):
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    plt.ion()
-    fig = plt.figure(1, dpi=90)
-    figManager = plt.get_current_fig_manager()
-    figManager.window.move(px, 0)
-    # figManager.window.showMaximized()
-    # figManager.window.setFocus()
-    ax = fig.add_subplot(111)
-    plt.show(block=False)
+    ax = open_figure()
 
-    trajectory = np.zeros((x.shape[0]+u.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = np.concatenate((x,u))
+    recorder = TrajectoryRecorder(x.shape[0]+u.shape[0], robot_num)
+    recorder.append(x, u)
     
     # Step 4: Create paths for each robot
     traj = seed['trajectories']
@@ -313,25 +350,21 @@ def c3bf_sim(seed, robot_num):
     c3bf = C3BF.C3BF_algorithm(targets, paths, robot_num=robot_num)
     # Step 8: Perform the simulation for the specified number of iterations
     for z in range(iterations):
-        plt.cla()
-        plt.gcf().canvas.mpl_connect(
-            'key_release_event',
-            lambda event: [exit(0) if event.key == 'escape' else None])
+        clear_frame()
         
-        if go_to_goal_bool:
-            x, break_flag = c3bf.go_to_goal(x, break_flag)
-        else:
-            x, break_flag = c3bf.run_3cbf(x, break_flag)
-        trajectory = np.dstack([trajectory, np.concatenate((x, c3bf.dxu))])
+        with span("C3BF.tick"):
+            if go_to_goal_bool:
+                x, break_flag = c3bf.go_to_goal(x, break_flag)
+            else:
+                x, break_flag = c3bf.run_3cbf(x, break_flag)
+        recorder.append(x, c3bf.dxu)
         
-        utils.plot_map(width=width_init, height=height_init)
-        plt.axis("equal")
-        plt.grid(True)
-        mypause(0.0001)
+        draw_frame()
 
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -344,7 +377,7 @@ def c3bf_sim(seed, robot_num):
         mypause(3)
         plt.close()
 
-    return trajectory, c3bf.computational_time, c3bf.solver_failure
+    return trajectory, c3bf.computational_time, c3bf.solver_failure, c3bf.deadline.miss_rate()
 
 def cbf_sim(seed, robot_num):
     """
@@ -380,17 +413,10 @@ def cbf_sim(seed, robot_num):
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    plt.ion()
-    fig = plt.figure(1, dpi=90)
-    figManager = plt.get_current_fig_manager()
-    figManager.window.move(px, 0)
-    # figManager.window.showMaximized()
-    # figManager.window.setFocus()
-    ax = fig.add_subplot(111)
-    plt.show(block=False)
+    ax = open_figure()
 
-    trajectory = np.zeros((x.shape[0]+u.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = np.concatenate((x,u))
+    recorder = TrajectoryRecorder(x.shape[0]+u.shape[0], robot_num)
+    recorder.append(x, u)
     
     # Step 4: Create paths for each robot
     traj = seed['trajectories']
@@ -402,26 +428,22 @@ def cbf_sim(seed, robot_num):
     cbf = CBF.CBF_algorithm(targets, paths, robot_num=robot_num)
     # Step 8: Perform the simulation for the specified number of iterations
     for z in range(iterations):
-        plt.cla()
-        plt.gcf().canvas.mpl_connect(
-            'key_release_event',
-            lambda event: [exit(0) if event.key == 'escape' else None])
+        clear_frame()
         
-        if go_to_goal_bool:
-            x, break_flag = cbf.go_to_goal(x, break_flag)
-        else:
-            x, break_flag = cbf.run_cbf(x, break_flag) 
+        with span("CBF.tick"):
+            if go_to_goal_bool:
+                x, break_flag = cbf.go_to_goal(x, break_flag)
+            else:
+                x, break_flag = cbf.run_cbf(x, break_flag) 
             
-        trajectory = np.dstack([trajectory, np.concatenate((x, cbf.dxu))])
+        recorder.append(x, cbf.dxu)
         
-        utils.plot_map(width=width_init, height=height_init)
-        plt.axis("equal")
-        plt.grid(True)
-        mypause(0.0001)
+        draw_frame()
 
         if break_flag:
             break
     
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -434,12 +456,12 @@ def cbf_sim(seed, robot_num):
         mypause(3)
         plt.close()
 
-    return trajectory, cbf.computational_time, cbf.solver_failure
+    return trajectory, cbf.computational_time, cbf.solver_failure, cbf.deadline.miss_rate()
 
 def lbp_sim(seed, robot_num):
-    dt = json_object["Controller"]["dt"]
-    predict_time = json_object["LBP"]["predict_time"] # [s]
-    dilation_factor = json_object["LBP"]["dilation_factor"]
+    dt = params.Controller.dt
+    predict_time = params.LBP.predict_time # [s]
+    dilation_factor = params.LBP.dilation_factor
 
     """
     This function runs the main loop for the LBP algorithm.
@@ -464,8 +486,8 @@ def lbp_sim(seed, robot_num):
     x = np.array([x0, y, yaw, v])
     u = np.zeros((2, robot_num))
 
-    trajectory = np.zeros((x.shape[0]+u.shape[0], robot_num, 1))
-    trajectory[:, :, 0] = np.concatenate((x,u))
+    recorder = TrajectoryRecorder(x.shape[0]+u.shape[0], robot_num)
+    recorder.append(x, u)
 
     predicted_trajectory = dict.fromkeys(range(robot_num),np.zeros([int(predict_time/dt), 3]))
     for i in range(robot_num):
@@ -485,37 +507,28 @@ def lbp_sim(seed, robot_num):
 
     u_hist = dict.fromkeys(range(robot_num),[0]*int(predict_time/dt))
 
-    plt.ion()
-    fig = plt.figure(1, dpi=90)
-    figManager = plt.get_current_fig_manager()
-    figManager.window.move(px, 0)
-    # figManager.window.showMaximized()
-    # figManager.window.setFocus()
-    ax = fig.add_subplot(111)
-    plt.show(block=False)
+    ax = open_figure()
     
     lbp = LBP.LBP_algorithm(predicted_trajectory, paths, targets, dilated_traj,
                         predicted_trajectory, ax, u_hist, robot_num=robot_num)
     
     for z in range(iterations):
-        plt.cla()
-        plt.gcf().canvas.mpl_connect('key_release_event', lambda event: [exit(0) if event.key == 'escape' else None])
+        clear_frame()
         
-        if go_to_goal_bool:
-            x, u, break_flag = lbp.go_to_goal(x, u, break_flag)
-        else:
-            # add noise: gaussians zero mean different variances ~50cm for position and ~5deg for orientation
-            x, u, break_flag = lbp.run_lbp(x, u, break_flag)
-        trajectory = np.dstack([trajectory, np.concatenate((x,u))])
+        with span("LBP.tick"):
+            if go_to_goal_bool:
+                x, u, break_flag = lbp.go_to_goal(x, u, break_flag)
+            else:
+                # add noise: gaussians zero mean different variances ~50cm for position and ~5deg for orientation
+                x, u, break_flag = lbp.run_lbp(x, u, break_flag)
+        recorder.append(x, u)
 
-        utils.plot_map(width=width_init, height=height_init)
-        plt.axis("equal")
-        plt.grid(True)
-        mypause(0.0001)
+        draw_frame()
 
         if break_flag:
             break
 
+    trajectory = recorder.array()
     print("Done")
     if show_animation:
         for i in range(robot_num):
@@ -528,24 +541,24 @@ def lbp_sim(seed, robot_num):
         mypause(3)
         plt.close()
     
-    return trajectory, lbp.computational_time
+    return trajectory, lbp.computational_time, 0, lbp.deadline.miss_rate()
 
 def main():
+    init_window()
+
     # Load the seed from a file
-    path = pathlib.Path('/home/giacomo/thesis_ws/src/seeds/')
+    path = data_file('seeds')
     dir_list = os.listdir(path)
     dir_list = ['circular_seed_11.json']
 
-    csv_file = '/home/giacomo/thesis_ws/src/seed_simulation/seed_simulation/seed_sim.csv'
-    df = pd.read_csv(csv_file)
-    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+    store = ResultsStore()
 
     # Analyze the results
     for filename in dir_list:
         
-        # Skipping file that are already in the csv file
-        # if filename in list(df["File Name"]):
-        #     print(f"Skipping {filename} as it already exists in the csv file\n")
+        # Skipping file that are already in the store
+        # if store.contains(filename, 'C3BF'):
+        #     print(f"Skipping {filename} as it already exists in the store\n")
         #     continue
 
         if 'circular' not in filename:
@@ -563,43 +576,44 @@ def main():
         data_process = DataProcessor(robot_num, file_name=filename, seed=seed)
         data = []
 
-        # dwa_trajectory, dwa_computational_time = dwa_sim(seed, robot_num)   
+        # dwa_trajectory, dwa_computational_time, _, dwa_miss_rate = dwa_sim(seed, robot_num)   
         # print(f"DWA average computational time: {sum(dwa_computational_time) / len(dwa_computational_time)}\n")
-        # dwa_data = data_process.post_process_simultation(dwa_trajectory, dwa_computational_time, method='DWA')
+        # dwa_data = data_process.post_process_simultation(dwa_trajectory, dwa_computational_time, method='DWA',
+        #                                                  deadline_miss_rate=dwa_miss_rate)
         # data.append(dwa_data)
 
-        # mpc_trajectory, mpc_computational_time = mpc_sim(seed, robot_num)
+        # mpc_trajectory, mpc_computational_time, _, mpc_miss_rate = mpc_sim(seed, robot_num)
         # print(f"MPC average computational time: {sum(mpc_computational_time) / len(mpc_computational_time)}\n")
-        # mpc_data = data_process.post_process_simultation(mpc_trajectory, mpc_computational_time, method="MPC")
+        # mpc_data = data_process.post_process_simultation(mpc_trajectory, mpc_computational_time, method="MPC",
+        #                                                  deadline_miss_rate=mpc_miss_rate)
         # data.append(mpc_data)
 
-        c3bf_trajectory, c3bf_computational_time, c3bf_solver_failure = c3bf_sim(seed, robot_num)
+        c3bf_trajectory, c3bf_computational_time, c3bf_solver_failure, c3bf_miss_rate = c3bf_sim(seed, robot_num)
         print(f"C3BF average computational time: {sum(c3bf_computational_time) / len(c3bf_computational_time)}\n")
         c3bf_data = data_process.post_process_simultation(c3bf_trajectory, c3bf_computational_time, method='C3BF', 
-                                                          solver_failure=c3bf_solver_failure)
+                                                          solver_failure=c3bf_solver_failure,
+                                                          deadline_miss_rate=c3bf_miss_rate)
         data.append(c3bf_data)
 
-        cbf_trajectory, cbf_computational_time, cbf_solver_failure = cbf_sim(seed, robot_num)
+        cbf_trajectory, cbf_computational_time, cbf_solver_failure, cbf_miss_rate = cbf_sim(seed, robot_num)
         print(f"CBF average computational time: {sum(cbf_computational_time) / len(cbf_computational_time)}\n")
         cbf_data = data_process.post_process_simultation(cbf_trajectory, cbf_computational_time, method="CBF", 
-                                                         solver_failure=cbf_solver_failure)
+                                                         solver_failure=cbf_solver_failure,
+                                                         deadline_miss_rate=cbf_miss_rate)
         data.append(cbf_data)
 
-        # lbp_trajectory, lbp_computational_time = lbp_sim(seed, robot_num)
+        # lbp_trajectory, lbp_computational_time, _, lbp_miss_rate = lbp_sim(seed, robot_num)
         # print(f"LBP average computational time: {sum(lbp_computational_time) / len(lbp_computational_time)}\n")
-        # lbp_data = data_process.post_process_simultation(lbp_trajectory, lbp_computational_time, method="LBP")
+        # lbp_data = data_process.post_process_simultation(lbp_trajectory, lbp_computational_time, method="LBP",
+        #                                                  deadline_miss_rate=lbp_miss_rate)
         # data.append(lbp_data)
 
-        df1 = pd.DataFrame(data)
-        frames = [df, df1]
-        df = pd.concat(frames, ignore_index=True)
-
-    # Save the results to a csv file
-    df = data_process.remove_df_duplicates(df)
-    # df = pd.DataFrame(data)
-    df.to_csv(csv_file)
+        # Each run replaces the previous result of the same seed, method and parameters
+        for run_data in data:
+            store.append(run_data)
 
-    print(f"Data saved to csv file: {csv_file}")
+    store.close()
+    print(f"Data saved to the results store: {store.file}")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,24 +1,25 @@
 from launch import LaunchDescription
+from launch.actions import DeclareLaunchArgument
+from launch.conditions import IfCondition, UnlessCondition
+from launch.substitutions import LaunchConfiguration
 from launch_ros.actions import Node
 import random
 import numpy as np
 
 # For the parameter file
-import pathlib
+from planner.config import get_config, data_file
 import json
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-init_path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/init.json')
-# Opening JSON file
-with open(path, 'r') as openfile:
-    # Reading from json file
-    json_object = json.load(openfile)
+init_path = data_file('bumper_cars', 'init.json')
+params = get_config()
 
-robot_num = json_object["robot_num"]
-safety_init = json_object["safety"]
-width_init = json_object["width"]
-height_init = json_object["height"]
-min_dist = json_object["min_dist"]
+robot_num = params.robot_num
+safety_init = params.safety
+width_init = params.width
+height_init = params.height
+min_dist = params.min_dist
+# the nodes run on the /clock of the car model, see bumper_cars.car_model
+use_sim_time = params.use_sim_time
 
 def samplegrid():
     # defining the boundaries
@@ -59,29 +60,41 @@ with open(init_path, 'w') as outfile:
 def generate_launch_description():
     ld = LaunchDescription()
 
+    # composed:=true runs the car model and the nodes below in a single process (bumper_cars.composed),
+    # robot_model.launch.py must not be launched as well
+    composed = LaunchConfiguration('composed')
+    ld.add_action(DeclareLaunchArgument('composed', default_value='false',
+                                        description="run the bumper_cars nodes in a single process"))
+    ld.add_action(DeclareLaunchArgument('latency', default_value='false',
+                                        description="report the latency of the control loop on /latency"))
+
     controller_node = Node(
         package="bumper_cars",
         executable="controller",
+        condition=UnlessCondition(composed),
         parameters=[
             {'model_type': model_type},
             {'x0': x},
             {'y0': y},
             {'yaw': yaw},
             {'v': v},
-            {'omega': omega}
+            {'omega': omega},
+            {'use_sim_time': use_sim_time}
             ]
     )
 
     sensor_node = Node(
         package="bumper_cars",
         executable="sensor",
+        condition=UnlessCondition(composed),
         parameters=[
             {'model_type': model_type},
             {'x0': x},
             {'y0': y},
             {'yaw': yaw},
             {'v': v},
-            {'omega': omega}
+            {'omega': omega},
+            {'use_sim_time': use_sim_time}
             ]
     )
 
@@ -101,20 +114,48 @@ def generate_launch_description():
     converter_node = Node(
         package="bumper_cars",
         executable="converter",
+        condition=UnlessCondition(composed),
+        parameters=[
+            {'model_type': model_type},
+            {'x0': x},
+            {'y0': y},
+            {'yaw': yaw},
+            {'v': v},
+            {'omega': omega},
+            {'use_sim_time': use_sim_time}
+            ]
+    )
+    composed_node = Node(
+        package="bumper_cars",
+        executable="composed",
+        condition=IfCondition(composed),
+        remappings=[
+            ("/robot_control", "/multi_control"),
+            ("/robot_fullstate", "/multi_fullstate")
+        ],
         parameters=[
             {'model_type': model_type},
             {'x0': x},
             {'y0': y},
             {'yaw': yaw},
             {'v': v},
-            {'omega': omega}
+            {'omega': omega},
+            {'use_sim_time': use_sim_time}
             ]
     )
+
+    latency_node = Node(
+        package="bumper_cars",
+        executable="latency",
+        condition=IfCondition(LaunchConfiguration('latency')),
+        parameters=[{'use_sim_time': use_sim_time}]
+    )
+
     # launch node to start rviz2 
     rviz2_node = Node(
         package="rviz2",
         executable="rviz2",
-        arguments=["-d", "/home/giacomo/thesis_ws/src/bumper_cars/rviz2_config.rviz"]
+        arguments=["-d", str(data_file("bumper_cars", "rviz2_config.rviz"))]
     )
 
     # launch node for static broadcaster following this example ros2 run tf2_ros static_transform_publisher 0 0 0 0 0 0 1 map base_link
@@ -127,13 +168,15 @@ def generate_launch_description():
     broadcaster_node = Node(
         package="bumper_cars",
         executable="broadcaster",
+        condition=UnlessCondition(composed),
         parameters=[
             {'model_type': model_type},
             {'x0': x},
             {'y0': y},
             {'yaw': yaw},
             {'v': v},
-            {'omega': omega}
+            {'omega': omega},
+            {'use_sim_time': use_sim_time}
             ]
     )
 
@@ -144,5 +187,7 @@ def generate_launch_description():
     # ld.add_action(static_tf_pub)  
     ld.add_action(rviz2_node) 
     ld.add_action(broadcaster_node)
+    ld.add_action(composed_node)
+    ld.add_action(latency_node)
 
     return ld
\ No newline at end of file
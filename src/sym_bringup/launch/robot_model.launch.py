@@ -2,11 +2,10 @@ from launch import LaunchDescription
 from launch_ros.actions import Node
 from custom_message.msg import ControlInputs, State, FullState
 # For the parameter file
-import pathlib
+from planner.config import data_file
 import json
 
-path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/params.json')
-init_path = pathlib.Path('/home/giacomo/thesis_ws/src/bumper_cars/init.json')
+init_path = data_file('bumper_cars', 'init.json')
 # Opening JSON file
 with open(init_path, 'r') as openfile:
     # Reading from json file